@@ -0,0 +1,93 @@
+"""
+Нагрузочный тест AtomicFlags: несколько потоков одновременно меняют общий набор флагов.
+Сравниваются три способа блокировки: своя блокировка у каждого экземпляра, набор блокировок
+(экземпляр берет блокировку по своему номеру) и одна общая блокировка на все экземпляры.
+После каждого прогона проверяется, что ни одно изменение не потеряно.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_atomic_flags
+    python -m benchmarks.bench_atomic_flags --threads 1 4 16 --instances 64 --operations 20000
+"""
+import argparse
+import random
+import threading
+import time
+
+from helper.flags import AtomicFlags, Backend, Param
+
+
+def make_flags(strategy: str, instances: int, number_of_bits: int, stripes: int, backend: Backend):
+    """ Создает общие флаги с указанным способом блокировки. """
+    if strategy == 'instance':
+        return [AtomicFlags(number_of_bits, Param.PARAM_BITS, None, backend) for _ in range(instances)]
+    if strategy == 'striped':
+        locks = [threading.Lock() for _ in range(stripes)]
+        return [AtomicFlags(number_of_bits, Param.PARAM_BITS, None, backend, lock=locks[num % stripes])
+                for num in range(instances)]
+    if strategy == 'global':
+        lock = threading.Lock()
+        return [AtomicFlags(number_of_bits, Param.PARAM_BITS, None, backend, lock=lock) for _ in range(instances)]
+    raise ValueError(f"Unknown strategy '{strategy}'")
+
+
+def worker(flags_list, number_of_bits: int, operations: int, seed: int, barrier: threading.Barrier, result: list):
+    """
+    Устанавливает случайные биты через test_and_set и считает, сколько раз бит был установлен именно им,
+    а также переключает биты парами inverse_bit, которые в итоге не должны ничего менять.
+    """
+    rnd = random.Random(seed)
+    won = 0
+    barrier.wait()
+    for _ in range(operations):
+        flags = flags_list[rnd.randrange(len(flags_list))]
+        num = rnd.randint(1, number_of_bits)
+        if rnd.random() < 0.5:
+            won += not flags.test_and_set(num)
+        else:
+            flags.inverse_bits((num,))
+            flags.inverse_bits((num,))
+    result.append(won)
+
+
+def run_case(strategy: str, threads: int, args) -> tuple[float, bool]:
+    """ Возвращает количество операций в секунду и признак того, что изменения не потерялись. """
+    flags_list = make_flags(strategy, args.instances, args.bits, args.stripes, Backend[args.backend])
+    barrier = threading.Barrier(threads + 1)
+    result = []
+    pool = [threading.Thread(target=worker,
+                             args=(flags_list, args.bits, args.operations, seed, barrier, result))
+            for seed in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    consistent = sum(result) == sum(flags.count() for flags in flags_list)
+    return threads * args.operations / elapsed, consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help="Количества потоков.")
+    parser.add_argument('--instances', type=int, default=256, help="Количество общих флагов.")
+    parser.add_argument('--bits', type=int, default=4096, help="Количество бит в каждых флагах.")
+    parser.add_argument('--stripes', type=int, default=16, help="Количество блокировок в наборе.")
+    parser.add_argument('--operations', type=int, default=20000, help="Количество операций на поток.")
+    parser.add_argument('--backend', choices=[backend.name for backend in Backend], default=Backend.INT.name)
+    args = parser.parse_args()
+
+    strategies = ('instance', 'striped', 'global')
+    print(f"{'threads':>8}" + "".join(f"{strategy + ', op/s':>20}" for strategy in strategies))
+    for threads in args.threads:
+        line = f"{threads:>8}"
+        for strategy in strategies:
+            rate, consistent = run_case(strategy, threads, args)
+            line += f"{rate:>19.0f}{' ' if consistent else '!'}"
+        print(line)
+    print("'!' - часть изменений потеряна.")
+
+
+if __name__ == "__main__":
+    main()
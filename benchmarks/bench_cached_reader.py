@@ -0,0 +1,176 @@
+"""
+Время чтения из кэша при попадании: прежние строковые ключи (аргументы форматируются в строку
+на каждый вызов) против ключей-кортежей cached_reader и CachedReader._cached_reader.
+Вторая таблица - то же время с отладочным логгером: без логгера, с логгером без уровня DEBUG,
+с уровнем DEBUG и с уровнем DEBUG, но записью только доли чтений (--sample-rate).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_cached_reader
+    python -m benchmarks.bench_cached_reader --arg-size 10000 --sample-rate 0.001
+
+Прежняя реализация тоже читает из словаря, поэтому разница в основном - стоимость построения ключа,
+которая растет с размером аргументов. Сообщения с уровнем DEBUG форматируются и отбрасываются,
+без записи в поток, чтобы замер не зависел от вывода.
+"""
+import argparse
+import logging
+import time
+import timeit
+from types import SimpleNamespace
+
+from helper.cached_class import CachedReader, cached_reader
+
+
+def old_cached_reader(fn):
+    """ Прежняя реализация декоратора cached_reader. """
+    def func(self, *args, **kwargs):
+        def logger_debug(msg):
+            if hasattr(self, '_BM'):
+                self._BM.logger.debug(msg)
+
+        cache_key = fn.__name__
+        for arg in args:
+            cache_key += f"_{arg}"
+        for key, value in kwargs.items():
+            cache_key += f"_{key}={value}"
+        if cache_key not in self._old_cache:
+            logger_debug(f"Writing data of the '{self.__class__.__name__}' class to the cache by key '{cache_key}'")
+            self._old_cache[cache_key] = fn(self, *args, **kwargs)
+        logger_debug(f"Reading data of the '{self.__class__.__name__}' class from the cache by key '{cache_key}'")
+        return self._old_cache[cache_key]
+    return func
+
+
+def old_method_cached_reader(self, func: callable, *args, **kwargs):
+    """ Прежняя реализация CachedReader._cached_reader. """
+    cache_key = func.__name__
+    for arg in args:
+        cache_key += f"_{arg}"
+    for key, value in kwargs.items():
+        cache_key += f"_{key}={value}"
+    if cache_key not in self._old_cache:
+        self._logger_debug(f"Writing data of the '{self.__class__.__name__}' class to the cache by key '{cache_key}'")
+        self._old_cache[cache_key] = func(*args, **kwargs)
+    self._logger_debug(f"Reading data of the '{self.__class__.__name__}' class from the cache by key '{cache_key}'")
+    return self._old_cache[cache_key]
+
+
+class DiscardHandler(logging.Handler):
+    """ Форматирует сообщения, как настоящий обработчик, но никуда их не пишет. """
+    def emit(self, record):
+        self.format(record)
+
+
+class Reader(CachedReader):
+    def __init__(self, logger=None, log_sample_rate: float = 1.0):
+        super().__init__(logger, log_sample_rate=log_sample_rate)
+        self._old_cache = {}
+        # Декораторы пишут в логгер _BM.logger.
+        if logger is not None:
+            self._BM = SimpleNamespace(logger=logger)
+
+    def _value(self, *args, **kwargs):
+        return len(args)
+
+    @old_cached_reader
+    def old_value(self, *args, **kwargs):
+        return len(args)
+
+    @cached_reader
+    def value(self, *args, **kwargs):
+        return len(args)
+
+    def method_value(self, *args, **kwargs):
+        return self._cached_reader(self._value, *args, **kwargs)
+
+    # Прежняя реализация была методом кэшера, и вызывается она так же, как новая.
+    _old_cached_reader = old_method_cached_reader
+
+    def old_method_value(self, *args, **kwargs):
+        return self._old_cached_reader(self._value, *args, **kwargs)
+
+
+def measure(*funcs, repeat: int = 25) -> list[float]:
+    """
+    Возвращает лучшее время одного вызова каждой функции в секундах.
+    Замеры функций чередуются короткими сериями, а время считается процессорным временем потока,
+    чтобы фоновая нагрузка на машину одинаково искажала все функции и меньше влияла на результат.
+    """
+    timers = [timeit.Timer(func, timer=time.thread_time) for func in funcs]
+    # Серия около 0.02 секунды: autorange подбирает число вызовов на 0.2 секунды.
+    numbers = [max(timer.autorange()[0] // 10, 1) for timer in timers]
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, (timer, number) in enumerate(zip(timers, numbers)):
+            best[i] = min(best[i], timer.timeit(number) / number)
+    return best
+
+
+def run(arg_size: int):
+    reader = Reader()
+    cases = (
+        ("no args", (), {}),
+        ("int arg", (42,), {}),
+        ("str + kwarg", ("name", ), {'b': 3}),
+        (f"tuple of {arg_size}", (tuple(range(arg_size)),), {}),
+    )
+    print(f"{'case':<20}{'old, ns':>10}{'decorator, ns':>16}{'speedup':>10}"
+          f"{'old method, ns':>17}{'method, ns':>13}{'speedup':>10}")
+    for name, args, kwargs in cases:
+        # Первые вызовы заполняют кэш, дальше замеряются только попадания.
+        reader.old_value(*args, **kwargs)
+        reader.value(*args, **kwargs)
+        reader.old_method_value(*args, **kwargs)
+        reader.method_value(*args, **kwargs)
+        old, new, old_method, method = measure(lambda: reader.old_value(*args, **kwargs),
+                                               lambda: reader.value(*args, **kwargs),
+                                               lambda: reader.old_method_value(*args, **kwargs),
+                                               lambda: reader.method_value(*args, **kwargs))
+        print(f"{name:<20}{old * 1e9:>10.0f}{new * 1e9:>16.0f}{old / new:>9.1f}x"
+              f"{old_method * 1e9:>17.0f}{method * 1e9:>13.0f}{old_method / method:>9.1f}x")
+
+
+def make_logger(level: int) -> logging.Logger:
+    logger = logging.getLogger(f'{__name__}.{logging.getLevelName(level)}')
+    logger.setLevel(level)
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(DiscardHandler())
+    return logger
+
+
+def run_logging(sample_rate: float):
+    modes = (
+        ("off", None, 1.0),
+        ("no DEBUG level", make_logger(logging.INFO), 1.0),
+        ("DEBUG", make_logger(logging.DEBUG), 1.0),
+        (f"DEBUG, {sample_rate:g} sampled", make_logger(logging.DEBUG), sample_rate),
+    )
+    args = (42,)
+    print(f"\n{'logging':<26}{'old, ns':>10}{'decorator, ns':>16}{'old method, ns':>17}{'method, ns':>13}")
+    for name, logger, rate in modes:
+        reader = Reader(logger, rate)
+        reader.old_value(*args)
+        reader.value(*args)
+        reader.old_method_value(*args)
+        reader.method_value(*args)
+        old, new, old_method, method = measure(lambda: reader.old_value(*args), lambda: reader.value(*args),
+                                               lambda: reader.old_method_value(*args),
+                                               lambda: reader.method_value(*args))
+        # У прежней реализации нет выборки, ее время с выборкой не отличается от времени с DEBUG.
+        old, old_method = (f"{old * 1e9:.0f}", f"{old_method * 1e9:.0f}") if rate == 1.0 else ("-", "-")
+        print(f"{name:<26}{old:>10}{new * 1e9:>16.0f}{old_method:>17}{method * 1e9:>13.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arg-size', type=int, default=1000, help="Длина кортежа в самом большом аргументе.")
+    parser.add_argument('--sample-rate', type=float, default=0.01,
+                        help="Доля чтений из кэша, о которых пишется сообщение, в последней строке второй таблицы.")
+    args = parser.parse_args()
+    run(args.arg_size)
+    run_logging(args.sample_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Набор замеров основных операций Flags на разном количестве бит: создание, set_bit, set_bits с маской
+в виде строки, кортежа и целого числа, check_bits с обоими условиями, операторы, str_bits и инверсия (~).
+Результаты можно сохранить в JSON и сравнить с сохраненными ранее: если какая-то операция стала
+медленнее больше чем на порог, скрипт завершается с кодом 1, что удобно для проверок в сборке.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_flags
+    python -m benchmarks.bench_flags --sizes 8 64 --backend INT BUFFER --output baseline.json
+    python -m benchmarks.bench_flags --compare baseline.json --threshold 0.2
+
+Сравниваются только операции, которые есть в обоих прогонах. Время замеряется как лучшее
+из нескольких повторов, поэтому для сравнения лучше запускать на одной и той же машине.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+from helper.flags import Backend, Condition, Flags, Param
+
+
+def measure(func, repeat: int) -> float:
+    """ Возвращает лучшее время одного вызова функции в секундах. """
+    timer = timeit.Timer(func)
+    number, time_taken = timer.autorange()
+    # Медленные вызовы не повторяем, одного замера достаточно.
+    if time_taken > 1:
+        return time_taken / number
+    return min(timer.repeat(repeat, number)) / number
+
+
+def make_cases(size: int, backend: Backend, rnd: random.Random):
+    """ Возвращает пары (название операции, функция без аргументов) для указанного количества бит. """
+    value = rnd.getrandbits(size) | 1 << (size - 1)
+    # Маски покрывают примерно шестнадцатую часть бит, но не меньше одного бита.
+    nums = tuple(sorted(rnd.sample(range(1, size + 1), max(1, size // 16))))
+    str_mask = Flags.util_int_to_bitstring(Flags.util_convert_list_num_to_bit_mask(nums))
+    int_mask = Flags.util_convert_list_num_to_bit_mask(nums)
+    flags = Flags(size, Param.PARAM_BITS, value, backend)
+    other = Flags(size, Param.PARAM_BITS, rnd.getrandbits(size), backend)
+    bit = rnd.randint(1, size)
+    return (
+        ("construct", lambda: Flags(size, Param.PARAM_BITS, None, backend)),
+        ("construct_mask", lambda: Flags(size, Param.PARAM_BITS, int_mask, backend)),
+        ("set_bit", lambda: flags.set_bit(bit, 1)),
+        ("set_bits_str", lambda: flags.set_bits(str_mask, 1)),
+        ("set_bits_tuple", lambda: flags.set_bits(nums, 1)),
+        ("set_bits_int", lambda: flags.set_bits(int_mask, 1)),
+        ("check_bits_all", lambda: flags.check_bits(int_mask, 1, Condition.ALL)),
+        ("check_bits_any", lambda: flags.check_bits(int_mask, 1, Condition.ANY)),
+        ("and", lambda: flags & other),
+        ("or", lambda: flags | other),
+        ("xor", lambda: flags ^ other),
+        ("ior", lambda: flags.__ior__(other)),
+        ("eq", lambda: flags == other),
+        ("str_bits", lambda: flags.str_bits),
+        ("invert", lambda: ~flags),
+    )
+
+
+def run(sizes: list[int], backends: list[Backend], repeat: int, seed: int) -> dict[str, float]:
+    """ Замеряет все операции и возвращает время одного вызова по ключу "операция/способ хранения/бит". """
+    rnd = random.Random(seed)
+    results = {}
+    print(f"{'operation':<18}{'backend':>9}{'bits':>10}{'time, s':>14}")
+    for backend in backends:
+        for size in sizes:
+            for name, func in make_cases(size, backend, rnd):
+                time_taken = measure(func, repeat)
+                results[f"{name}/{backend.name}/{size}"] = time_taken
+                print(f"{name:<18}{backend.name:>9}{size:>10}{time_taken:>14.9f}")
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """
+    Сравнивает результаты с базовыми и возвращает ключи операций, которые стали медленнее,
+    чем базовое время, умноженное на (1 + threshold).
+    """
+    regressions = []
+    print(f"\n{'case':<36}{'baseline, s':>14}{'current, s':>14}{'ratio':>8}")
+    for key in sorted(results.keys() & baseline.keys()):
+        ratio = results[key] / baseline[key]
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<36}{baseline[key]:>14.9f}{results[key]:>14.9f}{ratio:>7.2f}x{' !' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8, 64, 4096, 1000000], help="Количества бит.")
+    parser.add_argument('--backend', nargs='+', default=['INT'], choices=[backend.name for backend in Backend],
+                        help="Способы хранения битов.")
+    parser.add_argument('--repeat', type=int, default=3, help="Количество повторов каждого замера.")
+    parser.add_argument('--seed', type=int, default=0, help="Начальное значение генератора случайных масок.")
+    parser.add_argument('--output', help="Файл JSON, в который сохраняются результаты.")
+    parser.add_argument('--compare', help="Файл JSON с базовыми результатами для сравнения.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Допустимое замедление относительно базовых результатов (0.1 - на 10%%).")
+    args = parser.parse_args()
+
+    results = run(args.sizes, [Backend[name] for name in args.backend], args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nЗамедление больше чем на {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Сравнение старых (посимвольных) и новых (через bin/int) преобразований Flags в строку битов и обратно.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_flags_str
+    python -m benchmarks.bench_flags_str --sizes 64 4096 --old-limit 4096
+
+Старые преобразования квадратичны по количеству бит, на миллионе бит каждая занимает десятки секунд.
+Для размеров больше --old-limit они не замеряются.
+"""
+import argparse
+import random
+import timeit
+
+from helper.flags import Flags, Param
+
+
+def old_get_to_str(bits: int, number_of_bits: int) -> str:
+    """ Прежняя реализация Flags.__get_to_str. """
+    str_bits = ""
+    for bit in range(0, number_of_bits):
+        str_bits += "1" if (bits & (1 << bit)) else "0"
+    return str_bits
+
+
+def old_int_to_bitstring(val: int) -> str:
+    """ Прежняя реализация Flags.util_int_to_bitstring. """
+    if val == 0:
+        return "0"
+    num = 0
+    str_bits = ""
+    while True:
+        if val < (1 << num):
+            break
+        num += 1
+    for bit in range(0, num):
+        str_bits += "1" if (val & (1 << bit)) else "0"
+    return str_bits
+
+
+def old_convert_str_to_bit_mask(str_: str) -> int:
+    """ Прежняя реализация Flags.util_convert_str_to_bit_mask. """
+    list_num = []
+    i = 1
+    for char in str_:
+        if char == '1':
+            list_num.append(i)
+        elif char != '0':
+            raise TypeError("Биты могут иметь значения только 1 или 0.")
+        i += 1
+    num_bit = 0
+    for num in list_num:
+        num_bit |= 1 << num - 1
+    return num_bit
+
+
+def measure(func, repeat: int = 3) -> float:
+    """ Возвращает лучшее время одного вызова функции в секундах. """
+    timer = timeit.Timer(func)
+    number, time_taken = timer.autorange()
+    # Медленные вызовы не повторяем, одного замера достаточно.
+    if time_taken > 1:
+        return time_taken / number
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(sizes: list[int], old_limit: int):
+    print(f"{'operation':<28}{'bits':>10}{'old, s':>14}{'new, s':>14}{'speedup':>10}")
+    for size in sizes:
+        value = random.getrandbits(size) | 1 << (size - 1)
+        flags = Flags(size, Param.PARAM_BITS, value)
+        str_bits = flags.str_bits
+        cases = (
+            ("str_bits", lambda: old_get_to_str(value, size), lambda: flags.str_bits),
+            ("util_int_to_bitstring", lambda: old_int_to_bitstring(value), lambda: Flags.util_int_to_bitstring(value)),
+            ("util_convert_str_to_bit_mask", lambda: old_convert_str_to_bit_mask(str_bits),
+             lambda: Flags.util_convert_str_to_bit_mask(str_bits)),
+        )
+        for name, old, new in cases:
+            new_time = measure(new)
+            if size <= old_limit:
+                assert old() == new()
+                old_time = measure(old, repeat=1)
+                print(f"{name:<28}{size:>10}{old_time:>14.6f}{new_time:>14.6f}{old_time / new_time:>9.1f}x")
+            else:
+                print(f"{name:<28}{size:>10}{'skipped':>14}{new_time:>14.6f}{'':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 4096, 1000000], help="Количества бит.")
+    parser.add_argument('--old-limit', type=int, default=1000000,
+                        help="Максимальное количество бит, для которого замеряется старая реализация.")
+    args = parser.parse_args()
+    run(args.sizes, args.old_limit)
+
+
+if __name__ == "__main__":
+    main()
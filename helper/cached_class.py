@@ -1,70 +1,2300 @@
-def cached_reader(fn):
-    """ Декоратор для кэшера. """
-    def func(self, *args, **kwargs):
-        def logger_debug(msg):
-            if hasattr(self, '_BM'):
-                self._BM.logger.debug(msg)
-
-        cache_key = fn.__name__
-        for arg in args:
-            cache_key += f"_{arg}"
-        for key, value in kwargs.items():
-            cache_key += f"_{key}={value}"
-        if cache_key not in self._cache:
-            logger_debug(f"Writing data of the '{self.__class__.__name__}' class to the cache by key '{cache_key}'")
-            self._cache[cache_key] = fn(self, *args, **kwargs)
-        logger_debug(f"Reading data of the '{self.__class__.__name__}' class from the cache by key '{cache_key}'")
-        return self._cache[cache_key]
-    return func
+import asyncio
+import atexit
+import bisect
+import hashlib
+import inspect
+import itertools
+import logging
+import mmap
+import os
+import pickle
+import random
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from enum import IntEnum
+from functools import partial, wraps
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class EvictionPolicy(IntEnum):
+    LRU = 1
+    LFU = 2
+    FIFO = 3
+
+
+class CacheScope(IntEnum):
+    INSTANCE = 1
+    CLASS = 2
+    GLOBAL = 3
+
+
+# Признак отсутствия значения в кэше, None может быть закэшированным значением.
+_MISSING = object()
+# Именованные аргументы вызова без именованных аргументов, чтобы не создавать пустое множество на каждый вызов.
+_NO_KWARGS = frozenset()
+# Результат поиска отсутствующего в кэше ключа.
+_NOT_FOUND = (_MISSING, False)
+
+
+class _FrozenArg:
+    """ Метка неизменяемого представления нехэшируемого аргумента в ключе кэша. """
+
+
+class _Flight:
+    """
+    Вычисление значения по ключу, которое сейчас выполняется в одном из потоков.
+    Остальные потоки, которым нужен тот же ключ, ждут его результат вместо того, чтобы вычислять заново.
+    """
+    __slots__ = ('done', 'thread', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = threading.get_ident()
+        self.value = None
+        self.error = None
+
+
+class CacheMetrics:
+    """
+    Метрики кэша по функциям: попадания, промахи и гистограмма времени вычисления значений при промахах.
+    Собираются, только если подключены к хранилищу (CacheBackend.metrics), иначе чтение из кэша
+    обходится одной проверкой на None. Гистограмма устроена как в Prometheus: для каждой границы
+    считается количество вычислений не дольше нее, а также общее количество и сумма времени.
+    """
+    # Границы корзин гистограммы в секундах, как у гистограмм Prometheus по умолчанию.
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple = BUCKETS, on_compute: callable = None, clock: callable = time.perf_counter):
+        """
+        :param buckets: Возрастающие границы корзин гистограммы времени вычисления в секундах.
+        :param on_compute: Функция, которая вызывается после каждого вычисления значения с именем функции,
+                    временем вычисления в секундах и исключением (None, если вычисление успешно),
+                    например чтобы сразу передать их в свой счетчик.
+        :param clock: Функция текущего времени в секундах для замера вычислений.
+        :raises ValueError: Границы корзин должны возрастать.
+        """
+        buckets = tuple(float(bound) for bound in buckets)
+        if any(low >= high for low, high in zip(buckets, buckets[1:])):
+            raise ValueError("Границы корзин гистограммы должны возрастать.")
+        self.buckets = buckets
+        self.on_compute = on_compute
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Имя функции: [попадания, промахи, количество вычислений в каждой корзине, сумма времени вычислений].
+        self._functions = {}
+
+    def _function(self, name: str) -> list:
+        """ Возвращает счетчики функции, вызывается под блокировкой. """
+        counters = self._functions.get(name)
+        if counters is None:
+            counters = self._functions[name] = [0, 0, [0] * (len(self.buckets) + 1), 0.0]
+        return counters
+
+    def count(self, name: str, hit: bool):
+        """ Учитывает попадание или промах при чтении результата функции. """
+        with self._lock:
+            self._function(name)[0 if hit else 1] += 1
+
+    def observe(self, name: str, seconds: float, error: BaseException = None):
+        """ Учитывает время вычисления значения функции. """
+        with self._lock:
+            counters = self._function(name)
+            counters[2][bisect.bisect_left(self.buckets, seconds)] += 1
+            counters[3] += seconds
+        if self.on_compute is not None:
+            self.on_compute(name, seconds, error)
+
+    def timed(self, name: str, compute: callable) -> callable:
+        """ Возвращает функцию, которая вычисляет значение и учитывает время вычисления. """
+        def timed_compute():
+            error = None
+            start = self._clock()
+            try:
+                return compute()
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.observe(name, self._clock() - start, error)
+        return timed_compute
+
+    def timed_async(self, name: str, compute: callable) -> callable:
+        """ Асинхронный вариант timed: учитывается время до готовности результата корутины. """
+        async def timed_compute():
+            error = None
+            start = self._clock()
+            try:
+                return await compute()
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.observe(name, self._clock() - start, error)
+        return timed_compute
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает метрики по именам функций на момент вызова: hits, misses и compute_seconds с ключами
+        buckets (пары граница - количество вычислений не дольше нее, последняя граница - inf), count и sum.
+        """
+        with self._lock:
+            functions = {name: (hits, misses, tuple(counts), total)
+                         for name, (hits, misses, counts, total) in self._functions.items()}
+        result = {}
+        for name, (hits, misses, counts, total) in functions.items():
+            cumulative = tuple(itertools.accumulate(counts))
+            result[name] = {
+                'hits': hits,
+                'misses': misses,
+                'compute_seconds': {
+                    'buckets': tuple(zip((*self.buckets, float('inf')), cumulative)),
+                    'count': cumulative[-1],
+                    'sum': total,
+                },
+            }
+        return result
+
+    def reset(self):
+        """ Обнуляет все метрики. """
+        with self._lock:
+            self._functions.clear()
+
+
+class CacheBackend:
+    """
+    Хранилище кэша CachedReader. Наследники хранят записи (в памяти процесса, в общей памяти, на диске)
+    и реализуют методы lookup, set, invalidate, find, find_all, names, clear, discard, __contains__, __len__,
+    а также _peek и _labels. Базовый класс по ним согласует вычисления: одно вычисление значения на ключ
+    среди потоков процесса (get_or_compute) и задач asyncio (get_or_compute_async) и фоновое обновление
+    устаревших значений (refresh, refresh_async).
+
+    У каждой записи может быть свое время жизни (ttl) в секундах. После него запись еще stale_while_revalidate
+    секунд считается устаревшей: lookup возвращает ее с признаком устаревания, чтобы ее можно было
+    отдать сразу и обновить в фоне. Потом запись удаляется при первом обращении.
+    Счетчики hits, misses и evictions ведутся в каждом процессе свои и меняются под блокировкой кэша.
+    Исключение - попадания MemoryCache, которые читаются без блокировки (см. MemoryCache.lookup):
+    при одновременных чтениях из нескольких потоков hits может оказаться немного меньше настоящего,
+    поэтому счетчики годятся для оценки доли попаданий, но не для точного учета.
+    """
+    def __init__(self, ttl: float = None, stale_while_revalidate: float = 0, clock: callable = time.monotonic):
+        """
+        :param ttl: Время жизни записей по умолчанию в секундах. Если None, то записи не истекают.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей
+                    по умолчанию, пока она обновляется.
+        :param clock: Функция текущего времени в секундах.
+        :raises ValueError: Время жизни не может быть отрицательным.
+        """
+        _validate_ttl(ttl, stale_while_revalidate)
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self._clock = clock
+        # Вычисления значений, которые сейчас выполняются, по ключам. Запись удаляется, как только значение готово.
+        self._flights = {}
+        # Задачи asyncio, которые сейчас вычисляют значения, по ключам.
+        self._tasks = {}
+        # Блокировка служебных данных кэша, удерживается только на время их изменения.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Метрики по функциям, если они собираются.
+        self.metrics: CacheMetrics | None = None
+        # Записи, которые сейчас можно читать без блокировки и без вызова lookup (см. MemoryCache), иначе None.
+        self._lock_free = None
+
+    def get(self, key, default=None):
+        """
+        Возвращает свежее значение по ключу и учитывает попадание или промах.
+        :param key: Ключ.
+        :param default: Значение, которое возвращается, если ключа нет в кэше или оно истекло.
+        :return:
+        """
+        value, stale = self.lookup(key)
+        if value is _MISSING:
+            return default
+        if stale:
+            # Устаревшее значение через get не отдается, поэтому это промах.
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return default
+        return value
+
+    def lookup(self, key) -> tuple:
+        """
+        Возвращает значение по ключу и признак того, что оно устарело и его надо обновить.
+        Окончательно истекшая запись удаляется. Если значения нет, то возвращается (_MISSING, False).
+        :param key: Ключ.
+        :return:
+        """
+        raise NotImplementedError
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, ttl: float = None, stale_while_revalidate: float = None, name: str = None,
+            tags: tuple = ()):
+        """
+        Записывает значение со своим временем жизни.
+        :param key: Ключ.
+        :param value: Значение.
+        :param ttl: Время жизни записи в секундах. Если None, то берется время жизни кэша по умолчанию.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+                    Если None, то берется значение кэша по умолчанию.
+        :param name: Строковое имя записи, по которому ее можно найти методом find.
+        :param tags: Теги записи, по которым ее можно сбросить вместе с группой методом invalidate.
+        :return:
+        """
+        raise NotImplementedError
+
+    def invalidate(self, tag) -> int:
+        """
+        Удаляет все записи с указанным тегом.
+        :param tag: Тег.
+        :return: Количество удаленных записей, 0 если записей с таким тегом нет.
+        """
+        raise NotImplementedError
+
+    def find(self, name: str, default=None):
+        """
+        Возвращает ключ записи по ее строковому имени. Если записей с этим именем несколько,
+        то ключ последней записанной.
+        :param name: Имя записи.
+        :param default: Значение, которое возвращается, если записи с таким именем нет.
+        :return:
+        """
+        raise NotImplementedError
+
+    def find_all(self, name: str) -> tuple:
+        """
+        Возвращает ключи всех записей с указанным строковым именем в порядке записи. Одно имя может быть
+        у разных ключей, например у y_value(1) и y_value('1').
+        :param name: Имя записей.
+        :return: Ключи, пустой кортеж если записей с таким именем нет.
+        """
+        raise NotImplementedError
+
+    def names(self) -> tuple:
+        """ Возвращает строковые имена записей на момент вызова. """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Удаляет все записи, счетчики попаданий, промахов и вытеснений сохраняются. """
+        raise NotImplementedError
+
+    def discard(self, key) -> bool:
+        """
+        Удаляет запись по ключу, если она есть. В отличие от del не выбрасывает исключение, поэтому
+        годится, когда запись могла истечь или быть вытеснена после проверки.
+        :param key: Ключ.
+        :return: True, если запись была удалена. False, если ее не было.
+        """
+        raise NotImplementedError
+
+    def __contains__(self, key):
+        raise NotImplementedError
+
+    def __delitem__(self, key):
+        if not self.discard(key):
+            raise KeyError(key)
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def entries_info(self) -> list:
+        """
+        Возвращает для каждой записи ключ, примерный объем значения в байтах и возраст записи в секундах
+        (None, если он не известен). Хранилища вне памяти процесса записи ради статистики не перебирают
+        и возвращают пустой список.
+        """
+        return []
+
+    def _peek(self, key):
+        """ Возвращает свежее значение по ключу без учета попаданий, вызывается под блокировкой. """
+        raise NotImplementedError
+
+    def _labels(self, key) -> tuple:
+        """ Возвращает имя и теги записи, вызывается под блокировкой. """
+        raise NotImplementedError
+
+    def get_or_compute(self, key, compute: callable, ttl: float = None, stale_while_revalidate: float = None,
+                       name: str = None, tags: tuple = ()):
+        """
+        Возвращает свежее значение по ключу, а если его нет, то вычисляет и записывает его.
+        Пока значение вычисляется, другие потоки, запросившие тот же ключ, ждут и получают тот же результат
+        или то же исключение. Блокировка кэша на время вычисления не удерживается.
+        :param key: Ключ.
+        :param compute: Функция без аргументов, которая вычисляет значение.
+        :param ttl: Время жизни записи.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+        :param name: Строковое имя записи.
+        :param tags: Теги записи.
+        :return:
+        :raises RuntimeError: Значение по ключу запрошено во время его же вычисления в том же потоке.
+        """
+        with self._lock:
+            value = self._peek(key)
+            if value is not _MISSING:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            return self._run_flight(key, flight, compute, ttl, stale_while_revalidate, name, tags)
+        if flight.thread == threading.get_ident():
+            raise RuntimeError(f"Значение кэша по ключу {key!r} запрошено во время его же вычисления.")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def get_or_compute_async(self, key, compute: callable, ttl: float = None,
+                                   stale_while_revalidate: float = None, name: str = None, tags: tuple = ()):
+        """
+        Асинхронный вариант get_or_compute: compute возвращает корутину, а ее результат вычисляется
+        в одной задаче asyncio, которую ждут все, кто запросил тот же ключ. Отмена одного из ожидающих
+        не отменяет задачу для остальных. Исключение передается всем ожидающим и не кэшируется.
+        :param key: Ключ.
+        :param compute: Функция без аргументов, которая возвращает корутину, вычисляющую значение.
+        :param ttl: Время жизни записи.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+        :param name: Строковое имя записи.
+        :param tags: Теги записи.
+        :return:
+        """
+        return await asyncio.shield(self._task(key, compute, ttl, stale_while_revalidate, name, tags, True))
+
+    def refresh_async(self, key, compute: callable, ttl: float = None, stale_while_revalidate: float = None,
+                      on_error: callable = None):
+        """
+        Асинхронный вариант refresh: пересчитывает значение в задаче asyncio текущего цикла событий.
+        :param key: Ключ.
+        :param compute: Функция без аргументов, которая возвращает корутину, вычисляющую значение.
+        :param ttl: Время жизни новой записи.
+        :param stale_while_revalidate: Сколько секунд после истечения новую запись можно отдавать устаревшей.
+        :param on_error: Функция, которой передается исключение при ошибке вычисления.
+        :return:
+        """
+        with self._lock:
+            name, tags = self._labels(key)
+        task = self._task(key, compute, ttl, stale_while_revalidate, name, tags, False)
+        if task is not None:
+            task.add_done_callback(lambda done: done.cancelled() or done.exception() is None or
+                                   on_error is None or on_error(done.exception()))
+
+    def _task(self, key, compute: callable, ttl: float | None, stale_while_revalidate: float | None,
+              name: str | None, tags: tuple, join: bool) -> asyncio.Future | None:
+        """
+        Возвращает задачу, которая вычисляет значение по ключу в текущем цикле событий, создавая ее при
+        необходимости. Если значение уже есть, то возвращается готовый Future с ним.
+        Если join ложно, то уже выполняющаяся задача не возвращается, а возвращается None.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if join:
+                value = self._peek(key)
+                if value is not _MISSING:
+                    future = loop.create_future()
+                    future.set_result(value)
+                    return future
+            task = self._tasks.get(key)
+            # Задачу другого цикла событий ждать нельзя, поэтому в нем значение вычисляется своей задачей.
+            if task is not None and task.get_loop() is loop:
+                return task if join else None
+            task = self._tasks[key] = loop.create_task(self._run_task(key, compute, ttl, stale_while_revalidate,
+                                                                      name, tags))
+            return task
+
+    async def _run_task(self, key, compute: callable, ttl: float | None, stale_while_revalidate: float | None,
+                        name: str | None, tags: tuple):
+        """ Вычисляет значение корутиной и записывает его, после чего задача перестает быть общей. """
+        try:
+            value = await compute()
+            self.set(key, value, ttl, stale_while_revalidate, name, tags)
+            return value
+        finally:
+            with self._lock:
+                if self._tasks.get(key) is asyncio.current_task():
+                    del self._tasks[key]
+
+    def _run_flight(self, key, flight: _Flight, compute: callable, ttl: float | None,
+                    stale_while_revalidate: float | None, name: str | None, tags: tuple):
+        """ Вычисляет значение, записывает его и будит ждущие потоки. """
+        try:
+            flight.value = compute()
+            self.set(key, flight.value, ttl, stale_while_revalidate, name, tags)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def refresh(self, key, compute: callable, ttl: float = None, stale_while_revalidate: float = None,
+                on_error: callable = None):
+        """
+        Пересчитывает значение в фоновом потоке и записывает его в кэш. Если значение по этому ключу
+        уже вычисляется, то второй поток не запускается. При ошибке остается прежнее значение,
+        а ошибка передается в on_error.
+        :param key: Ключ.
+        :param compute: Функция без аргументов, которая вычисляет новое значение.
+        :param ttl: Время жизни новой записи.
+        :param stale_while_revalidate: Сколько секунд после истечения новую запись можно отдавать устаревшей.
+        :param on_error: Функция, которой передается исключение при ошибке вычисления.
+        :return:
+        """
+        with self._lock:
+            if key in self._flights:
+                return
+            flight = self._flights[key] = _Flight()
+            flight.thread = None
+            name, tags = self._labels(key)
+
+        def run():
+            # Поток обновления сам вычисляет значение, поэтому запоминаем его как вычисляющий.
+            flight.thread = threading.get_ident()
+            try:
+                self._run_flight(key, flight, compute, ttl, stale_while_revalidate, name, tags)
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+
+        threading.Thread(target=run, name=f"cache-refresh-{key}", daemon=True).start()
+
+
+class MemoryCache(CacheBackend):
+    """
+    Кэш в памяти с ограничением по количеству записей и по примерному объему значений в байтах.
+    Когда ограничение превышено, вытесняются записи в соответствии с политикой:
+    EvictionPolicy.LRU - дольше всех не читавшиеся, EvictionPolicy.LFU - реже всех читавшиеся,
+    EvictionPolicy.FIFO - раньше всех записанные.
+    Объем значения оценивается функцией sizeof, по умолчанию sys.getsizeof, то есть без вложенных объектов.
+    Счетчики hits, misses и evictions помогают подобрать ограничения по реальной нагрузке.
+
+    Кэш можно использовать из нескольких потоков. Служебные данные меняются под общей блокировкой,
+    которая не удерживается во время вычисления значений. Метод get_or_compute вычисляет значение
+    по ключу один раз, сколько бы потоков ни запросили его одновременно, а get_or_compute_async
+    так же вычисляет результат корутины в одной задаче asyncio на всех ожидающих.
+
+    Записи можно сохранить в файл методом save и подхватить после перезапуска методом load.
+    Снимок не читается целиком: запись переносится из него в кэш при первом обращении к ее ключу.
+    Методам, которым нужны все записи (invalidate, find, names, __len__, перебор ключей),
+    снимок сначала дочитывается.
+    """
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 policy: EvictionPolicy = EvictionPolicy.LRU, sizeof: callable = sys.getsizeof,
+                 ttl: float = None, stale_while_revalidate: float = 0, clock: callable = time.monotonic):
+        """
+        :param max_entries: Максимальное количество записей. Если None, то не ограничено.
+        :param max_bytes: Максимальный суммарный объем значений в байтах. Если None, то не ограничен.
+        :param policy: Политика вытеснения записей.
+        :param sizeof: Функция оценки объема значения в байтах.
+        :param ttl: Время жизни записей по умолчанию в секундах. Если None, то записи не истекают.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей
+                    по умолчанию, пока она обновляется.
+        :param clock: Функция текущего времени в секундах.
+        :raises ValueError: Ограничение должно быть целым положительным числом. |
+                            Неизвестная политика вытеснения. |
+                            Время жизни не может быть отрицательным.
+        """
+        for limit in (max_entries, max_bytes):
+            if limit is not None and not (isinstance(limit, int) and limit > 0):
+                raise ValueError("Ограничение кэша должно быть целым положительным числом.")
+        super().__init__(ttl, stale_while_revalidate, clock)
+        if policy not in (1, 2, 3):
+            raise ValueError("Политика вытеснения может быть только EvictionPolicy.LRU (1), "
+                             "EvictionPolicy.LFU (2) или EvictionPolicy.FIFO (3).")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = EvictionPolicy(policy)
+        self._bounded = max_entries is not None or max_bytes is not None
+        self._sizeof = sizeof
+        # Записи хранятся в порядке вытеснения для LRU и FIFO.
+        self._data = OrderedDict()
+        # Объем значений считается только если он ограничен.
+        self._sizes = {}
+        self.total_bytes = 0
+        # Для LFU: количество чтений каждого ключа и ключи, сгруппированные по количеству чтений
+        # в порядке записи, чтобы и чтение, и вытеснение не зависели от количества записей.
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+        # Сроки записей, у которых есть время жизни: (свежая до, устаревшая до).
+        self._expires = {}
+        # Ключи записей по строковым именам (словарь вместо множества хранит порядок записи)
+        # для сброса по имени и обратное соответствие для их удаления.
+        self._names = {}
+        self._key_names = {}
+        # Индекс групп записей по тегам (функция, функция с первыми аргументами, пространство имен)
+        # и теги каждой записи, чтобы группу можно было сбросить за время, пропорциональное ее размеру.
+        self._tags = {}
+        self._key_tags = {}
+        # Снимок, из которого записи еще не перенесены в кэш.
+        self._snapshot = None
+        # Время записи значений по часам кэша, ведется только пока собираются метрики.
+        self._created = {}
+        self._lock_free = None if self._bounded else self._data
+
+    def _update_lock_free(self):
+        """
+        Разрешает читать записи без блокировки, если попадание не меняет служебных данных: кэш не ограничен,
+        у записей нет сроков и снимка нет. Вызывается под блокировкой, когда одно из условий могло измениться.
+        """
+        self._lock_free = self._data if not self._bounded and not self._expires and self._snapshot is None else None
+
+    def lookup(self, key) -> tuple:
+        """
+        Возвращает значение по ключу и признак того, что оно устарело и его надо обновить.
+        Окончательно истекшая запись удаляется. Если значения нет, то возвращается (_MISSING, False).
+        :param key: Ключ.
+        :return:
+        """
+        # Попадание в неограниченный кэш без сроков и снимка не меняет служебных данных, а чтение словаря
+        # атомарно, поэтому обходится без блокировки: она дороже самого чтения. Счетчик попаданий при этом
+        # приблизительный (см. CacheBackend).
+        data = self._lock_free
+        if data is not None:
+            value = data.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value, False
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING and self._snapshot is not None:
+                value = self._restore(key)
+            if value is _MISSING:
+                self.misses += 1
+                return _NOT_FOUND
+            stale = False
+            if self._expires:
+                expires = self._expires.get(key)
+                if expires is not None:
+                    now = self._clock()
+                    if now >= expires[0]:
+                        if now >= expires[1]:
+                            self._discard(key)
+                            self.misses += 1
+                            return _NOT_FOUND
+                        stale = True
+            self.hits += 1
+            # Порядок записей важен только для вытеснения, поэтому в неограниченном кэше не поддерживается.
+            if self._bounded:
+                if self.policy == EvictionPolicy.LRU:
+                    self._data.move_to_end(key)
+                elif self.policy == EvictionPolicy.LFU:
+                    self._bump(key)
+            return value, stale
+
+    def _bump(self, key):
+        """ Переносит ключ в группу с количеством чтений на единицу больше. """
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def set(self, key, value, ttl: float = None, stale_while_revalidate: float = None, name: str = None,
+            tags: tuple = ()):
+        """
+        Записывает значение со своим временем жизни.
+        :param key: Ключ.
+        :param value: Значение.
+        :param ttl: Время жизни записи в секундах. Если None, то берется время жизни кэша по умолчанию.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+                    Если None, то берется значение кэша по умолчанию.
+        :param name: Строковое имя записи, по которому ее можно найти методом find.
+        :param tags: Теги записи, по которым ее можно сбросить вместе с группой методом invalidate.
+        :return:
+        """
+        with self._lock:
+            self._set(key, value, ttl, stale_while_revalidate, name, tags)
+
+    def _set(self, key, value, ttl: float | None, stale_while_revalidate: float | None, name: str | None,
+             tags: tuple):
+        """ Записывает значение, вызывается под блокировкой. """
+        if key in self._data:
+            self._discard(key)
+        elif self._snapshot is not None:
+            self._forget(key)
+        size = 0
+        if self.max_bytes is not None:
+            size = self._sizeof(value)
+            # Значение, которое больше всего кэша, не сохраняем, чтобы не вытеснять ради него все записи.
+            if size > self.max_bytes:
+                return
+            while self._data and self.total_bytes + size > self.max_bytes:
+                self._evict()
+            self._sizes[key] = size
+            self.total_bytes += size
+        # Вытесняем до записи, чтобы в LFU новая запись не оказалась сразу первой на вытеснение.
+        if self.max_entries is not None:
+            while len(self._data) >= self.max_entries:
+                self._evict()
+        self._data[key] = value
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None:
+            stale_while_revalidate = self.stale_while_revalidate if stale_while_revalidate is None \
+                else stale_while_revalidate
+            expires = self._clock() + ttl
+            self._expires[key] = (expires, expires + stale_while_revalidate)
+            self._lock_free = None
+        if name is not None:
+            self._names.setdefault(name, {})[key] = None
+            self._key_names[key] = name
+        if tags:
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        if self.metrics is not None:
+            self._created[key] = self._clock()
+        if self._bounded and self.policy == EvictionPolicy.LFU:
+            self._counts[key] = 1
+            self._buckets.setdefault(1, OrderedDict())[key] = None
+            self._min_count = 1
+
+    def load(self, path: str, version: str = None) -> bool:
+        """
+        Подключает снимок, сохраненный методом save. Записи снимка переносятся в кэш при первом обращении
+        к их ключам, окончательно истекшие к этому времени записи пропускаются.
+        Записи без времени жизни получают время жизни кэша по умолчанию.
+        :param path: Путь к файлу снимка.
+        :param version: Версия данных, например версия приложения. Снимок другой версии не подключается.
+        :return: True, если снимок подключен. False, если файла нет, он поврежден или другой версии.
+        """
+        try:
+            snapshot = _Snapshot(path, version)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            self._snapshot = snapshot
+            self._lock_free = None
+        return True
+
+    def save(self, path: str, version: str = None) -> int:
+        """
+        Сохраняет записи в снимок вместе с их сроками, включая еще не перенесенные записи подключенного снимка.
+        Записи, ключи или значения которых нельзя сериализовать pickle, не сохраняются.
+        :param path: Путь к файлу снимка. Файл заменяется целиком, когда снимок дописан.
+        :param version: Версия данных.
+        :return: Количество сохраненных записей.
+        """
+        # Снимок сохраняют периодический поток, выход из процесса и явные вызовы, иногда несколько кэшей
+        # в один файл. Сохранения выполняются по очереди, чтобы более старое состояние не заменило новое.
+        with _Snapshot.lock:
+            return self._save(path, version)
+
+    def _save(self, path: str, version: str | None) -> int:
+        """ Сохраняет снимок, вызывается под блокировкой сохранения снимков. """
+        with self._lock:
+            items = [(key, value, self._key_names.get(key), self._key_tags.get(key, ()), self._expires.get(key))
+                     for key, value in self._data.items()]
+            rest = [] if self._snapshot is None else list(self._snapshot.rest())
+            clock_offset = time.time() - self._clock()
+        infinity = float('inf')
+        now = time.time()
+        entries = [entry for entry in rest if entry[3] > now]
+        for key, value, name, tags, expires in items:
+            fresh_until, stale_until = (infinity, infinity) if expires is None else \
+                (expires[0] + clock_offset, expires[1] + clock_offset)
+            if stale_until <= now:
+                continue
+            try:
+                entries.append((_key_digest(key), pickle.dumps((key, value, name, tags), protocol=4),
+                                fresh_until, stale_until))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                continue
+        _Snapshot.write(path, entries, version)
+        return len(entries)
+
+    def _restore(self, key):
+        """ Переносит запись из снимка в кэш, вызывается под блокировкой. Возвращает значение или _MISSING. """
+        try:
+            entry = self._snapshot.take(_key_digest(key))
+        except TypeError:
+            return _MISSING
+        if self._snapshot.exhausted:
+            self._snapshot.close()
+            self._snapshot = None
+            self._update_lock_free()
+        if entry is None:
+            return _MISSING
+        self._put(key, *entry[1:])
+        return self._data.get(key, _MISSING)
+
+    def _put(self, key, value, name: str | None, tags: tuple, fresh_until: float, stale_until: float):
+        """ Записывает значение из снимка, переводя его сроки на часы кэша. """
+        now = time.time()
+        if stale_until <= now:
+            return
+        ttl = stale_while_revalidate = None
+        if fresh_until != float('inf'):
+            ttl, stale_while_revalidate = fresh_until - now, stale_until - fresh_until
+        self._set(key, value, ttl, stale_while_revalidate, name, tags)
+
+    def _forget(self, key) -> bool:
+        """
+        Отмечает запись снимка замененной, вызывается под блокировкой.
+        Возвращает True, если в снимке была еще не истекшая запись с этим ключом.
+        """
+        try:
+            return self._snapshot.discard(_key_digest(key))
+        except TypeError:
+            return False
+
+    def _drain(self):
+        """ Переносит в кэш все оставшиеся записи снимка, вызывается под блокировкой. """
+        snapshot, self._snapshot = self._snapshot, None
+        for _, record, fresh_until, stale_until in snapshot.rest():
+            record = snapshot.unpack(record)
+            if record is not None:
+                self._put(*record, fresh_until, stale_until)
+        snapshot.close()
+        self._update_lock_free()
+
+    def _evict(self):
+        """ Вытесняет одну запись в соответствии с политикой. """
+        if self.policy == EvictionPolicy.LFU:
+            if self._min_count not in self._buckets:
+                self._min_count = min(self._buckets)
+            key = next(iter(self._buckets[self._min_count]))
+        else:
+            key = next(iter(self._data))
+        self._discard(key)
+        self.evictions += 1
+
+    def _discard(self, key):
+        """ Удаляет запись и ее служебные данные. """
+        del self._data[key]
+        self.total_bytes -= self._sizes.pop(key, 0)
+        if self._expires.pop(key, None) is not None and not self._expires:
+            self._update_lock_free()
+        if self._created:
+            self._created.pop(key, None)
+        name = self._key_names.pop(key, None)
+        if name is not None:
+            group = self._names[name]
+            del group[key]
+            if not group:
+                del self._names[name]
+        for tag in self._key_tags.pop(key, ()):
+            group = self._tags[tag]
+            group.discard(key)
+            if not group:
+                del self._tags[tag]
+        count = self._counts.pop(key, None)
+        if count is not None:
+            bucket = self._buckets[count]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[count]
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def discard(self, key) -> bool:
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+                return True
+            # Запись снимка не распаковывается, а только отмечается удаленной.
+            return self._snapshot is not None and self._forget(key)
+
+    def __contains__(self, key):
+        if key in self._data:
+            return True
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        try:
+            return _key_digest(key) in snapshot
+        except TypeError:
+            return False
+
+    def __len__(self):
+        if self._snapshot is not None:
+            with self._lock:
+                if self._snapshot is not None:
+                    self._drain()
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        if self._snapshot is not None:
+            with self._lock:
+                if self._snapshot is not None:
+                    self._drain()
+        return self._data.keys()
+
+    def find(self, name: str, default=None):
+        """
+        Возвращает ключ записи по ее строковому имени.
+        :param name: Имя записи.
+        :param default: Значение, которое возвращается, если записи с таким именем нет.
+        :return:
+        """
+        keys = self.find_all(name)
+        return keys[-1] if keys else default
+
+    def find_all(self, name: str) -> tuple:
+        with self._lock:
+            if self._snapshot is not None:
+                self._drain()
+            return tuple(self._names.get(name, ()))
+
+    def invalidate(self, tag) -> int:
+        """
+        Удаляет все записи с указанным тегом за время, пропорциональное количеству этих записей.
+        :param tag: Тег.
+        :return: Количество удаленных записей, 0 если записей с таким тегом нет.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                self._drain()
+            keys = tuple(self._tags.get(tag, ()))
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def names(self) -> tuple:
+        """ Возвращает строковые имена записей на момент вызова. """
+        with self._lock:
+            if self._snapshot is not None:
+                self._drain()
+            return tuple(self._names)
+
+    def clear(self):
+        """
+        Удаляет все записи, включая записи подключенного снимка.
+        Счетчики попаданий, промахов и вытеснений сохраняются.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+            self._data.clear()
+            self._sizes.clear()
+            self._counts.clear()
+            self._buckets.clear()
+            self._expires.clear()
+            self._names.clear()
+            self._key_names.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self._created.clear()
+            self._min_count = 0
+            self.total_bytes = 0
+            self._update_lock_free()
+
+    def entries_info(self) -> list:
+        """
+        Возвращает для каждой записи ключ, примерный объем значения в байтах и возраст записи в секундах
+        (None, если запись сделана до подключения метрик). Объем оценивается функцией sizeof,
+        а если объем кэша ограничен, то берется оценка, сделанная при записи.
+        Записи подключенного снимка, еще не перенесенные в кэш, не учитываются.
+        """
+        with self._lock:
+            items = list(self._data.items())
+            sizes = dict(self._sizes)
+            created = dict(self._created)
+            now = self._clock()
+        info = []
+        for key, value in items:
+            size = sizes.get(key)
+            started = created.get(key)
+            info.append((key, self._sizeof(value) if size is None else size,
+                         None if started is None else now - started))
+        return info
+
+    def _peek(self, key):
+        """ Возвращает свежее значение по ключу без учета попаданий, вызывается под блокировкой. """
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING and self._snapshot is not None:
+            value = self._restore(key)
+        if value is not _MISSING:
+            expires = self._expires.get(key)
+            if expires is not None and self._clock() >= expires[0]:
+                return _MISSING
+        return value
+
+    def _labels(self, key) -> tuple:
+        """ Возвращает имя и теги записи, вызывается под блокировкой. """
+        return self._key_names.get(key), self._key_tags.get(key, ())
+
+
+def _canonical(value):
+    """
+    Возвращает представление ключа, которое сериализуется одинаково во всех процессах:
+    порядок элементов множеств зависит от хэшей строк, которые у каждого процесса свои, поэтому они сортируются.
+    """
+    if isinstance(value, tuple):
+        return tuple(_canonical(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        items = (_canonical(item) for item in value)
+        return _FrozenArg, frozenset, tuple(sorted(items, key=lambda item: pickle.dumps(item, protocol=4)))
+    return value
+
+
+def _key_digest(key) -> bytes:
+    """
+    Возвращает отпечаток ключа для общих хранилищ, одинаковый во всех процессах.
+    :raises TypeError: Ключ нехэшируемый, как и в MemoryCache, или его нельзя сериализовать.
+    """
+    hash(key)
+    try:
+        return hashlib.blake2b(pickle.dumps(_canonical(key), protocol=4), digest_size=16).digest()
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise TypeError(f"Ключ кэша {key!r} нельзя сохранить в общем хранилище.") from e
+
+
+class _Snapshot:
+    """
+    Снимок MemoryCache в файле, отображенном в память (mmap).
+    Файл: заголовок, версия, указатель записей, отсортированный по отпечаткам ключей, и сами записи.
+    Запись ищется двоичным поиском прямо в отображении, а распаковывается только при первом обращении к ней.
+    При открытии проверяются только заголовок, размер указателя и граница последней записи, а границы остальных
+    записей - при их чтении, поэтому открытие снимка не зависит от его размера. Сроки записей хранятся по time.time,
+    так как монотонные часы после перезапуска процесса отсчитываются заново.
+    """
+    MAGIC = b'MLSNAP01'
+    # Заголовок: метка, длина версии в байтах, количество записей.
+    HEADER = struct.Struct('<8sIQ')
+    # Запись указателя: отпечаток ключа, смещение записи, ее длина, свежая до, устаревшая до.
+    ENTRY = struct.Struct('<16sQIdd')
+    # Блокировка сохранения снимков в процессе.
+    lock = threading.Lock()
+
+    def __init__(self, path: str, version: str = None):
+        """
+        :param path: Путь к файлу снимка.
+        :param version: Версия данных. Снимок другой версии не открывается.
+        :raises FileNotFoundError: Файла нет.
+        :raises ValueError: Файл не является снимком кэша. | Версия снимка не совпадает с указанной. |
+                            Снимок обрезан или поврежден.
+        """
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < self.HEADER.size:
+                raise ValueError(f"Файл '{path}' не является снимком кэша.")
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._check(path, version)
+        except ValueError:
+            self.close()
+            raise
+        # Номера записей, которые уже перенесены в кэш или заменены новыми значениями.
+        self._taken = set()
+
+    def _check(self, path: str, version: str | None):
+        """
+        Читает заголовок и проверяет, что указатели и последняя запись помещаются в файл: иначе обрезанный
+        снимок подключился бы, а его записи потом молча пропадали бы. Записи лежат в порядке указателей,
+        поэтому обрезанный файл теряет последнюю запись первой.
+        :raises ValueError: Файл не является снимком кэша. | Версия снимка не совпадает с указанной. |
+                            Снимок обрезан или поврежден.
+        """
+        magic, version_length, self.count = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"Файл '{path}' не является снимком кэша.")
+        self._index = self.HEADER.size + version_length
+        size = len(self._map)
+        if self._index + self.count * self.ENTRY.size > size:
+            raise ValueError(f"Снимок кэша '{path}' обрезан или поврежден.")
+        saved_version = self._map[self.HEADER.size:self._index].decode()
+        if saved_version != (version or ''):
+            raise ValueError(f"Версия снимка кэша '{saved_version}' не совпадает с '{version or ''}'.")
+        if self.count:
+            _, offset, length, _, _ = self._entry(self.count - 1)
+            if offset + length > size:
+                raise ValueError(f"Снимок кэша '{path}' обрезан или поврежден.")
+
+    @classmethod
+    def write(cls, path: str, entries: list, version: str = None):
+        """
+        Записывает снимок во временный файл и заменяет им прежний, чтобы читатели не увидели файл недописанным.
+        Имя временного файла уникально, поэтому одновременные сохранения в один путь, в том числе из разных
+        процессов, не пишут в один файл: снимком остается тот, который заменил файл последним.
+        :param path: Путь к файлу снимка.
+        :param entries: Записи: отпечаток ключа, байты записи, свежая до, устаревшая до.
+        :param version: Версия данных.
+        """
+        version = (version or '').encode()
+        entries = sorted(entries, key=lambda entry: entry[0])
+        offset = cls.HEADER.size + len(version) + len(entries) * cls.ENTRY.size
+        descriptor, temp_path = tempfile.mkstemp(suffix='.tmp', prefix=f"{os.path.basename(path)}.",
+                                                 dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with open(descriptor, 'wb') as file:
+                file.write(cls.HEADER.pack(cls.MAGIC, len(version), len(entries)))
+                file.write(version)
+                for digest, record, fresh_until, stale_until in entries:
+                    file.write(cls.ENTRY.pack(digest, offset, len(record), fresh_until, stale_until))
+                    offset += len(record)
+                for entry in entries:
+                    file.write(entry[1])
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _entry(self, position: int) -> tuple:
+        return self.ENTRY.unpack_from(self._map, self._index + position * self.ENTRY.size)
+
+    def _position(self, digest: bytes) -> int:
+        """ Возвращает номер записи с отпечатком digest, еще не перенесенной в кэш, или -1. """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and low not in self._taken and self._entry(low)[0] == digest:
+            return low
+        return -1
+
+    def __contains__(self, digest: bytes):
+        position = self._position(digest)
+        return position >= 0 and self._entry(position)[4] > time.time()
+
+    def take(self, digest: bytes) -> tuple | None:
+        """
+        Забирает запись из снимка.
+        :return: Ключ, значение, имя, теги, свежая до, устаревшая до или None, если записи нет.
+        """
+        position = self._position(digest)
+        if position < 0:
+            return None
+        self._taken.add(position)
+        _, offset, length, fresh_until, stale_until = self._entry(position)
+        record = self._record(offset, length)
+        record = None if record is None else self.unpack(record)
+        return None if record is None else (*record, fresh_until, stale_until)
+
+    def _record(self, offset: int, length: int) -> bytes | None:
+        """ Возвращает байты записи или None, если указатель поврежден и запись выходит за пределы файла. """
+        if offset + length > len(self._map):
+            return None
+        return self._map[offset:offset + length]
+
+    @staticmethod
+    def unpack(record: bytes) -> tuple | None:
+        """
+        Распаковывает запись: ключ, значение, имя, теги.
+        Если класс значения с тех пор переименован или удален, то возвращается None, как будто записи нет.
+        """
+        try:
+            return pickle.loads(record)
+        except (pickle.UnpicklingError, AttributeError, ImportError, EOFError, ValueError):
+            return None
+
+    def discard(self, digest: bytes) -> bool:
+        """
+        Отмечает запись замененной, чтобы прежнее значение не вернулось из снимка.
+        :return: True, если запись была и еще не истекла окончательно.
+        """
+        position = self._position(digest)
+        if position < 0:
+            return False
+        self._taken.add(position)
+        return self._entry(position)[4] > time.time()
+
+    def rest(self):
+        """ Перебирает записи, еще не перенесенные в кэш: отпечаток, байты записи, свежая до, устаревшая до. """
+        for position in range(self.count):
+            if position not in self._taken:
+                digest, offset, length, fresh_until, stale_until = self._entry(position)
+                record = self._record(offset, length)
+                if record is not None:
+                    yield digest, record, fresh_until, stale_until
+
+    @property
+    def exhausted(self) -> bool:
+        return len(self._taken) == self.count
+
+    def close(self):
+        self._map.close()
+
+
+class SqliteCache(CacheBackend):
+    """
+    Кэш в файле базы SQLite, общий для всех процессов, которые открыли один и тот же файл.
+    Значения сериализуются модулем serializer: по умолчанию pickle, подойдет любой модуль с функциями
+    dumps и loads, например msgpack. Ключи хранятся по отпечатку, одинаковому во всех процессах.
+    Время жизни отсчитывается по time.time, так как монотонные часы у каждого процесса свои.
+    При превышении max_entries удаляются раньше всех записанные записи.
+    Каждый процесс открывает свое соединение, поэтому кэш можно создать до запуска дочерних процессов.
+    """
+    def __init__(self, path: str, max_entries: int = None, ttl: float = None, stale_while_revalidate: float = 0,
+                 serializer=pickle, clock: callable = time.time, timeout: float = 30.0):
+        """
+        :param path: Путь к файлу базы.
+        :param max_entries: Максимальное количество записей. Если None, то не ограничено.
+        :param ttl: Время жизни записей по умолчанию в секундах.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+        :param serializer: Модуль сериализации значений с функциями dumps и loads.
+        :param clock: Функция текущего времени в секундах, общая для всех процессов.
+        :param timeout: Сколько секунд ждать, пока база заблокирована другим процессом.
+        :raises ValueError: Ограничение должно быть целым положительным числом.
+        """
+        if max_entries is not None and not (isinstance(max_entries, int) and max_entries > 0):
+            raise ValueError("Ограничение кэша должно быть целым положительным числом.")
+        super().__init__(ttl, stale_while_revalidate, clock)
+        self.path = path
+        self.max_entries = max_entries
+        self._serializer = serializer
+        self._timeout = timeout
+        self._connection = None
+        self._pid = None
+        with self._lock:
+            self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Возвращает соединение этого процесса, создавая его и таблицы при необходимости. """
+        if self._pid == os.getpid():
+            return self._connection
+        connection = sqlite3.connect(self.path, timeout=self._timeout, check_same_thread=False)
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS entries (digest BLOB PRIMARY KEY, key BLOB NOT NULL, "
+                               "value BLOB NOT NULL, name TEXT, fresh_until REAL, stale_until REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_name ON entries (name)")
+            connection.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, digest BLOB NOT NULL, "
+                               "PRIMARY KEY (tag, digest)) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS tags_digest ON tags (digest)")
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    def close(self):
+        """ Закрывает соединение этого процесса. """
+        with self._lock:
+            if self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, digests: list):
+        """ Удаляет записи и их теги. """
+        rows = [(digest,) for digest in digests]
+        connection.executemany("DELETE FROM entries WHERE digest = ?", rows)
+        connection.executemany("DELETE FROM tags WHERE digest = ?", rows)
+
+    def _row(self, digest: bytes):
+        """ Возвращает значение и сроки записи, вызывается под блокировкой. """
+        return self._connect().execute("SELECT value, fresh_until, stale_until FROM entries WHERE digest = ?",
+                                       (digest,)).fetchone()
+
+    def lookup(self, key) -> tuple:
+        digest = _key_digest(key)
+        with self._lock:
+            row = self._row(digest)
+            if row is None:
+                self.misses += 1
+                return _NOT_FOUND
+            value, fresh_until, stale_until = row
+            stale = False
+            if fresh_until is not None:
+                now = self._clock()
+                if now >= fresh_until:
+                    if now >= stale_until:
+                        with self._connect() as connection:
+                            self._delete(connection, [digest])
+                        self.misses += 1
+                        return _NOT_FOUND
+                    stale = True
+            self.hits += 1
+        return self._serializer.loads(value), stale
+
+    def _peek(self, key):
+        row = self._row(_key_digest(key))
+        if row is None or row[1] is not None and self._clock() >= row[1]:
+            return _MISSING
+        return self._serializer.loads(row[0])
+
+    def _labels(self, key) -> tuple:
+        digest = _key_digest(key)
+        connection = self._connect()
+        row = connection.execute("SELECT name FROM entries WHERE digest = ?", (digest,)).fetchone()
+        tags = connection.execute("SELECT tag FROM tags WHERE digest = ?", (digest,)).fetchall()
+        return None if row is None else row[0], tuple(tag for tag, in tags)
+
+    def set(self, key, value, ttl: float = None, stale_while_revalidate: float = None, name: str = None,
+            tags: tuple = ()):
+        digest = _key_digest(key)
+        value = self._serializer.dumps(value)
+        ttl = self.ttl if ttl is None else ttl
+        stale_while_revalidate = self.stale_while_revalidate if stale_while_revalidate is None \
+            else stale_while_revalidate
+        fresh_until = stale_until = None
+        if ttl is not None:
+            fresh_until = self._clock() + ttl
+            stale_until = fresh_until + stale_while_revalidate
+        with self._lock, self._connect() as connection:
+            self._delete(connection, [digest])
+            connection.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                               (digest, pickle.dumps(key, protocol=4), value, name, fresh_until, stale_until))
+            connection.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)", ((tag, digest) for tag in tags))
+            if self.max_entries is not None:
+                excess = connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    digests = connection.execute("SELECT digest FROM entries ORDER BY rowid LIMIT ?",
+                                                 (excess,)).fetchall()
+                    self._delete(connection, [digest for digest, in digests])
+                    self.evictions += excess
+
+    def invalidate(self, tag) -> int:
+        with self._lock, self._connect() as connection:
+            digests = [digest for digest, in connection.execute("SELECT digest FROM tags WHERE tag = ?", (tag,))]
+            self._delete(connection, digests)
+            return len(digests)
+
+    def find(self, name: str, default=None):
+        with self._lock:
+            row = self._connect().execute("SELECT key FROM entries WHERE name = ? ORDER BY rowid DESC LIMIT 1",
+                                          (name,)).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def find_all(self, name: str) -> tuple:
+        with self._lock:
+            rows = self._connect().execute("SELECT key FROM entries WHERE name = ? ORDER BY rowid",
+                                           (name,)).fetchall()
+        return tuple(pickle.loads(key) for key, in rows)
+
+    def names(self) -> tuple:
+        with self._lock:
+            rows = self._connect().execute("SELECT DISTINCT name FROM entries WHERE name IS NOT NULL").fetchall()
+        return tuple(name for name, in rows)
+
+    def clear(self):
+        with self._lock, self._connect() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM tags")
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._row(_key_digest(key)) is not None
+
+    def discard(self, key) -> bool:
+        digest = _key_digest(key)
+        with self._lock, self._connect() as connection:
+            if connection.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone() is None:
+                return False
+            self._delete(connection, [digest])
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class MmapCache(CacheBackend):
+    """
+    Кэш в файле, отображенном в память (mmap), общий для всех процессов, которые открыли этот файл.
+    Файл - хэш-таблица с открытой адресацией на slots ячеек и область данных размером data_size байт.
+    Записи дописываются в конец области данных. Когда место или свободные ячейки заканчиваются, живые записи
+    переписываются подряд (уплотнение), а если места нет и после этого, записи вытесняются по алгоритму часов
+    (second chance): стрелка обходит ячейки, запись, которую читали после прошлого прохода, получает второй шанс,
+    а остальные удаляются, пока не освободится доля _EVICT_SHARE места. Стрелка у каждого процесса своя,
+    а признаки чтения записей общие.
+    Между процессами операции согласуются блокировкой файла (fcntl.flock), поэтому кэш работает только на POSIX.
+    Индекс тегов и имен в общей памяти не хранится: invalidate, find и names перебирают занятые ячейки.
+    Значения сериализуются модулем serializer, время жизни отсчитывается по time.time.
+    """
+    _MAGIC = b'MLCACHE1'
+    # Заголовок: метка, количество ячеек, занятых, удаленных, размер области данных, занято в ней.
+    _HEADER = struct.Struct('<8sIIIxxxxQQ')
+    _HEADER_SIZE = 64
+    # Ячейка: отпечаток ключа, состояние, признак чтения, длина записи, смещение, свежая до, устаревшая до.
+    _SLOT = struct.Struct('<16sBBxxIQdd')
+    # Смещения байтов состояния и признака чтения в ячейке.
+    _STATE, _REFERENCED = 16, 17
+    _EMPTY, _USED, _DELETED = 0, 1, 2
+    # Доля занятых и удаленных ячеек, после которой таблица уплотняется.
+    _MAX_LOAD = 0.75
+    # Доля ячеек и области данных, которую освобождает вытеснение, чтобы следующие записи не вытесняли по одной.
+    _EVICT_SHARE = 0.125
+
+    def __init__(self, path: str, slots: int = 65536, data_size: int = 64 * 1024 * 1024, ttl: float = None,
+                 stale_while_revalidate: float = 0, serializer=pickle, clock: callable = time.time):
+        """
+        :param path: Путь к файлу. Если файл уже создан другим процессом, то берутся его размеры.
+        :param slots: Количество ячеек хэш-таблицы, то есть наибольшее количество записей.
+        :param data_size: Размер области данных в байтах.
+        :param ttl: Время жизни записей по умолчанию в секундах.
+        :param stale_while_revalidate: Сколько секунд после истечения запись можно отдавать устаревшей.
+        :param serializer: Модуль сериализации значений с функциями dumps и loads.
+        :param clock: Функция текущего времени в секундах, общая для всех процессов.
+        :raises RuntimeError: Нет fcntl, то есть система не POSIX.
+        :raises ValueError: Размеры должны быть целыми положительными числами.
+        """
+        if fcntl is None:
+            raise RuntimeError("MmapCache работает только на системах с fcntl (POSIX).")
+        for size in (slots, data_size):
+            if not (isinstance(size, int) and size > 0):
+                raise ValueError("Размеры кэша должны быть целыми положительными числами.")
+        super().__init__(ttl, stale_while_revalidate, clock)
+        self.path = path
+        self.slots = slots
+        self.data_size = data_size
+        self._serializer = serializer
+        self._file = None
+        self._map = None
+        self._pid = None
+        # Номер ячейки, с которой продолжается обход при вытеснении.
+        self._hand = 0
+        with self._lock, self._file_lock():
+            pass
+
+    def _open(self):
+        """ Открывает файл и отображает его в память в этом процессе, создавая файл при необходимости. """
+        self._file = open(self.path, 'a+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            self._file.seek(0)
+            header = self._file.read(self._HEADER.size)
+            if len(header) == self._HEADER.size and header.startswith(self._MAGIC):
+                _, self.slots, _, _, self.data_size, _ = self._HEADER.unpack(header)
+            else:
+                self._file.truncate(0)
+                self._file.truncate(self._data_start + self.data_size)
+                self._file.seek(0)
+                self._file.write(self._HEADER.pack(self._MAGIC, self.slots, 0, 0, self.data_size, 0))
+                self._file.flush()
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), self._data_start + self.data_size)
+        self._pid = os.getpid()
+
+    def close(self):
+        """ Закрывает отображение и файл этого процесса. """
+        with self._lock:
+            if self._pid == os.getpid():
+                self._map.close()
+                self._file.close()
+            self._map = self._file = self._pid = None
+
+    @property
+    def _data_start(self) -> int:
+        return self._HEADER_SIZE + self.slots * self._SLOT.size
+
+    @contextmanager
+    def _file_lock(self):
+        """ Блокирует файл для других процессов. После fork дочерний процесс открывает файл заново. """
+        if self._pid != os.getpid():
+            self._open()
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _header(self) -> tuple:
+        """ Возвращает количество занятых и удаленных ячеек и занятое место в области данных. """
+        _, _, used, deleted, _, data_used = self._HEADER.unpack_from(self._map, 0)
+        return used, deleted, data_used
+
+    def _write_header(self, used: int, deleted: int, data_used: int):
+        self._HEADER.pack_into(self._map, 0, self._MAGIC, self.slots, used, deleted, self.data_size, data_used)
+
+    def _slot(self, index: int) -> tuple:
+        return self._SLOT.unpack_from(self._map, self._HEADER_SIZE + index * self._SLOT.size)
+
+    def _probe(self, digest: bytes) -> tuple:
+        """ Возвращает номер ячейки ключа (-1, если ключа нет) и номер ячейки, в которую его можно записать. """
+        index = int.from_bytes(digest[:8], 'little') % self.slots
+        free = -1
+        for _ in range(self.slots):
+            slot_digest, state = self._slot(index)[:2]
+            if state == self._EMPTY:
+                return -1, index if free < 0 else free
+            if state == self._DELETED:
+                if free < 0:
+                    free = index
+            elif slot_digest == digest:
+                return index, index
+            index = (index + 1) % self.slots
+        return -1, free
+
+    def _record(self, offset: int, length: int) -> tuple:
+        """ Возвращает служебные данные записи (ключ, имя, теги) в виде байтов и значение в виде байтов. """
+        start = self._data_start + offset
+        meta_length = int.from_bytes(self._map[start:start + 4], 'little')
+        return self._map[start + 4:start + 4 + meta_length], self._map[start + 4 + meta_length:start + length]
+
+    def _remove(self, index: int):
+        """ Помечает ячейку удаленной. """
+        used, deleted, data_used = self._header()
+        self._map[self._HEADER_SIZE + index * self._SLOT.size + self._STATE] = self._DELETED
+        self._write_header(used - 1, deleted + 1, data_used)
+
+    def _live(self):
+        """
+        Перебирает занятые ячейки: номер, отпечаток, признак чтения, длина, смещение, свежая до, устаревшая до.
+        """
+        for index in range(self.slots):
+            slot = self._slot(index)
+            if slot[1] == self._USED:
+                yield (index, slot[0], *slot[2:])
+
+    def lookup(self, key) -> tuple:
+        digest = _key_digest(key)
+        with self._lock, self._file_lock():
+            index = self._probe(digest)[0]
+            if index < 0:
+                self.misses += 1
+                return _NOT_FOUND
+            _, _, referenced, length, offset, fresh_until, stale_until = self._slot(index)
+            stale = False
+            now = self._clock()
+            if now >= fresh_until:
+                if now >= stale_until:
+                    self._remove(index)
+                    self.misses += 1
+                    return _NOT_FOUND
+                stale = True
+            value = self._record(offset, length)[1]
+            if not referenced:
+                self._map[self._HEADER_SIZE + index * self._SLOT.size + self._REFERENCED] = 1
+            self.hits += 1
+        return self._serializer.loads(value), stale
+
+    def _peek(self, key):
+        with self._file_lock():
+            index = self._probe(_key_digest(key))[0]
+            if index < 0:
+                return _MISSING
+            _, _, _, length, offset, fresh_until, _ = self._slot(index)
+            if self._clock() >= fresh_until:
+                return _MISSING
+            value = self._record(offset, length)[1]
+        return self._serializer.loads(value)
+
+    def _labels(self, key) -> tuple:
+        with self._file_lock():
+            index = self._probe(_key_digest(key))[0]
+            if index < 0:
+                return None, ()
+            _, _, _, length, offset, _, _ = self._slot(index)
+            _, name, tags = pickle.loads(self._record(offset, length)[0])
+        return name, tags
+
+    def set(self, key, value, ttl: float = None, stale_while_revalidate: float = None, name: str = None,
+            tags: tuple = ()):
+        digest = _key_digest(key)
+        meta = pickle.dumps((key, name, tuple(tags)), protocol=4)
+        record = len(meta).to_bytes(4, 'little') + meta + self._serializer.dumps(value)
+        ttl = self.ttl if ttl is None else ttl
+        stale_while_revalidate = self.stale_while_revalidate if stale_while_revalidate is None \
+            else stale_while_revalidate
+        fresh_until = stale_until = float('inf')
+        if ttl is not None:
+            fresh_until = self._clock() + ttl
+            stale_until = fresh_until + stale_while_revalidate
+        with self._lock, self._file_lock():
+            index, free = self._probe(digest)
+            if index >= 0:
+                self._remove(index)
+            # Запись, которая больше всей области данных, не сохраняем, но и прежнее значение уже не действительно.
+            if len(record) > self.data_size:
+                return
+            used, deleted, data_used = self._header()
+            if data_used + len(record) > self.data_size or used + deleted + 1 > self.slots * self._MAX_LOAD:
+                self._compact()
+                used, deleted, data_used = self._header()
+                if data_used + len(record) > self.data_size or used + 1 > self.slots * self._MAX_LOAD:
+                    self._evict(len(record))
+                    used, deleted, data_used = self._header()
+            free = self._probe(digest)[1]
+            start = self._data_start + data_used
+            self._map[start:start + len(record)] = record
+            self._SLOT.pack_into(self._map, self._HEADER_SIZE + free * self._SLOT.size, digest, self._USED, 0,
+                                 len(record), data_used, fresh_until, stale_until)
+            self._write_header(used + 1, deleted, data_used + len(record))
+
+    def _compact(self):
+        """
+        Переписывает живые записи подряд и освобождает удаленные ячейки. Окончательно истекшие записи не переносятся.
+        """
+        now = self._clock()
+        live = [(digest, referenced, self._map[self._data_start + offset:self._data_start + offset + length],
+                 fresh_until, stale_until)
+                for _, digest, referenced, length, offset, fresh_until, stale_until in self._live()
+                if now < stale_until]
+        self._reset()
+        data_used = 0
+        for digest, referenced, record, fresh_until, stale_until in live:
+            start = self._data_start + data_used
+            self._map[start:start + len(record)] = record
+            free = self._probe(digest)[1]
+            self._SLOT.pack_into(self._map, self._HEADER_SIZE + free * self._SLOT.size, digest, self._USED,
+                                 referenced, len(record), data_used, fresh_until, stale_until)
+            data_used += len(record)
+        self._write_header(len(live), 0, data_used)
+
+    def _evict(self, length: int):
+        """
+        Вытесняет записи по алгоритму часов, пока в уплотненной таблице не освободится место под запись
+        длины length и доля _EVICT_SHARE ячеек и области данных, и уплотняет таблицу, чтобы вернуть место.
+        Обход начинается с ячейки, на которой остановился прошлый. За два оборота стрелки освобождается
+        вся таблица: на первом снимаются признаки чтения, на втором удаляются записи.
+        """
+        used, _, live_bytes = self._header()
+        max_used = self.slots * self._MAX_LOAD * (1 - self._EVICT_SHARE)
+        max_bytes = self.data_size * (1 - self._EVICT_SHARE)
+        for _ in range(2 * self.slots):
+            if used == 0 or used + 1 <= max_used and live_bytes + length <= max_bytes:
+                break
+            index, self._hand = self._hand, (self._hand + 1) % self.slots
+            _, state, referenced, record_length = self._slot(index)[:4]
+            if state != self._USED:
+                continue
+            if referenced:
+                self._map[self._HEADER_SIZE + index * self._SLOT.size + self._REFERENCED] = 0
+                continue
+            self._remove(index)
+            used -= 1
+            live_bytes -= record_length
+            self.evictions += 1
+        self._compact()
+
+    def _reset(self):
+        """ Очищает таблицу ячеек и область данных. """
+        self._map[self._HEADER_SIZE:self._data_start] = bytes(self._data_start - self._HEADER_SIZE)
+        self._write_header(0, 0, 0)
+
+    def invalidate(self, tag) -> int:
+        removed = 0
+        with self._lock, self._file_lock():
+            for index, _, _, length, offset, _, _ in self._live():
+                if tag in pickle.loads(self._record(offset, length)[0])[2]:
+                    self._remove(index)
+                    removed += 1
+        return removed
+
+    def find(self, name: str, default=None):
+        keys = self.find_all(name)
+        return keys[-1] if keys else default
+
+    def find_all(self, name: str) -> tuple:
+        with self._lock, self._file_lock():
+            keys = []
+            for _, _, _, length, offset, _, _ in self._live():
+                key, key_name, _ = pickle.loads(self._record(offset, length)[0])
+                if key_name == name:
+                    keys.append(key)
+        return tuple(keys)
+
+    def names(self) -> tuple:
+        with self._lock, self._file_lock():
+            names = (pickle.loads(self._record(offset, length)[0])[1]
+                     for _, _, _, length, offset, _, _ in self._live())
+            return tuple({name: None for name in names if name is not None})
+
+    def clear(self):
+        with self._lock, self._file_lock():
+            self._reset()
+
+    def __contains__(self, key):
+        digest = _key_digest(key)
+        with self._lock, self._file_lock():
+            return self._probe(digest)[0] >= 0
+
+    def discard(self, key) -> bool:
+        digest = _key_digest(key)
+        with self._lock, self._file_lock():
+            index = self._probe(digest)[0]
+            if index < 0:
+                return False
+            self._remove(index)
+            return True
+
+    def __len__(self):
+        with self._lock, self._file_lock():
+            return self._header()[0]
+
+
+def _validate_ttl(ttl: float | None, stale_while_revalidate: float | None):
+    """
+    Проверяет время жизни записей.
+    :raises ValueError: Время жизни не может быть отрицательным.
+    """
+    for value in (ttl, stale_while_revalidate):
+        if value is not None and value < 0:
+            raise ValueError("Время жизни записи кэша не может быть отрицательным.")
+
+
+def _freeze(value):
+    """
+    Возвращает хэшируемое представление аргумента для ключа кэша. Списки, словари и множества
+    разбираются рекурсивно, прочие нехэшируемые объекты представляются своим pickle.
+    :raises TypeError: Аргумент нельзя использовать в ключе кэша.
+    """
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, (list, tuple)):
+        return _FrozenArg, type(value), tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return _FrozenArg, type(value), frozenset((_freeze(key), _freeze(item)) for key, item in value.items())
+    if isinstance(value, (set, frozenset)):
+        return _FrozenArg, type(value), frozenset(_freeze(item) for item in value)
+    try:
+        return _FrozenArg, type(value), pickle.dumps(value)
+    except Exception as e:
+        raise TypeError(f"Аргумент типа '{type(value).__name__}' нельзя использовать в ключе кэша.") from e
+
+
+def _key_labels(func: callable, args: tuple, kwargs: dict, namespaces: tuple = ()) -> tuple:
+    """
+    Возвращает строковое имя записи вида "имя_арг1_арг2_имя=значение", по которому работает cache_reset,
+    и теги записи: имя функции, имя функции с первыми аргументами ("имя_арг1") и пространства имен.
+    Вычисляется только при записи в кэш.
+    """
+    parts = (func.__name__, *map(str, args), *(f"{key}={value}" for key, value in kwargs.items()))
+    tags = [parts[0]]
+    for part in parts[1:-1]:
+        tags.append(f"{tags[-1]}_{part}")
+    name = f"{tags[-1]}_{parts[-1]}" if len(parts) > 1 else parts[0]
+    return name, (*tags, *namespaces)
+
+
+def _is_coroutine_function(func: callable) -> bool:
+    """
+    Проверяет, что функция или метод объявлены как async def. Для обычных функций и методов достаточно
+    флагов кода, что дешевле inspect.iscoroutinefunction, которая нужна только для прочих вызываемых объектов.
+    """
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return inspect.iscoroutinefunction(func)
+    return code.co_flags & inspect.CO_COROUTINE != 0
+
+
+# Имя в ключе и результат _is_coroutine_function по функциям методов, переданных в CachedReader._cached_reader:
+# метод создается заново при каждом обращении к нему, а его функция одна на класс. Количество ограничено,
+# чтобы функции, созданные на лету, не накапливались.
+_method_infos = {}
+_METHOD_INFOS_LIMIT = 1024
+
+
+def _method_info(func: callable) -> tuple[str, bool]:
+    """
+    Возвращает имя функции в ключе и признак корутинной функции (см. _is_coroutine_function)
+    и запоминает их для функции метода.
+    """
+    info = func.__qualname__, _is_coroutine_function(func)
+    function = getattr(func, '__func__', None)
+    if function is not None and len(_method_infos) < _METHOD_INFOS_LIMIT:
+        _method_infos[function] = info
+    return info
+
+
+# Кэши экземпляров без атрибута _cache и без __dict__, кэши классов и общий кэш всех классов.
+# Экземпляры и классы хранятся по слабым ссылкам, поэтому их кэши удаляются вместе с ними.
+_instance_caches = weakref.WeakKeyDictionary()
+_class_caches = weakref.WeakKeyDictionary()
+_global_cache = None
+# Атрибут экземпляра, в котором хранится его кэш, если у класса нет своего _cache.
+_FALLBACK_CACHE = '_cached_reader_cache'
+_scopes_lock = threading.Lock()
+
+
+def _instance_cache(owner) -> CacheBackend:
+    """ Возвращает кэш экземпляра: его _cache, а если его нет, то кэш, созданный при первом вызове. """
+    try:
+        return owner._cache
+    except AttributeError:
+        pass
+    namespace = getattr(owner, '__dict__', None)
+    if namespace is not None:
+        cache = namespace.get(_FALLBACK_CACHE)
+        if cache is None:
+            with _scopes_lock:
+                cache = namespace.setdefault(_FALLBACK_CACHE, MemoryCache())
+        return cache
+    with _scopes_lock:
+        try:
+            cache = _instance_caches.get(owner)
+            if cache is None:
+                cache = _instance_caches[owner] = MemoryCache()
+        except TypeError as e:
+            raise TypeError(f"Для кэша экземпляра класса '{owner.__class__.__name__}' нужен атрибут _cache, "
+                            f"__dict__ или поддержка слабых ссылок (__weakref__).") from e
+    return cache
+
+
+def _create_cache(max_entries: int = None, max_bytes: int = None,
+                  eviction_policy: EvictionPolicy = EvictionPolicy.LRU, ttl: float = None,
+                  stale_while_revalidate: float = 0, backend: CacheBackend = None,
+                  metrics: bool | CacheMetrics = False) -> CacheBackend:
+    """
+    Создает кэш по настройкам с теми же именами, что у CachedReader: MemoryCache с указанными ограничениями
+    или переданное хранилище backend, и подключает к нему метрики.
+    """
+    if backend is None:
+        backend = MemoryCache(max_entries, max_bytes, eviction_policy, ttl=ttl,
+                              stale_while_revalidate=stale_while_revalidate)
+    if metrics:
+        backend.metrics = metrics if isinstance(metrics, CacheMetrics) else CacheMetrics()
+    return backend
+
+
+def _class_cache(owner) -> CacheBackend:
+    """
+    Возвращает общий кэш всех экземпляров класса owner. Он создается по настройкам из атрибута класса
+    class_cache_options (см. CachedReader), а без него - MemoryCache без ограничений.
+    """
+    cls = type(owner)
+    cache = _class_caches.get(cls)
+    if cache is None:
+        with _scopes_lock:
+            cache = _class_caches.get(cls)
+            if cache is None:
+                cache = _class_caches[cls] = _create_cache(**(getattr(cls, 'class_cache_options', None) or {}))
+    return cache
+
+
+def _shared_cache(owner) -> CacheBackend:
+    """
+    Возвращает общий кэш всех классов. Его настройки задаются функцией configure_global_cache,
+    а без нее это MemoryCache без ограничений.
+    """
+    global _global_cache
+    cache = _global_cache
+    if cache is None:
+        with _scopes_lock:
+            if _global_cache is None:
+                _global_cache = MemoryCache()
+            cache = _global_cache
+    return cache
+
+
+def configure_global_cache(*, max_entries: int = None, max_bytes: int = None,
+                           eviction_policy: EvictionPolicy = EvictionPolicy.LRU, ttl: float = None,
+                           stale_while_revalidate: float = 0, backend: CacheBackend = None,
+                           metrics: bool | CacheMetrics = False) -> CacheBackend:
+    """
+    Заменяет общий кэш всех классов (CacheScope.GLOBAL) новым с указанными настройками.
+    Настройки те же, что у CachedReader. Записи прежнего кэша не переносятся.
+    :return: Новый общий кэш.
+    """
+    global _global_cache
+    cache = _create_cache(max_entries, max_bytes, eviction_policy, ttl, stale_while_revalidate, backend, metrics)
+    with _scopes_lock:
+        _global_cache = cache
+    return cache
+
+
+_SCOPE_CACHES = {CacheScope.INSTANCE: _instance_cache, CacheScope.CLASS: _class_cache,
+                 CacheScope.GLOBAL: _shared_cache}
+
+
+def _debug_logger(logger):
+    """
+    Возвращает логгер, если он пишет отладочные сообщения, иначе None: тогда на чтение из кэша
+    не готовится ни одно сообщение. Логгер без isEnabledFor считается пишущим всё.
+    """
+    if logger is None:
+        return None
+    is_enabled_for = getattr(logger, 'isEnabledFor', None)
+    return logger if is_enabled_for is None or is_enabled_for(logging.DEBUG) else None
+
+
+def _call_repr(qualname: str, args: tuple, kwargs: dict) -> str:
+    """
+    Представление вызова для отладочных сообщений, например "Reader._value(1, name='a')".
+    Строится только для записываемых сообщений и заметно дешевле repr ключа, в котором есть типы аргументов.
+    """
+    if kwargs:
+        return f"{qualname}({', '.join([*map(repr, args), *(f'{name}={value!r}' for name, value in kwargs.items())])})"
+    return f"{qualname}({', '.join(map(repr, args))})"
+
+
+def _log_read(logger, reader, qualname: str, args: tuple, kwargs: dict):
+    """
+    Пишет в лог чтение из кэша, если логгер пишет отладочные сообщения (см. _debug_logger)
+    и чтение попало в долю log_sample_rate кэшера. Уровень проверяется здесь же, а не отдельным вызовом
+    _debug_logger: на свежем значении из кэша это единственный вызов ради лога.
+    """
+    is_enabled_for = getattr(logger, 'isEnabledFor', None)
+    if is_enabled_for is not None and not is_enabled_for(logging.DEBUG):
+        return
+    rate = getattr(reader, '_log_sample_rate', 1.0)
+    if rate < 1 and random.random() >= rate:
+        return
+    # Один позиционный аргумент - самый частый случай, сообщение о нем строится одной строкой, без _call_repr.
+    if len(args) == 1 and not kwargs:
+        logger.debug(f"Reading data of the '{type(reader).__name__}' class from the cache by key "
+                     f"'{qualname}({args[0]!r})'")
+    else:
+        logger.debug(f"Reading data of the '{type(reader).__name__}' class from the cache by key "
+                     f"'{_call_repr(qualname, args, kwargs)}'")
+
+
+def _kwargs_key(kwargs: dict) -> frozenset | tuple:
+    """
+    Часть ключа с именованными аргументами: множество троек имя, значение, тип значения.
+    Множество не зависит от порядка аргументов, а тип разделяет равные значения разных типов.
+    Один именованный аргумент - самый частый случай: в ключ идет сама тройка, порядок для нее не важен,
+    а строится и хэшируется она заметно дешевле множества. С множеством тройка не совпадет никогда.
+    """
+    if len(kwargs) == 1:
+        [(name, value)] = kwargs.items()
+        return name, value, type(value)
+    return frozenset((name, value, type(value)) for name, value in kwargs.items())
+
+
+def _find(cache: CacheBackend, qualname: str, args: tuple, kwargs: dict) -> tuple:
+    """
+    Строит ключ вызова и ищет его в кэше.
+    Ключ - полное имя функции, позиционные аргументы, именованные аргументы с их типами (см. _kwargs_key)
+    и типы позиционных аргументов, без форматирования аргументов в строку. Типы входят в ключ,
+    как в lru_cache(typed=True): иначе вызовы с равными аргументами разных типов, например 1, True и 1.0,
+    получили бы одно значение. Тип единственного аргумента входит в ключ сам, без кортежа: кортеж из одного
+    типа только удорожал бы самый частый вызов, а с кортежем типов нескольких аргументов тип не совпадет.
+    :return: Ключ, значение или _MISSING, признак того, что значение устарело.
+    """
+    types = () if not args else type(args[0]) if len(args) == 1 else tuple(map(type, args))
+    try:
+        cache_key = (qualname, args, _kwargs_key(kwargs) if kwargs else _NO_KWARGS, types)
+        # Одно обращение к кэшу и на проверку, и на чтение: запись может быть вытеснена между ними.
+        value, stale = cache.lookup(cache_key)
+    except TypeError:
+        # Нехэшируемые аргументы встречаются редко, поэтому их представление строится только после неудачи.
+        cache_key = (qualname, _freeze(args),
+                     frozenset((name, _freeze(value), type(value)) for name, value in kwargs.items()), types)
+        value, stale = cache.lookup(cache_key)
+    return cache_key, value, stale
+
+
+def _read_cache(cache: CacheBackend, found: tuple, func: callable, owner, args: tuple, kwargs: dict,
+                ttl: float | None, stale_while_revalidate: float | None, logger, reader, namespaces: tuple = ()):
+    """
+    Возвращает значение, найденное в кэше, а при промахе вычисляет и записывает его.
+    Устаревшее значение возвращается сразу, а обновляется в фоновом потоке.
+    Свежее значение без лога и метрик вызывающие возвращают сами, не вызывая эту функцию.
+    :param found: Ключ, значение и признак устаревания, которые вернула _find.
+    :param func: Функция, результат которой кэшируется.
+    :param owner: Объект, который передается функции первым аргументом. Если None, то не передается.
+    :param logger: Логгер, который пишет отладочные сообщения (см. _debug_logger), или None.
+                Он передается, только если уровень DEBUG включен, поэтому сообщения форматируются сразу:
+                так дешевле, чем подстановка аргументов самим логгером.
+    :param reader: Кэшер, имя класса которого пишется в сообщения и доля чтений которого пишется в лог.
+    :param namespaces: Дополнительные теги записей, по которым их можно сбросить группой.
+    """
+    cache_key, result, stale = found
+    metrics = cache.metrics
+    if metrics is not None:
+        metrics.count(cache_key[0], result is not _MISSING)
+    if result is _MISSING:
+        if logger is not None:
+            logger.debug(f"Writing data of the '{type(reader).__name__}' class to the cache by key "
+                         f"'{_call_repr(cache_key[0], args, kwargs)}'")
+        compute = partial(func, *args, **kwargs) if owner is None else partial(func, owner, *args, **kwargs)
+        if metrics is not None:
+            compute = metrics.timed(cache_key[0], compute)
+        # Одновременные промахи по одному ключу ждут одно вычисление.
+        result = cache.get_or_compute(cache_key, compute, ttl, stale_while_revalidate,
+                                      *_key_labels(func, args, kwargs, namespaces))
+    elif stale:
+        if logger is not None:
+            logger.debug(f"Refreshing data of the '{type(reader).__name__}' class in the cache by key "
+                         f"'{_call_repr(cache_key[0], args, kwargs)}'")
+        compute = partial(func, *args, **kwargs) if owner is None else partial(func, owner, *args, **kwargs)
+        if metrics is not None:
+            compute = metrics.timed(cache_key[0], compute)
+        cache.refresh(cache_key, compute, ttl, stale_while_revalidate,
+                      None if logger is None else
+                      lambda e: logger.debug(f"Refreshing data of the '{type(reader).__name__}' class in the cache "
+                                             f"by key '{_call_repr(cache_key[0], args, kwargs)}' failed: {e!r}"))
+    if logger is not None:
+        _log_read(logger, reader, cache_key[0], args, kwargs)
+    return result
+
+
+async def _read_cache_async(cache: CacheBackend, func: callable, owner, args: tuple, kwargs: dict,
+                            ttl: float | None, stale_while_revalidate: float | None, logger, reader,
+                            namespaces: tuple = (), qualname: str = None):
+    """
+    Асинхронный вариант _read_cache для корутинных функций: кэшируется результат корутины, а не она сама.
+    Значение ищется в кэше, когда корутину дожидаются, а не когда она создана.
+    Одновременные промахи по одному ключу ждут одну задачу asyncio, устаревшее значение обновляется в задаче.
+    :param qualname: Имя функции в ключе. Если None, то func.__qualname__.
+    """
+    cache_key, result, stale = _find(cache, func.__qualname__ if qualname is None else qualname, args, kwargs)
+    metrics = cache.metrics
+    if metrics is not None:
+        metrics.count(cache_key[0], result is not _MISSING)
+    if result is _MISSING:
+        if logger is not None:
+            logger.debug(f"Writing data of the '{type(reader).__name__}' class to the cache by key "
+                         f"'{_call_repr(cache_key[0], args, kwargs)}'")
+        compute = partial(func, *args, **kwargs) if owner is None else partial(func, owner, *args, **kwargs)
+        if metrics is not None:
+            compute = metrics.timed_async(cache_key[0], compute)
+        result = await cache.get_or_compute_async(cache_key, compute, ttl, stale_while_revalidate,
+                                                  *_key_labels(func, args, kwargs, namespaces))
+    elif stale:
+        if logger is not None:
+            logger.debug(f"Refreshing data of the '{type(reader).__name__}' class in the cache by key "
+                         f"'{_call_repr(cache_key[0], args, kwargs)}'")
+        compute = partial(func, *args, **kwargs) if owner is None else partial(func, owner, *args, **kwargs)
+        if metrics is not None:
+            compute = metrics.timed_async(cache_key[0], compute)
+        cache.refresh_async(cache_key, compute, ttl, stale_while_revalidate,
+                            None if logger is None else
+                            lambda e: logger.debug(f"Refreshing data of the '{type(reader).__name__}' class in the "
+                                                   f"cache by key '{_call_repr(cache_key[0], args, kwargs)}' "
+                                                   f"failed: {e!r}"))
+    if logger is not None:
+        _log_read(logger, reader, cache_key[0], args, kwargs)
+    return result
+
+
+def cached_reader(fn: callable = None, *, ttl: float = None, stale_while_revalidate: float = None,
+                  namespaces: tuple[str, ...] = (), scope: CacheScope = CacheScope.INSTANCE):
+    """
+    Декоратор для кэшера. Можно применять без аргументов или с временем жизни записей:
+    @cached_reader(ttl=60, stale_while_revalidate=30).
+    Метод async def остается корутинным, а в кэш записывается результат его корутины.
+    Метод может быть и у класса, который не наследует CachedReader: тогда кэш экземпляра создается
+    при первом вызове и удаляется вместе с экземпляром.
+    Отладочные сообщения пишутся в self._BM.logger, если он есть и включен уровень DEBUG.
+    О чтениях из кэша пишется только доля log_sample_rate кэшера.
+    :param fn: Декорируемый метод.
+    :param ttl: Время жизни записей в секундах. Если None, то берется время жизни кэша экземпляра.
+    :param stale_while_revalidate: Сколько секунд после истечения запись отдается устаревшей,
+                пока она обновляется в фоне. Если None, то берется значение кэша экземпляра.
+    :param namespaces: Пространства имен, например ('users',). Все записи пространства имен, в том числе
+                разных методов, сбрасываются вместе: cache_reset('users', is_tag=True).
+    :param scope: Чей кэш используется: CacheScope.INSTANCE - кэш экземпляра, CacheScope.CLASS - общий
+                кэш всех экземпляров класса, CacheScope.GLOBAL - общий кэш всех классов. Общие кэши
+                подходят методам, результат которых зависит только от аргументов, а не от состояния экземпляра.
+                Их настройки задаются явно: кэша класса - атрибутом класса class_cache_options,
+                кэша всех классов - функцией configure_global_cache. Без них это MemoryCache без ограничений.
+                Сбрасываются они так же через cache_reset, а статистика читается через stats, с указанием scope.
+    :raises ValueError: Неизвестная область кэша.
+    """
+    _validate_ttl(ttl, stale_while_revalidate)
+    if scope not in (1, 2, 3):
+        raise ValueError("Область кэша может быть только CacheScope.INSTANCE (1), CacheScope.CLASS (2) "
+                         "или CacheScope.GLOBAL (3).")
+    namespaces = tuple(namespaces)
+    get_cache = _SCOPE_CACHES[scope]
+    instance_scope = scope == CacheScope.INSTANCE
+
+    def decorator(fn):
+        # В общем кэше всех классов одинаковые имена функций из разных модулей не должны совпадать.
+        qualname = f"{fn.__module__}.{fn.__qualname__}" if scope == CacheScope.GLOBAL else fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_func(self, *args, **kwargs):
+                bm = getattr(self, '_BM', None)
+                return await _read_cache_async(get_cache(self), fn, self, args, kwargs, ttl, stale_while_revalidate,
+                                               None if bm is None else _debug_logger(bm.logger), self,
+                                               namespaces, qualname)
+            return async_func
+
+        @wraps(fn)
+        def func(self, *args, **kwargs):
+            if instance_scope:
+                try:
+                    cache = self._cache
+                except AttributeError:
+                    cache = get_cache(self)
+            else:
+                cache = get_cache(self)
+            # Попадание - самый частый случай, и каждый вызов функции на нем заметен, поэтому ключ строится
+            # здесь же, так же как в _find, а _find вызывается только для нехэшируемых аргументов.
+            # Записи, которые можно читать без блокировки, читаются и без вызова lookup, как в MemoryCache.lookup.
+            try:
+                cache_key = (qualname, args, _kwargs_key(kwargs) if kwargs else _NO_KWARGS,
+                             () if not args else type(args[0]) if len(args) == 1 else tuple(map(type, args)))
+                data = cache._lock_free
+                value = _MISSING if data is None else data.get(cache_key, _MISSING)
+                if value is _MISSING:
+                    value, stale = cache.lookup(cache_key)
+                else:
+                    cache.hits += 1
+                    stale = False
+            except TypeError:
+                cache_key, value, stale = _find(cache, qualname, args, kwargs)
+            bm = getattr(self, '_BM', None)
+            # Свежее значение без метрик возвращается без вызова _read_cache, а чтение пишется в лог здесь же.
+            if value is not _MISSING and not stale and cache.metrics is None:
+                logger = None if bm is None else bm.logger
+                if logger is not None:
+                    _log_read(logger, self, qualname, args, kwargs)
+                return value
+            return _read_cache(cache, (cache_key, value, stale), fn, self, args, kwargs, ttl, stale_while_revalidate,
+                               None if bm is None else _debug_logger(bm.logger), self, namespaces)
+        return func
+    return decorator if fn is None else decorator(fn)
+
+
+# Кэшеры, которые собирают метрики, по id, чтобы их статистику можно было опросить разом.
+_metered_readers = weakref.WeakValueDictionary()
+
+
+def collect_stats() -> list:
+    """
+    Возвращает статистику всех существующих кэшеров, которые собирают метрики: пары (кэшер, его stats()).
+    Функцию удобно опрашивать из сборщика метрик, например из своего коллектора Prometheus.
+    """
+    return [(reader, reader.stats()) for reader in list(_metered_readers.values())]
+
+
+# Кэшеры со снимками по id, чтобы при завершении процесса сохранить снимки тех, кто еще существует.
+# Один обработчик atexit на все кэшеры не удерживает их от удаления и не копит регистрации.
+_snapshot_readers = weakref.WeakValueDictionary()
+
+
+def _save_snapshot(reader_ref: weakref.ref):
+    """ Сохраняет снимок кэшера, если он еще существует. """
+    reader = reader_ref()
+    if reader is not None:
+        count = reader.cache_save()
+        reader._logger_debug("%s entries of the '%s' class cache are saved to the snapshot '%s'",
+                             count, reader.__class__.__name__, reader._snapshot)
+
+
+@atexit.register
+def _save_snapshots():
+    """ Сохраняет снимки всех существующих кэшеров при завершении процесса. """
+    for reader in list(_snapshot_readers.values()):
+        _save_snapshot(weakref.ref(reader))
+
+
+def _save_snapshot_periodically(reader_ref: weakref.ref, interval: float):
+    """ Сохраняет снимок кэшера через каждые interval секунд, пока кэшер существует. """
+    while True:
+        time.sleep(interval)
+        if reader_ref() is None:
+            return
+        _save_snapshot(reader_ref)
 
 
 class CachedReader:
     """ Класс кэшер. """
-    def __init__(self, _logger=None):
+    # Настройки общего кэша класса (методы с @cached_reader(scope=CacheScope.CLASS)) с теми же именами,
+    # что у __init__: max_entries, max_bytes, eviction_policy, ttl, stale_while_revalidate, backend, metrics.
+    # Каждый наследник получает свой кэш класса, созданный по этим настройкам. Если None, то MemoryCache
+    # без ограничений.
+    class_cache_options: dict | None = None
+
+    def __init__(self, _logger=None, *, max_entries: int = None, max_bytes: int = None,
+                 eviction_policy: EvictionPolicy = EvictionPolicy.LRU, ttl: float = None,
+                 stale_while_revalidate: float = 0, backend: CacheBackend = None, snapshot: str = None,
+                 snapshot_version: str = None, snapshot_interval: float = None, log_sample_rate: float = 1.0,
+                 metrics: bool | CacheMetrics = False):
+        """
+        :param _logger: Логгер для отладочных сообщений.
+        :param max_entries: Максимальное количество записей в кэше. Если None, то не ограничено.
+        :param max_bytes: Максимальный примерный объем значений в кэше в байтах. Если None, то не ограничен.
+        :param eviction_policy: Политика вытеснения записей при превышении ограничений.
+        :param ttl: Время жизни записей в секундах. Если None, то записи живут до сброса кэша.
+        :param stale_while_revalidate: Сколько секунд после истечения запись отдается устаревшей,
+                    пока новое значение вычисляется в фоновом потоке. Если 0, то истекшее значение
+                    вычисляется заново при чтении.
+        :param backend: Хранилище кэша, например SqliteCache или MmapCache, общие для нескольких процессов.
+                    Если указано, то остальные настройки кэша не используются: они задаются самому хранилищу.
+                    Если None, то создается MemoryCache.
+        :param snapshot: Путь к файлу снимка кэша. Если указан, то кэш подхватывает снимок при создании
+                    и сохраняется в него при завершении процесса, чтобы после перезапуска не прогреваться заново.
+        :param snapshot_version: Версия данных снимка, например версия приложения.
+                    Снимок другой версии не подхватывается.
+        :param snapshot_interval: Через сколько секунд сохранять снимок в фоновом потоке, помимо завершения
+                    процесса. Если None, то только при завершении.
+        :param log_sample_rate: Доля чтений из кэша, о которых пишется отладочное сообщение, от 0 до 1.
+                    Вычисления и обновления записей пишутся всегда.
+        :param metrics: Собирать ли метрики по функциям (см. stats). Можно передать свой CacheMetrics,
+                    например с функцией on_compute. Без метрик чтение из кэша не замедляется.
+        :raises ValueError: Снимок поддерживается только хранилищем MemoryCache. |
+                            Интервал сохранения снимка должен быть положительным. |
+                            Доля сообщений должна быть от 0 до 1.
+        """
+        if not 0 <= log_sample_rate <= 1:
+            raise ValueError("Доля сообщений о чтении из кэша должна быть от 0 до 1.")
         self._logger = _logger
-        self._cache = {}
+        self._log_sample_rate = log_sample_rate
+        self._cache = backend = _create_cache(max_entries, max_bytes, eviction_policy, ttl, stale_while_revalidate,
+                                              backend, metrics)
+        if metrics:
+            _metered_readers[id(self)] = self
+        self._snapshot = snapshot
+        self._snapshot_version = snapshot_version
+        if snapshot is not None:
+            if not isinstance(backend, MemoryCache):
+                raise ValueError("Снимок поддерживается только хранилищем MemoryCache, "
+                                 "остальные хранилища и так сохраняются в файлах.")
+            if snapshot_interval is not None and snapshot_interval <= 0:
+                raise ValueError("Интервал сохранения снимка должен быть положительным.")
+            if backend.load(snapshot, snapshot_version):
+                self._logger_debug("Cache snapshot '%s' of the '%s' class is loaded", snapshot, self.__class__.__name__)
+            _snapshot_readers[id(self)] = self
+            if snapshot_interval is not None:
+                # Слабая ссылка, чтобы сохранение снимка не удерживало кэшер от удаления.
+                reader = weakref.ref(self)
+                threading.Thread(target=_save_snapshot_periodically, args=(reader, snapshot_interval),
+                                 daemon=True).start()
 
-    def _logger_debug(self, msg):
-        """ Добавляет Сообщение в дебаг логгера. """
+    def stats(self, scope: CacheScope = CacheScope.INSTANCE) -> dict:
+        """
+        Возвращает статистику кэша на момент вызова:
+        entries, hits, misses, evictions - количество записей и счетчики всего кэша (см. CacheBackend),
+        bytes - примерный объем значений в байтах,
+        functions - статистика по полным именам функций: entries, bytes, max_age (возраст самой старой записи
+        в секундах или None, если он не известен) и, если собираются метрики, hits, misses и compute_seconds -
+        гистограмма времени вычисления значений (см. CacheMetrics.snapshot).
+        Объем и возраст записей известны только для MemoryCache.
+        :param scope: Статистика какого кэша возвращается: экземпляра, общего кэша класса или общего кэша
+                    всех классов. Метрики по функциям общих кэшей собираются, если они включены в их настройках.
+        """
+        cache = self._cache if scope == CacheScope.INSTANCE else _SCOPE_CACHES[CacheScope(scope)](self)
+        functions = {} if cache.metrics is None else cache.metrics.snapshot()
+        info = cache.entries_info()
+        for function in functions.values():
+            function.update(entries=0, bytes=0, max_age=None)
+        for key, size, age in info:
+            function = functions.setdefault(key[0] if isinstance(key, tuple) else key,
+                                            {'entries': 0, 'bytes': 0, 'max_age': None})
+            function['entries'] += 1
+            function['bytes'] += size
+            if age is not None and (function['max_age'] is None or age > function['max_age']):
+                function['max_age'] = age
+        return {
+            # Длина MemoryCache дочитывает подключенный снимок, поэтому записи считаются по уже прочитанным.
+            'entries': len(info) if isinstance(cache, MemoryCache) else len(cache),
+            'hits': cache.hits,
+            'misses': cache.misses,
+            'evictions': cache.evictions,
+            'bytes': sum(size for _, size, _ in info),
+            'functions': functions,
+        }
+
+    def cache_save(self, path: str = None) -> int:
+        """
+        Сохраняет снимок кэша.
+        :param path: Путь к файлу снимка. Если None, то путь, указанный при создании.
+        :return: Количество сохраненных записей.
+        :raises ValueError: Путь к снимку не указан.
+        """
+        path = self._snapshot if path is None else path
+        if path is None:
+            raise ValueError("Путь к снимку кэша не указан.")
+        return self._cache.save(path, self._snapshot_version)
+
+    def _logger_debug(self, msg, *args):
+        """
+        Добавляет Сообщение в дебаг логгера.
+        Аргументы подставляются в сообщение через %, только если оно пишется.
+        """
         if self._logger is not None:
-            self._logger.debug(msg)
+            self._logger.debug(msg, *args)
 
     def _cached_reader(self, func: callable, *args, **kwargs):
-        """ Читает значение переменной из кэша. """
-        cache_key = func.__name__
-        for arg in args:
-            cache_key += f"_{arg}"
-        for key, value in kwargs.items():
-            cache_key += f"_{key}={value}"
-        if cache_key not in self._cache:
-            self._logger_debug(f"Writing data of the '{self.__class__.__name__}' class to the cache by key "
-                               f"'{cache_key}'")
-            self._cache[cache_key] = func(*args, **kwargs)
-        self._logger_debug(f"Reading data of the '{self.__class__.__name__}' class from the cache by key '{cache_key}'")
-        return self._cache[cache_key]
-
-    def cache_reset(self, key: str = None, *, is_match=True):
+        """
+        Читает значение переменной из кэша.
+        Если func - корутинная функция, то возвращается корутина, которую надо дождаться (await).
+        Время жизни записи задается именованными аргументами _ttl и _stale_while_revalidate, они функции
+        не передаются. Они не объявлены в сигнатуре: параметры со значениями по умолчанию после *args
+        заметно удорожают каждый вызов, а чтение из кэша должно быть дешевым.
+        :param func: Функция, результат которой кэшируется. Остальные аргументы передаются ей.
+        :param _ttl: Время жизни записи в секундах, как ttl в @cached_reader. Если None, то берется время жизни
+                    кэша экземпляра.
+        :param _stale_while_revalidate: Сколько секунд после истечения запись отдается устаревшей, пока она
+                    обновляется в фоне. Если None, то берется значение кэша экземпляра.
+        :raises ValueError: Время жизни не может быть отрицательным.
+        """
+        _ttl = _stale_while_revalidate = None
+        if kwargs and ('_ttl' in kwargs or '_stale_while_revalidate' in kwargs):
+            _ttl = kwargs.pop('_ttl', None)
+            _stale_while_revalidate = kwargs.pop('_stale_while_revalidate', None)
+            _validate_ttl(_ttl, _stale_while_revalidate)
+        try:
+            qualname, is_coroutine = _method_infos[func.__func__]
+        except (AttributeError, KeyError):
+            qualname, is_coroutine = _method_info(func)
+        if is_coroutine:
+            return _read_cache_async(self._cache, func, None, args, kwargs, _ttl, _stale_while_revalidate,
+                                     _debug_logger(self._logger), self, qualname=qualname)
+        cache = self._cache
+        # Ключ строится и запись читается здесь же, как в декораторе cached_reader (см. _find).
+        try:
+            cache_key = (qualname, args, _kwargs_key(kwargs) if kwargs else _NO_KWARGS,
+                         () if not args else type(args[0]) if len(args) == 1 else tuple(map(type, args)))
+            data = cache._lock_free
+            value = _MISSING if data is None else data.get(cache_key, _MISSING)
+            if value is _MISSING:
+                value, stale = cache.lookup(cache_key)
+            else:
+                cache.hits += 1
+                stale = False
+        except TypeError:
+            cache_key, value, stale = _find(cache, qualname, args, kwargs)
+        if value is not _MISSING and not stale and cache.metrics is None:
+            if self._logger is not None:
+                _log_read(self._logger, self, qualname, args, kwargs)
+            return value
+        return _read_cache(cache, (cache_key, value, stale), func, None, args, kwargs, _ttl, _stale_while_revalidate,
+                           _debug_logger(self._logger), self)
+
+    def cache_reset(self, key: str = None, *, is_match=True, is_tag=False, scope: CacheScope = CacheScope.INSTANCE):
         """
         Сброс кэша.
         :param key: Ключ конкретного кэша, который требуется сбросить. Если None, то сбрасывается весь кэш.
-        :param is_match: Если True, то сброс по точному совпадению ключа. Иначе по вхождению в наименование ключа
+                    Ключ указывается строковым именем записи вида "имя_арг1_арг2_имя=значение"
+                    или ключом кэша (кортежем).
+        :param is_match: Если True, то сброс по точному совпадению ключа. Иначе по вхождению в наименование ключа.
+        :param is_tag: Если True, то key - тег: имя функции, имя функции с первыми аргументами вида "имя_арг1"
+                    или пространство имен. Группа записей с этим тегом сбрасывается по индексу, без перебора
+                    всех ключей, а записи, в имени которых key встречается только как подстрока, не сбрасываются.
+                    is_match при этом не учитывается.
+        :param scope: Какой кэш сбрасывается: экземпляра, общий кэш класса или общий кэш всех классов
+                    (для методов с @cached_reader(scope=...)).
         :return:
         """
+        cache = self._cache if scope == CacheScope.INSTANCE else _SCOPE_CACHES[CacheScope(scope)](self)
         if key is None:
-            self._logger_debug(f"Clearing the entire cache '{self.__class__.__name__}'")
-            self._cache = {}
+            self._logger_debug("Clearing the entire cache '%s'", self.__class__.__name__)
+            cache.clear()
+        elif is_tag:
+            if cache.invalidate(key):
+                self._logger_debug("Clearing the cache '%s' by tag %s", self.__class__.__name__, key)
+        elif is_match:
+            # У одного имени может быть несколько ключей, например y_value(1) и y_value('1').
+            cache_keys = (cache.find_all(key) or (key,)) if isinstance(key, str) else (key,)
+            # Запись могла истечь или быть вытеснена в любой момент, поэтому она удаляется без проверки наличия.
+            for cache_key in cache_keys:
+                if cache.discard(cache_key):
+                    self._logger_debug("Clearing the cache '%s' by key %s", self.__class__.__name__, key)
         else:
-            if is_match:
-                if key in self._cache:
-                    self._logger_debug(f"Clearing the cache '{self.__class__.__name__}' by key {key}")
-                    del self._cache[key]
-            else:
-                keys = tuple(filter(lambda i: key in i, self._cache.keys()))
-                for _key in keys:
-                    self._logger_debug(f"Clearing the cache '{self.__class__.__name__}' by key {_key} "
-                                       f"coincidentally {key}")
-                    del self._cache[_key]
-
-            if key in self._cache:
-                self._logger_debug(f"Clearing the cache '{self.__class__.__name__}' by key {key}")
-                del self._cache[key]
\ No newline at end of file
+            names = tuple(filter(lambda i: key in i, cache.names()))
+            for name in names:
+                for cache_key in cache.find_all(name):
+                    if cache.discard(cache_key):
+                        self._logger_debug("Clearing the cache '%s' by key %s coincidentally %s",
+                                           self.__class__.__name__, name, key)
@@ -1,5 +1,16 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AbstractContextManager
+from bisect import bisect_left
 from enum import IntEnum
+from functools import lru_cache, wraps
 from doctest import testmod
+from threading import Lock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Param(IntEnum):
@@ -12,6 +23,565 @@ class Condition(IntEnum):
     ALL = 2
 
 
+class Backend(IntEnum):
+    INT = 1
+    BUFFER = 2
+    SPARSE = 3
+
+
+class Overflow(IntEnum):
+    UNCHECKED = 1
+    TRUNCATE = 2
+    REJECT = 3
+
+
+# Наибольшая ширина маски, которая хранится в кэше: 128 масок такой ширины занимают не больше 1 Мб.
+_CACHED_FULL_MASK_BITS = 1 << 16
+
+
+def _full_mask(number_of_bits: int) -> int:
+    """
+    Возвращает маску со всеми установленными битами.
+    Маски не шире _CACHED_FULL_MASK_BITS бит берутся из кэша, более широкие создаются заново и не удерживаются.
+    """
+    if number_of_bits <= _CACHED_FULL_MASK_BITS:
+        return _cached_full_mask(number_of_bits)
+    return (1 << number_of_bits) - 1
+
+
+@lru_cache(maxsize=128)
+def _cached_full_mask(number_of_bits: int) -> int:
+    """ Возвращает маску со всеми установленными битами. Одна на каждое количество бит. """
+    return (1 << number_of_bits) - 1
+
+
+class _IntBits:
+    """
+    Хранилище битов в одном целом числе.
+    Любое изменение создает новое целое число, поэтому подходит для небольших наборов флагов.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, number_of_bits: int):
+        self.value = 0
+
+    def to_int(self) -> int:
+        return self.value
+
+    def load_int(self, value: int):
+        self.value = value
+
+    def get(self, index: int) -> int:
+        return self.value >> index & 1
+
+    def put(self, index: int, val: bool):
+        if val:
+            self.value |= 1 << index
+        else:
+            self.value &= ~(1 << index)
+
+    def flip(self, index: int):
+        self.value ^= 1 << index
+
+    def ior(self, mask: int):
+        self.value |= mask
+
+    def iand(self, mask: int):
+        self.value &= mask
+
+    def iandnot(self, mask: int):
+        self.value &= ~mask
+
+    def ixor(self, mask: int):
+        self.value ^= mask
+
+    def invert(self, number_of_bits: int):
+        self.value ^= _full_mask(number_of_bits)
+
+    def test_any(self, mask: int) -> bool:
+        return self.value & mask != 0
+
+    def test_all(self, mask: int) -> bool:
+        return self.value & mask == mask
+
+    def get_bytes(self, number_of_bits: int) -> bytes:
+        value = self.value
+        if value.bit_length() > number_of_bits:
+            value &= (1 << number_of_bits) - 1
+        return value.to_bytes((number_of_bits + 7) >> 3, 'little')
+
+    def copy(self):
+        storage = _IntBits(0)
+        storage.value = self.value
+        return storage
+
+    def count(self, number_of_bits: int) -> int:
+        value = self.value
+        # Без проверки переполнения в числе могут остаться биты за пределами количества бит.
+        if value.bit_length() > number_of_bits:
+            value &= (1 << number_of_bits) - 1
+        return value.bit_count()
+
+    def iter_bits(self, number_of_bits: int):
+        return _iter_set_bits(self.get_bytes(number_of_bits))
+
+
+class _BufferBits:
+    """
+    Хранилище битов в изменяемом байтовом буфере фиксированной длины (младший бит - первый).
+    Операции над одним битом меняют только один байт, поэтому их стоимость не зависит от количества бит.
+    Операции по маске затрагивают только те байты, которые покрывает маска.
+    Биты за пределами количества бит хранилища отбрасываются.
+    """
+    __slots__ = ('buffer', 'number_of_bits')
+
+    def __init__(self, number_of_bits: int, buffer: memoryview | bytearray | None = None):
+        self.number_of_bits = number_of_bits
+        self.buffer = bytearray((number_of_bits + 7) >> 3) if buffer is None else buffer
+
+    def __fit(self, mask: int) -> int:
+        """ Отбрасывает биты маски, которые не помещаются в хранилище. """
+        if mask.bit_length() > self.number_of_bits:
+            mask &= _full_mask(self.number_of_bits)
+        return mask
+
+    def to_int(self) -> int:
+        return int.from_bytes(self.buffer, 'little')
+
+    def load_int(self, value: int):
+        self.buffer[:] = self.__fit(value).to_bytes(len(self.buffer), 'little')
+
+    def get(self, index: int) -> int:
+        if index >= self.number_of_bits:
+            return 0
+        return self.buffer[index >> 3] >> (index & 7) & 1
+
+    def put(self, index: int, val: bool):
+        if index >= self.number_of_bits:
+            return
+        if val:
+            self.buffer[index >> 3] |= 1 << (index & 7)
+        else:
+            self.buffer[index >> 3] &= 0xFF ^ (1 << (index & 7))
+
+    def flip(self, index: int):
+        if index < self.number_of_bits:
+            self.buffer[index >> 3] ^= 1 << (index & 7)
+
+    def __update(self, mask: int, operation):
+        """ Применяет операцию только к байтам, которые покрывает маска. """
+        mask = self.__fit(mask)
+        length = (mask.bit_length() + 7) >> 3
+        if length:
+            buffer = self.buffer
+            buffer[:length] = operation(int.from_bytes(buffer[:length], 'little'), mask).to_bytes(length, 'little')
+
+    def ior(self, mask: int):
+        self.__update(mask, int.__or__)
+
+    def iand(self, mask: int):
+        self.load_int(self.to_int() & mask)
+
+    def iandnot(self, mask: int):
+        self.__update(mask, lambda value, _mask: value & ~_mask)
+
+    def ixor(self, mask: int):
+        self.__update(mask, int.__xor__)
+
+    def invert(self, number_of_bits: int):
+        self.load_int(self.to_int() ^ _full_mask(number_of_bits))
+
+    def test_any(self, mask: int) -> bool:
+        length = min((mask.bit_length() + 7) >> 3, len(self.buffer))
+        return int.from_bytes(self.buffer[:length], 'little') & mask != 0
+
+    def test_all(self, mask: int) -> bool:
+        length = min((mask.bit_length() + 7) >> 3, len(self.buffer))
+        return int.from_bytes(self.buffer[:length], 'little') & mask == mask
+
+    def get_bytes(self, number_of_bits: int) -> bytearray:
+        return self.buffer
+
+    def copy(self):
+        return _BufferBits(self.number_of_bits, bytearray(self.buffer))
+
+    def count(self, number_of_bits: int) -> int:
+        return self.to_int().bit_count()
+
+    def iter_bits(self, number_of_bits: int):
+        return _iter_set_bits(self.buffer)
+
+
+# Таблица для str.translate, удаляющая из строки символы битов.
+_BIT_CHARS_TABLE = str.maketrans('', '', '01')
+
+# Размер блока в байтах, нулевые блоки при переборе установленных бит пропускаются целиком.
+_SCAN_BLOCK = 512
+_ZERO_BLOCK = bytes(_SCAN_BLOCK)
+
+
+def _iter_set_bits(data, start: int = 0):
+    """
+    Перебирает порядковые номера установленных бит в байтах (младший бит первого байта - бит 1),
+    начиная с байта start. Нулевые блоки пропускаются, а внутри слова каждый следующий
+    установленный бит находится через младший установленный бит (word & -word).
+    """
+    length = len(data)
+    for block in range(start, length, _SCAN_BLOCK):
+        if data[block:block + _SCAN_BLOCK] == _ZERO_BLOCK[:min(_SCAN_BLOCK, length - block)]:
+            continue
+        for offset in range(block, min(block + _SCAN_BLOCK, length), 8):
+            word = int.from_bytes(data[offset:offset + 8], 'little')
+            base = offset << 3
+            while word:
+                low = word & -word
+                yield base + low.bit_length()
+                word ^= low
+
+
+class _RankIndex:
+    """
+    Индекс для rank и select: накопленное количество установленных бит перед каждым блоком
+    и байты, по которым он построен (для буфера - сам буфер).
+    """
+    __slots__ = ('data', 'block_bytes', 'cumulative')
+
+    def __init__(self, data, block_bytes: int):
+        self.data = data
+        self.block_bytes = block_bytes
+        self.cumulative = array('Q', [0])
+        total = 0
+        for block in range(0, len(data), block_bytes):
+            total += int.from_bytes(data[block:block + block_bytes], 'little').bit_count()
+            self.cumulative.append(total)
+
+
+def _pack_bit_numbers(list_num) -> int:
+    """
+    Собирает битовую маску из порядковых номеров битов через упакованный байтовый буфер,
+    не создавая промежуточное целое число на каждый номер.
+    """
+    list_num = list_num if isinstance(list_num, (list, tuple, set, frozenset)) else tuple(list_num)
+    # Для нескольких номеров буфер не нужен, сдвиги обходятся дешевле.
+    if len(list_num) <= 16:
+        mask = 0
+        for num in list_num:
+            if num < 1:
+                raise ValueError("Порядковый номер бита должен быть больше нуля.")
+            mask |= 1 << num - 1
+        return mask
+    if min(list_num) < 1:
+        raise ValueError("Порядковый номер бита должен быть больше нуля.")
+    buffer = bytearray((max(list_num) + 7) >> 3)
+    for num in list_num:
+        num -= 1
+        buffer[num >> 3] |= 1 << (num & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _pack_bit_numbers_array(nums) -> int:
+    """
+    Собирает битовую маску из массива порядковых номеров битов (нулевые номера пропускаются)
+    упаковкой в numpy.uint8 за один проход.
+    """
+    indexes = np.asarray(nums).astype(np.int64, copy=False).ravel()
+    indexes = indexes[indexes > 0] - 1
+    if not indexes.size:
+        return 0
+    bits = np.zeros(int(indexes.max()) + 1, dtype=np.bool_)
+    bits[indexes] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+# Размер фрагмента разреженного хранилища в битах и байтах.
+_CHUNK_BITS = 1 << 16
+_CHUNK_BYTES = _CHUNK_BITS >> 3
+# Максимальное количество бит фрагмента, которые хранятся отсортированным массивом.
+_ARRAY_LIMIT = 4096
+
+
+def _container_to_int(container) -> int:
+    """ Возвращает фрагмент разреженного хранилища в виде целого числа. """
+    if type(container) is int:
+        return container
+    if type(container) is tuple:
+        value = 0
+        for start, end in container:
+            value |= ((1 << (end - start)) - 1) << start
+        return value
+    buffer = bytearray((container[-1] >> 3) + 1)
+    for position in container:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _container_count(container) -> int:
+    """ Возвращает количество установленных бит фрагмента. """
+    if type(container) is int:
+        return container.bit_count()
+    if type(container) is tuple:
+        return sum(end - start for start, end in container)
+    return len(container)
+
+
+def _pack_container(value: int):
+    """
+    Выбирает самое компактное представление фрагмента по плотности бит:
+    кортеж интервалов (start, end) для длинных серий, отсортированный массив номеров для редких бит,
+    и целое число (битовую карту) для плотных. Пустой фрагмент - None.
+    """
+    count = value.bit_count()
+    if not count:
+        return None
+    # Каждая серия единиц дает две смены значения соседних бит.
+    runs = (value ^ (value << 1)).bit_count() >> 1
+    if runs * 4 < min(count * 2, _CHUNK_BYTES):
+        edges = [position - 1 for position in _iter_set_bits((value ^ (value << 1)).to_bytes(_CHUNK_BYTES + 1, 'little'))]
+        return tuple(zip(edges[::2], edges[1::2]))
+    if count <= _ARRAY_LIMIT:
+        return array('H', [position - 1 for position in _iter_set_bits(value.to_bytes(_CHUNK_BYTES, 'little'))])
+    return value
+
+
+def _iter_chunks(mask):
+    """ Перебирает ненулевые фрагменты маски (целого числа или разреженного хранилища) как (ключ, число). """
+    if type(mask) is _SparseBits:
+        for key, container in mask.chunks.items():
+            yield key, _container_to_int(container)
+        return
+    data = mask.to_bytes((mask.bit_length() + 7) >> 3, 'little')
+    for key, offset in enumerate(range(0, len(data), _CHUNK_BYTES)):
+        part = data[offset:offset + _CHUNK_BYTES]
+        if part.count(0) != len(part):
+            yield key, int.from_bytes(part, 'little')
+
+
+class _SparseBits:
+    """
+    Разреженное (roaring-подобное) хранилище битов. Биты делятся на фрагменты по 65536 бит,
+    хранятся только фрагменты с установленными битами, и каждый фрагмент сам выбирает
+    представление по плотности: массив номеров, битовую карту или интервалы.
+    Биты за пределами количества бит хранилища отбрасываются.
+    """
+    __slots__ = ('chunks', 'number_of_bits')
+
+    def __init__(self, number_of_bits: int):
+        self.number_of_bits = number_of_bits
+        self.chunks = {}
+
+    def __fit(self, mask):
+        """
+        Отбрасывает биты маски, которые не помещаются в хранилище. У более широкого разреженного хранилища
+        берутся только фрагменты в пределах количества бит, а последний из них обрезается.
+        """
+        if type(mask) is int:
+            if mask.bit_length() > self.number_of_bits:
+                mask &= _full_mask(self.number_of_bits)
+            return mask
+        if mask.number_of_bits <= self.number_of_bits:
+            return mask
+        last = (self.number_of_bits - 1) >> 16
+        width = self.number_of_bits - (last << 16)
+        fitted = _SparseBits(self.number_of_bits)
+        for key, container in mask.chunks.items():
+            if key < last:
+                fitted.chunks[key] = container
+            elif key == last:
+                fitted.__store(key, _container_to_int(container) & _full_mask(width))
+        return fitted
+
+    def __store(self, key: int, value: int):
+        container = _pack_container(value)
+        if container is None:
+            self.chunks.pop(key, None)
+        else:
+            self.chunks[key] = container
+
+    def copy(self):
+        storage = _SparseBits(self.number_of_bits)
+        storage.chunks = {key: array('H', container) if type(container) is array else container
+                          for key, container in self.chunks.items()}
+        return storage
+
+    def get_bytes(self, number_of_bits: int) -> bytearray:
+        data = bytearray((number_of_bits + 7) >> 3)
+        for key, container in self.chunks.items():
+            value = _container_to_int(container)
+            length = (value.bit_length() + 7) >> 3
+            offset = key * _CHUNK_BYTES
+            data[offset:offset + length] = value.to_bytes(length, 'little')
+        return data
+
+    def to_int(self) -> int:
+        return int.from_bytes(self.get_bytes(self.number_of_bits), 'little')
+
+    def load_int(self, value: int):
+        self.chunks = {}
+        for key, part in _iter_chunks(self.__fit(value)):
+            self.__store(key, part)
+
+    def get(self, index: int) -> int:
+        container = self.chunks.get(index >> 16)
+        if container is None:
+            return 0
+        position = index & 0xFFFF
+        if type(container) is int:
+            return container >> position & 1
+        if type(container) is tuple:
+            item = bisect_left(container, (position + 1,)) - 1
+            return 1 if item >= 0 and container[item][1] > position else 0
+        item = bisect_left(container, position)
+        return 1 if item < len(container) and container[item] == position else 0
+
+    def put(self, index: int, val: bool):
+        if index >= self.number_of_bits:
+            return
+        key = index >> 16
+        position = index & 0xFFFF
+        container = self.chunks.get(key)
+        if type(container) is array:
+            # Массив меняем на месте, пока он не перерастет предел или не опустеет.
+            item = bisect_left(container, position)
+            present = item < len(container) and container[item] == position
+            if val and not present and len(container) < _ARRAY_LIMIT:
+                container.insert(item, position)
+                return
+            if not val and present and len(container) > 1:
+                del container[item]
+                return
+            if val == present:
+                return
+        if container is None:
+            if val:
+                self.chunks[key] = array('H', [position])
+            return
+        value = _container_to_int(container)
+        self.__store(key, value | (1 << position) if val else value & ~(1 << position))
+
+    def flip(self, index: int):
+        self.put(index, not self.get(index))
+
+    def ior(self, mask):
+        for key, part in _iter_chunks(self.__fit(mask)):
+            container = self.chunks.get(key)
+            self.__store(key, part if container is None else _container_to_int(container) | part)
+
+    def iand(self, mask):
+        parts = dict(_iter_chunks(mask))
+        for key, container in tuple(self.chunks.items()):
+            self.__store(key, _container_to_int(container) & parts.get(key, 0))
+
+    def iandnot(self, mask):
+        for key, part in _iter_chunks(mask):
+            container = self.chunks.get(key)
+            if container is not None:
+                self.__store(key, _container_to_int(container) & ~part)
+
+    def ixor(self, mask):
+        for key, part in _iter_chunks(self.__fit(mask)):
+            container = self.chunks.get(key)
+            self.__store(key, part if container is None else _container_to_int(container) ^ part)
+
+    def invert(self, number_of_bits: int):
+        # Отсутствующие фрагменты становятся полностью заполненными интервалами,
+        # поэтому стоимость зависит только от количества фрагментов.
+        chunks = {}
+        for key in range(((number_of_bits - 1) >> 16) + 1):
+            width = min(_CHUNK_BITS, number_of_bits - (key << 16))
+            container = self.chunks.get(key)
+            if container is None:
+                chunks[key] = ((0, width),)
+            else:
+                container = _pack_container(_container_to_int(container) ^ _full_mask(width))
+                if container is not None:
+                    chunks[key] = container
+        self.chunks = chunks
+
+    def test_any(self, mask) -> bool:
+        for key, part in _iter_chunks(mask):
+            container = self.chunks.get(key)
+            if container is not None and _container_to_int(container) & part:
+                return True
+        return False
+
+    def test_all(self, mask) -> bool:
+        for key, part in _iter_chunks(mask):
+            container = self.chunks.get(key)
+            if container is None or _container_to_int(container) & part != part:
+                return False
+        return True
+
+    def count(self, number_of_bits: int) -> int:
+        return sum(_container_count(container) for container in self.chunks.values())
+
+    def iter_bits(self, number_of_bits: int):
+        for key in sorted(self.chunks):
+            container = self.chunks[key]
+            base = key << 16
+            if type(container) is int:
+                for position in _iter_set_bits(container.to_bytes(_CHUNK_BYTES, 'little')):
+                    yield base + position
+            elif type(container) is tuple:
+                for start, end in container:
+                    yield from range(base + start + 1, base + end + 1)
+            else:
+                for position in container:
+                    yield base + position + 1
+
+
+_STORAGES = {Backend.INT: _IntBits, Backend.BUFFER: _BufferBits, Backend.SPARSE: _SparseBits}
+_BACKENDS = {storage: backend for backend, storage in _STORAGES.items()}
+
+
+class Mask(int):
+    """
+    Заранее разобранная битовая маска. Создается один раз из строки битов, последовательности
+    порядковых номеров или целого числа, после чего методы Flags принимают ее без повторного разбора.
+
+    >>> m = Mask('01011')
+    >>> m
+    Mask('01011')
+    >>> int(m)
+    26
+    >>> f = Flags(8)
+    >>> f.set_bits(m, 1)
+    >>> f.check_bits(m, 1), f.str_bits
+    (True, '01011000')
+    >>> Mask([1, 3]) | Mask('01')
+    7
+    >>> Mask((1, 3, 100), 8)
+    Mask('101')
+    >>> Mask((1, 3, 100), 8, Overflow.REJECT)
+    Traceback (most recent call last):
+        ...
+    ValueError: Битовая маска выходит за пределы 8 бит.
+    """
+    __slots__ = ()
+
+    def __new__(cls, bit_mask: str | list[int] | tuple[int, ...] | set | int = 0,
+                number_of_bits: int | None = None, overflow: Overflow = Overflow.TRUNCATE):
+        """
+        :param bit_mask: Битовая маска указанная в виде строки битов, последовательности порядковых чисел,
+                        целого неотрицательного числа или флагов.
+        :param number_of_bits: Количество бит, в которое должна поместиться маска. Если указано,
+                        то маска один раз приводится к этому количеству бит при создании.
+        :param overflow: Что делать с битами за пределами количества бит: Overflow.TRUNCATE - отбросить,
+                        Overflow.REJECT - выбросить исключение.
+        :raises TypeError: Битовая маска не может быть отрицательной. |
+                            Недопустимый тип битовой маски.
+        :raises ValueError: Битовая маска выходит за пределы количества бит.
+        """
+        if isinstance(bit_mask, Flags):
+            bit_mask = bit_mask.int_bits
+        bit_mask = _convert_bit_mask(bit_mask)
+        if number_of_bits is not None:
+            bit_mask = _fit_bit_mask(bit_mask, number_of_bits, overflow)
+        return super().__new__(cls, bit_mask)
+
+    def __repr__(self):
+        return f"Mask('{Flags.util_int_to_bitstring(self)}')"
+
+
 class Flags:
     """
     Класс работы с битовыми флагами.
@@ -27,19 +597,61 @@ class Flags:
     >>> f = Flags(2, Param.PARAM_BYTES)
     >>> f.number_of_bits
     16
+
+    По умолчанию (Overflow.UNCHECKED) биты за пределами количества бит не проверяются, и при хранении
+    в целом числе оно может вырасти сколько угодно. В строгом режиме маска приводится к количеству бит
+    один раз при разборе: Overflow.TRUNCATE отбрасывает лишние биты, Overflow.REJECT выбрасывает исключение.
+    Результат оператора над флагами разной ширины имеет количество бит и режим левого операнда:
+    в режиме Overflow.TRUNCATE лишние биты правого операнда отбрасываются,
+    в режиме Overflow.REJECT флаги разной ширины не допускаются.
+
+    >>> f = Flags(8, Param.PARAM_BITS, None, Backend.INT, Overflow.TRUNCATE)
+    >>> f.set_bits(1 << 100 | 1, 1)
+    >>> f.int_bits, f.overflow
+    (1, <Overflow.TRUNCATE: 2>)
+    >>> f.set_bit(100, 1)
+    >>> f.int_bits
+    1
+    >>> (f | Flags(16, Param.PARAM_BITS, '1111111111111111')).str_bits
+    '11111111'
+    >>> f = Flags(8, Param.PARAM_BITS, None, Backend.INT, Overflow.REJECT)
+    >>> f.set_bits((1, 9), 1)
+    Traceback (most recent call last):
+        ...
+    ValueError: Битовая маска выходит за пределы 8 бит.
+    >>> f & Flags(16)
+    Traceback (most recent call last):
+        ...
+    ValueError: Количество бит флагов различается: 8 и 16.
     """
 
+    __slots__ = ('__number_of_bits', '__storage', '__index', '__overflow', '__weakref__')
+
     # PARAM_BITS, PARAM_BYTES = (1, 2)
     # ANY, ALL = (1, 2)
 
     def __init__(self, number: int = 1, param: Param = Param.PARAM_BITS,
-                 bit_mask: str | list[int] | tuple[int, ...] | set | int | None = None):
+                 bit_mask: str | list[int] | tuple[int, ...] | set | int | None = None,
+                 backend: Backend = Backend.INT, overflow: Overflow = Overflow.UNCHECKED):
         """
         Инициализирует флаги битов. Если "bit_mask" не определен, то флаги остаются нулевый.
 
         >>> f = Flags(1, Param.PARAM_BYTES, '11000011')
         >>> f.str_bits
         '11000011'
+        >>> f = Flags(1000000, Param.PARAM_BITS, (1, 1000000), Backend.BUFFER)
+        >>> f.get_bit(1000000)
+        1
+        >>> f.set_bit(999999, 1)
+        >>> f.check_bits((999999, 1000000), 1)
+        True
+        >>> f = Flags(10 ** 9, Param.PARAM_BITS, (1, 65537, 10 ** 9), Backend.SPARSE)
+        >>> f.count(), list(f.iter_bits())
+        (3, [1, 65537, 1000000000])
+        >>> f = Flags(10, Param.PARAM_BITS, None, 0)
+        Traceback (most recent call last):
+            ...
+        TypeError: Неправильное значение. Значение должно быть Backend.INT(1), Backend.BUFFER(2) или Backend.SPARSE(3).
         >>>
 
         :param number: Количество битов или байтов, в зависимости от значения параметра "param".
@@ -47,12 +659,26 @@ class Flags:
                     если PARAM_BYTES, то будет создано бит в соответствии с указанным количеством байт.
         :param bit_mask: Битовая маска указанная в виде строки битов, последовательности порядковых чисел,
                         или целого неотрицательного числа.
+        :param backend: Способ хранения битов. Если Backend.INT, то биты хранятся в одном целом числе,
+                    если Backend.BUFFER, то в байтовом буфере фиксированной длины, который изменяется на месте.
+                    Для очень больших наборов флагов операции над отдельными битами в буфере не зависят
+                    от количества бит. Если Backend.SPARSE, то хранятся только фрагменты по 65536 бит,
+                    в которых есть установленные биты, что выгодно для широких наборов с редкими флагами.
+        :param overflow: Что делать с битами за пределами количества бит. Если Overflow.UNCHECKED,
+                    то они не проверяются, если Overflow.TRUNCATE - отбрасываются,
+                    если Overflow.REJECT - выбрасывается исключение ValueError.
         """
         if not (isinstance(number, int) and number > 0):
             raise TypeError("Неправильное значение. Количество {0} должно быть целым положительным числом.".
                             format("битов" if param == Param.PARAM_BITS else "байтов"))
         if param not in (1, 2):
             raise TypeError("Неправильное значение. Значение должно быть Param.PARAM_BYTE(1) или Param.PARAM_BYTES(2).")
+        if backend not in (1, 2, 3):
+            raise TypeError("Неправильное значение. Значение должно быть Backend.INT(1), Backend.BUFFER(2) "
+                            "или Backend.SPARSE(3).")
+        if overflow not in (1, 2, 3):
+            raise TypeError("Неправильное значение. Значение должно быть Overflow.UNCHECKED(1), "
+                            "Overflow.TRUNCATE(2) или Overflow.REJECT(3).")
         # Если передали байты,
         if param == 2:
             # то подсчитаем, сколько это бит.
@@ -62,16 +688,18 @@ class Flags:
             bits = number
         # Запомним сколько битов используется
         self.__number_of_bits = bits
-        # Далее сформируем нулевой список рабочих бит
-        self.__bits = 0
-        """@param _list_bits: список рабочих битов
-           @type _list_bits: list """
+        # Далее сформируем нулевое хранилище рабочих бит
+        self.__storage = _STORAGES[backend](bits)
+        # Индекс количества установленных бит по блокам для rank и select, строится по требованию.
+        self.__index = None
+        # Запомним, что делать с битами за пределами количества бит.
+        self.__overflow = Overflow(overflow)
         # Если была сразу передана битовая маска,
         if bit_mask is not None:
             # то преобразуем переданную битовую маску для проверки,
-            bit_mask = self.__convert_bit_mask(bit_mask)
+            bit_mask = self.__fit(_convert_bit_mask(bit_mask))
             # и произведем установку бит по битовой маске.
-            self.__bits |= bit_mask
+            self.__storage.ior(bit_mask)
 
     @property
     def value(self):
@@ -97,13 +725,14 @@ class Flags:
         множества или целого числа.
         :return:
         """
+        self.__index = None
         # Для начала сбросим все биты в ноль.
-        self.__bits = 0
-        if bit_mask is not None:
+        if bit_mask is None:
+            self.__storage.load_int(0)
+        else:
             # Далее преобразуем переданную битовую маску для проверки,
-            bit_mask = self.__convert_bit_mask(bit_mask)
             # и произведем установку бит по битовой маске.
-            self.__bits |= bit_mask
+            self.__storage.load_int(self.__fit(_convert_bit_mask(bit_mask)))
 
     @property
     def number_of_bits(self):
@@ -113,15 +742,190 @@ class Flags:
         """
         return self.__number_of_bits
 
-    def __get_all_bits(self):
+    @property
+    def backend(self) -> Backend:
+        """
+        Возвращает способ хранения битов.
+
+        >>> Flags(8).backend
+        <Backend.INT: 1>
+        """
+        return _BACKENDS[type(self.__storage)]
+
+    @property
+    def overflow(self) -> Overflow:
+        """
+        Возвращает режим обработки битов за пределами количества бит.
+
+        >>> Flags(8).overflow
+        <Overflow.UNCHECKED: 1>
         """
-        Возвращает биты со всеми установленными флагами.
+        return self.__overflow
+
+    def __fit(self, bit_mask: int) -> int:
+        """
+        Приводит разобранную битовую маску к количеству бит в соответствии с режимом overflow.
+        Проверка сводится к сравнению длины маски, поэтому не зависит от количества бит.
+        :param bit_mask: Битовая маска в виде целого неотрицательного числа.
+        :return:
+        :raises ValueError: Битовая маска выходит за пределы количества бит.
+        """
+        if self.__overflow == Overflow.UNCHECKED:
+            return bit_mask
+        return _fit_bit_mask(bit_mask, self.__number_of_bits, self.__overflow)
+
+    def __out_of_range(self, num_bit: int) -> bool:
+        """
+        Проверяет, что порядковый номер бита выходит за пределы количества бит в строгом режиме.
+        :param num_bit: Порядковый номер бита.
+        :return: Истина, если бит надо пропустить.
+        :raises ValueError: Бит выходит за пределы количества бит.
+        """
+        if num_bit <= self.__number_of_bits or self.__overflow == Overflow.UNCHECKED:
+            return False
+        if self.__overflow == Overflow.REJECT:
+            raise ValueError(f"Бит {num_bit} выходит за пределы {self.__number_of_bits} бит.")
+        return True
+
+    @classmethod
+    def from_bytes(cls, data: bytes | bytearray | memoryview, number: int | None = None,
+                   param: Param = Param.PARAM_BITS, backend: Backend = Backend.INT,
+                   overflow: Overflow = Overflow.UNCHECKED):
+        """
+        Создает флаги из байтов, полученных методом to_bytes.
+
+        >>> f = Flags(12, Param.PARAM_BITS, '101100000001')
+        >>> data = f.to_bytes()
+        >>> data
+        b'\\r\\x08'
+        >>> Flags.from_bytes(data, 12).str_bits
+        '101100000001'
+        >>> Flags.from_bytes(data, 20)
+        Traceback (most recent call last):
+            ...
+        ValueError: Длина данных должна быть 3 байт(а), передано 2.
+        >>>
+
+        :param data: Байты, младший бит первого байта - первый бит.
+        :param number: Количество битов или байтов, в зависимости от значения параметра "param".
+                    Если не указано, то берется по длине данных.
+        :param param: Единица измерения параметра "number".
+        :param backend: Способ хранения битов.
+        :param overflow: Что делать с битами за пределами количества бит.
         :return:
+        :raises ValueError: Длина данных не соответствует количеству бит.
+        """
+        flags = cls(len(data) if number is None else number,
+                    Param.PARAM_BYTES if number is None else param, None, backend, overflow=overflow)
+        data = memoryview(data).cast('B')
+        cls.__check_length(data, flags.number_of_bits, exact=True)
+        flags.__storage.load_int(flags.__fit(int.from_bytes(data, 'little')))
+        return flags
+
+    @classmethod
+    def from_buffer(cls, buffer, number: int | None = None, param: Param = Param.PARAM_BITS,
+                    overflow: Overflow = Overflow.UNCHECKED):
+        """
+        Создает флаги поверх существующего буфера (bytearray, mmap и т.п.) без копирования.
+        Все изменения флагов сразу попадают в буфер, а изменения буфера видны во флагах.
+        Формат буфера тот же, что у to_bytes. Пока флаги существуют, буфер (mmap) нельзя закрыть.
+
+        >>> data = bytearray(b'\\x01\\x00')
+        >>> f = Flags.from_buffer(data)
+        >>> f.backend, f.number_of_bits
+        (<Backend.BUFFER: 2>, 16)
+        >>> f.set_bit(9, 1)
+        >>> data
+        bytearray(b'\\x01\\x01')
+        >>>
+
+        :param buffer: Объект, поддерживающий протокол буфера. Если он только для чтения,
+                    то флаги также можно будет только читать.
+        :param number: Количество битов или байтов, в зависимости от значения параметра "param".
+                    Если не указано, то берется по длине буфера.
+        :param param: Единица измерения параметра "number".
+        :param overflow: Что делать с битами за пределами количества бит.
+        :return:
+        :raises ValueError: Буфер меньше указанного количества бит.
+        """
+        view = memoryview(buffer).cast('B')
+        flags = cls(1, Param.PARAM_BITS, overflow=overflow)
+        number_of_bits = len(view) * 8 if number is None else (number * 8 if param == Param.PARAM_BYTES else number)
+        if not (isinstance(number_of_bits, int) and number_of_bits > 0):
+            raise TypeError("Неправильное значение. Количество битов должно быть целым положительным числом.")
+        cls.__check_length(view, number_of_bits, exact=False)
+        flags.__number_of_bits = number_of_bits
+        flags.__storage = _BufferBits(number_of_bits, view[:(number_of_bits + 7) >> 3])
+        flags.__index = None
+        return flags
+
+    @staticmethod
+    def __check_length(data: memoryview, number_of_bits: int, exact: bool):
+        """
+        Проверяет, что длина данных соответствует количеству бит.
+        :raises ValueError: Длина данных должна быть N байт(а).
+        """
+        length = (number_of_bits + 7) >> 3
+        if len(data) < length or (exact and len(data) != length):
+            raise ValueError(f"Длина данных должна быть {'' if exact else 'не меньше '}{length} байт(а), "
+                             f"передано {len(data)}.")
+
+    def to_bytes(self) -> bytes:
+        """
+        Возвращает биты в виде байтов фиксированной длины, зависящей от количества бит.
+        Первый бит - младший бит первого байта.
+
+        >>> Flags(10, Param.PARAM_BITS, '1000000001').to_bytes()
+        b'\\x01\\x02'
+        >>>
+        """
+        return bytes(self.__storage.get_bytes(self.__number_of_bits))
+
+    def as_memoryview(self) -> memoryview:
+        """
+        Возвращает биты в формате to_bytes через memoryview.
+        Для Backend.BUFFER это изменяемое представление самого буфера без копирования,
+        для Backend.INT - представление копии только для чтения.
+
+        >>> f = Flags(8, Param.PARAM_BITS, '1', Backend.BUFFER)
+        >>> view = f.as_memoryview()
+        >>> view[0] |= 2
+        >>> f.str_bits
+        '11000000'
+        >>>
+        """
+        data = self.__storage.get_bytes(self.__number_of_bits)
+        return memoryview(data if type(self.__storage) is _BufferBits else bytes(data))
+
+    def __buffer__(self, flags: int) -> memoryview:
+        """ Протокол буфера (Python 3.12+), позволяет писать memoryview(f). """
+        return self.as_memoryview()
+
+    def invert_all(self):
+        """
+        Переключает все биты в противоположенное значение на месте, не создавая новых флагов.
+
+        >>> f = Flags(8, Param.PARAM_BITS, '01011100')
+        >>> f.invert_all()
+        >>> f.str_bits
+        '10100011'
+        >>>
+        """
+        self.__index = None
+        self.__storage.invert(self.__number_of_bits)
+
+    def invert(self):
         """
-        all_bits = 0
-        for num in range(0, self.number_of_bits):
-            all_bits |= 1 << num
-        return all_bits
+        Переключает все биты в противоположенное значение на месте и возвращает эти же флаги,
+        то есть работает как ~ без создания новых флагов.
+
+        >>> f = Flags(8, Param.PARAM_BITS, '01011100')
+        >>> f.invert() is f, f.str_bits
+        (True, '10100011')
+        >>>
+        """
+        self.invert_all()
+        return self
 
     @property
     def bin_bits(self) -> bin:
@@ -129,7 +933,7 @@ class Flags:
         Возвращает битовую последовательность в виде значения bin.
         :return:
         """
-        return bin(self.__bits)
+        return bin(self.__storage.to_int())
 
     @property
     def int_bits(self) -> int:
@@ -137,7 +941,7 @@ class Flags:
         Возвращает битовую последовательность в виде целого числа.
         :return:
         """
-        return self.__bits
+        return self.__storage.to_int()
 
     @property
     def str_bits(self) -> str:
@@ -152,10 +956,119 @@ class Flags:
         Возвращает битовую последовательность в виде строки.
         :return:
         """
-        str_bits = ""
-        for bit in range(0, self.__number_of_bits):
-            str_bits += "1" if (self.__bits & (1 << bit)) else "0"
-        return str_bits
+        number_of_bits = self.__number_of_bits
+        # bin() выдает биты от старшего к младшему, поэтому переворачиваем строку,
+        # отрезаем лишние старшие биты и дополняем нулями до количества бит.
+        return bin(self.__storage.to_int())[:1:-1][:number_of_bits].ljust(number_of_bits, "0")
+
+    def count(self) -> int:
+        """
+        Возвращает количество установленных бит.
+
+        >>> Flags(8, Param.PARAM_BITS, '01011100').count()
+        4
+        >>> f = Flags(4, Param.PARAM_BITS, 1 | 1 << 10)
+        >>> f.count(), list(f.iter_bits()), f.select(2)
+        (1, [1], None)
+        >>>
+        """
+        return self.__storage.count(self.__number_of_bits)
+
+    def iter_bits(self):
+        """
+        Перебирает порядковые номера установленных бит по возрастанию,
+        сразу переходя к следующему установленному биту.
+
+        >>> list(Flags(8, Param.PARAM_BITS, '01011100').iter_bits())
+        [2, 4, 5, 6]
+        >>>
+        """
+        return self.__storage.iter_bits(self.__number_of_bits)
+
+    def build_index(self, block_size: int = 512):
+        """
+        Строит индекс количества установленных бит по блокам, после чего rank и select выполняются
+        без пересчета всей битовой последовательности. Любое изменение флагов сбрасывает индекс,
+        изменения внешнего буфера (from_buffer, as_memoryview) - нет, после них индекс надо перестроить.
+
+        >>> f = Flags(4096, Param.PARAM_BITS, (1, 700, 4096))
+        >>> f.build_index()
+        >>> f.rank(700), f.select(3)
+        (2, 4096)
+        >>>
+
+        :param block_size: Размер блока в битах, кратный 64.
+        :raises TypeError: Размер блока должен быть целым положительным числом, кратным 64.
+        """
+        if not (isinstance(block_size, int) and block_size > 0 and block_size % 64 == 0):
+            raise TypeError("Размер блока должен быть целым положительным числом, кратным 64.")
+        self.__index = _RankIndex(self.__storage.get_bytes(self.__number_of_bits), block_size >> 3)
+
+    def rank(self, num: int) -> int:
+        """
+        Возвращает количество установленных бит с порядковыми номерами от 1 до num включительно.
+
+        >>> f = Flags(8, Param.PARAM_BITS, '01011100')
+        >>> f.rank(1), f.rank(4), f.rank(8)
+        (0, 2, 4)
+        >>>
+
+        :param num: Порядковый номер бита.
+        :return:
+        :raises TypeError: Бит должен быть указан как неотрицательный порядковый номер бита
+                          в битовой последовательности.
+        """
+        if not _validate_not_negative_int(num):
+            raise TypeError("Бит должен быть указан как неотрицательный порядковый "
+                            "номер бита в битовой последовательности.")
+        num = min(num, self.__number_of_bits)
+        index = self.__index
+        start = 0
+        result = 0
+        if index is None:
+            data = self.__storage.get_bytes(self.__number_of_bits)
+        else:
+            data = index.data
+            # Полные блоки берем из индекса, досчитываем только часть последнего блока.
+            block = (num >> 3) // index.block_bytes
+            start = block * index.block_bytes
+            result = index.cumulative[block]
+        end = (num + 7) >> 3
+        tail = int.from_bytes(data[start:end], 'little') & ((1 << (num - (start << 3))) - 1)
+        return result + tail.bit_count()
+
+    def select(self, k: int) -> int | None:
+        """
+        Возвращает порядковый номер k-го по счету установленного бита.
+
+        >>> f = Flags(8, Param.PARAM_BITS, '01011100')
+        >>> f.select(1), f.select(4), f.select(5)
+        (2, 6, None)
+        >>>
+
+        :param k: Номер установленного бита по счету, начиная с 1.
+        :return: Порядковый номер бита, или None, если установленных бит меньше k.
+        :raises TypeError: Номер должен быть целым положительным числом.
+        """
+        if not (isinstance(k, int) and k > 0):
+            raise TypeError("Номер должен быть целым положительным числом.")
+        index = self.__index
+        start = 0
+        if index is None:
+            data = self.__storage.get_bytes(self.__number_of_bits)
+        else:
+            data = index.data
+            # Находим блок, в котором накопленное количество достигает k.
+            block = bisect_left(index.cumulative, k) - 1
+            if block >= len(index.cumulative) - 1:
+                return None
+            k -= index.cumulative[block]
+            start = block * index.block_bytes
+        for num in _iter_set_bits(data, start):
+            k -= 1
+            if k == 0:
+                return num
+        return None
 
     def get_bit(self, num: int):
         """
@@ -176,12 +1089,12 @@ class Flags:
         :raises TypeError: Проверяемый бит должен быть указан как неотрицательный порядковый
                             номер бита в битовой последовательности.
         """
-        if not self.__validate_not_negative_int(num):
+        if not _validate_not_negative_int(num):
             raise TypeError("Проверяемый бит должен быть указан как неотрицательный порядковый "
                             "номер бита в битовой последовательности.")
         if num == 0:
             return 0
-        return 1 if self.__bits & 1 << num - 1 != 0 else 0
+        return self.__storage.get(num - 1)
 
     def get_bit_bool(self, num) -> bool:
         """
@@ -226,16 +1139,17 @@ class Flags:
         :raises TypeError: Изменяемый бит должен быть указан как порядковый номер бита
                           больше нуля в битовой последовательности.
         """
-        if not self.__validate_not_negative_int(num_bit):
+        if not _validate_not_negative_int(num_bit):
             raise TypeError("Изменяемый бит должен быть указан как неотрицательный порядковый "
                             "номер бита в битовой последовательности.")
 
-        # Если передали 0, то ничего делать не надо.
-        if num_bit == 0:
+        # Если передали 0 или бит за пределами флагов в строгом режиме, то ничего делать не надо.
+        if num_bit == 0 or self.__out_of_range(num_bit):
             return
 
-        bit_mask = 1 << num_bit - 1
-        self.set_bits(bit_mask, val)
+        self.__index = None
+        # Меняем только один бит, не формируя битовую маску.
+        self.__storage.put(num_bit - 1, _convert_val_to_bool(val))
 
     def set_bits(self, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int):
         """
@@ -262,14 +1176,15 @@ class Flags:
                           Недопустимый тип битовой маски.
         """
         # Для начала преобразуем переданную битовую маску для проверки.
-        bit_mask = self.__convert_bit_mask(bit_mask)
+        bit_mask = self.__fit(_convert_bit_mask(bit_mask))
 
-        if self.__convert_val_to_bool(val):
+        self.__index = None
+        if _convert_val_to_bool(val):
             # Произведем установку бит по битовой маске.
-            self.__bits |= bit_mask
+            self.__storage.ior(bit_mask)
         else:
             # Или же произведем сброс по битовой маске.
-            self.__bits &= ~bit_mask
+            self.__storage.iandnot(bit_mask)
 
     def check_bit(self, num_bit: int, val: bool|int) -> bool | None :
         """
@@ -296,7 +1211,7 @@ class Flags:
         :raises TypeError: Проверямый бит должен быть указан как порядковый номер бита
                           больше нуля в битовой последовательности.
         """
-        if not self.__validate_not_negative_int(num_bit):
+        if not _validate_not_negative_int(num_bit):
             raise TypeError("Изменяемый бит должен быть указан как неотрицательный порядковый "
                             "номер бита в битовой последовательности.")
 
@@ -304,8 +1219,7 @@ class Flags:
         if num_bit == 0:
             return None
 
-        bit_mask = (num_bit,)
-        return self.check_bits(bit_mask, val)
+        return self.__storage.get(num_bit - 1) == _convert_val_to_bool(val)
 
     def check_bits(self, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int, condition: Condition = Condition.ALL):
         """
@@ -337,24 +1251,111 @@ class Flags:
             raise TypeError("Условие может быть только Condition.ANY (1) или Condition.ALL (2).")
 
         # Для начала преобразуем переданную битовую маску для проверки.
-        bit_mask = self.__convert_bit_mask(bit_mask)
+        bit_mask = self.__fit(_convert_bit_mask(bit_mask))
 
         # Если надо проверить биты на установку,
-        if self.__convert_val_to_bool(val):
+        if _convert_val_to_bool(val):
             # то их можно проверить на любой из установленых битов,
             if condition == Condition.ANY:
-                return self.__bits & bit_mask != 0
+                return self.__storage.test_any(bit_mask)
             else:
                 # или на то, чтобы бы все проверяемые биты были установлены.
-                return self.__bits & bit_mask == bit_mask
-        # Иначе проверить биты на сброс. Для этого нам надо бует инверсировать битовый массив значений
+                return self.__storage.test_all(bit_mask)
+        # Иначе проверить биты на сброс. Сброшен хоть один бит, если установлены не все,
+        # и сброшены все биты, если не установлен ни один.
         else:
             # Их так же можно проверить на любой из сброшенных битов,
             if condition == Condition.ANY:
-                return ~self.__bits & bit_mask != 0
+                return not self.__storage.test_all(bit_mask)
             else:
                 # или на то, чтобы бы все проверяемые биты были сброшены.
-                return ~self.__bits & bit_mask == bit_mask
+                return not self.__storage.test_any(bit_mask)
+
+    def set_bits_batch(self, nums, val: bool | int):
+        """
+        Устанавливает за один проход биты с указанными порядковыми номерами
+        в состояние указанное аргументом val.
+        Номера передаются массивом NumPy или любой последовательностью (буфером) целых чисел.
+        Нулевые номера пропускаются, как и в set_bit.
+
+        >>> f = Flags(1, Param.PARAM_BYTES)
+        >>> f.set_bits_batch([2, 4, 5, 6, 0], 1)
+        >>> f.str_bits
+        '01011100'
+        >>> f.set_bits_batch((4, 6), False)
+        >>> f.str_bits
+        '01001000'
+        >>>
+
+        :param nums: Порядковые номера битов.
+        :param val: Логическое значение или 1 или 0, в которое надо установить указанные биты.
+        :raises TypeError: Изменяемые биты должны быть указаны как неотрицательные порядковые
+                          номера битов в битовой последовательности.
+        """
+        bit_mask = self.__fit(self.__pack_batch(nums, "Изменяемые биты должны быть указаны как неотрицательные "
+                                                      "порядковые номера битов в битовой последовательности."))
+        self.__index = None
+        if _convert_val_to_bool(val):
+            self.__storage.ior(bit_mask)
+        else:
+            self.__storage.iandnot(bit_mask)
+
+    def get_bits_batch(self, nums):
+        """
+        Возвращает состояния битов с указанными порядковыми номерами.
+        Если доступен NumPy, то результат - массив numpy.bool_, иначе список логических значений.
+        Нулевые номера и номера за пределами количества бит возвращаются как False.
+
+        >>> f = Flags(1, Param.PARAM_BYTES)
+        >>> f.set_bits((2,4,5,6), 1)
+        >>> [bool(bit) for bit in f.get_bits_batch([1, 2, 4, 9, 0])]
+        [False, True, True, False, False]
+        >>>
+
+        :param nums: Порядковые номера битов.
+        :return: Состояния битов в том же порядке, что и номера.
+        :raises TypeError: Проверяемые биты должны быть указаны как неотрицательные порядковые
+                          номера битов в битовой последовательности.
+        """
+        error = ("Проверяемые биты должны быть указаны как неотрицательные порядковые "
+                 "номера битов в битовой последовательности.")
+        number_of_bits = self.__number_of_bits
+        data = self.__storage.get_bytes(number_of_bits)
+        if np is not None:
+            indexes = np.asarray(nums)
+            if indexes.size and (indexes.dtype.kind not in 'iu' or indexes.min() < 0):
+                raise TypeError(error)
+            indexes = indexes.astype(np.int64, copy=False).ravel() - 1
+            valid = (indexes >= 0) & (indexes < number_of_bits)
+            result = np.zeros(indexes.size, dtype=np.bool_)
+            indexes = indexes[valid]
+            packed = np.frombuffer(data, dtype=np.uint8)
+            result[valid] = (packed[indexes >> 3] >> (indexes & 7).astype(np.uint8)) & 1
+            return result
+        result = []
+        for num in nums:
+            if not _validate_not_negative_int(num):
+                raise TypeError(error)
+            num -= 1
+            result.append(0 <= num < number_of_bits and data[num >> 3] >> (num & 7) & 1 == 1)
+        return result
+
+    def __pack_batch(self, nums, error: str) -> int:
+        """
+        Собирает битовую маску из массива порядковых номеров битов.
+        :param nums: Порядковые номера битов.
+        :param error: Сообщение исключения для отрицательных номеров.
+        :return:
+        """
+        if np is not None:
+            indexes = np.asarray(nums)
+            if indexes.size and (indexes.dtype.kind not in 'iu' or indexes.min() < 0):
+                raise TypeError(error)
+            return _pack_bit_numbers_array(indexes)
+        nums = tuple(nums)
+        if not all(_validate_not_negative_int(num) for num in nums):
+            raise TypeError(error)
+        return _pack_bit_numbers([num for num in nums if num])
 
     def inverse_bit(self, num_bit: int):
         """
@@ -372,16 +1373,16 @@ class Flags:
         :param num_bit: Порядковый номер бита в битовой последоваетельнсоти, который нужно
                        переключить в противоположенное состояние.
         """
-        if not self.__validate_not_negative_int(num_bit):
+        if not _validate_not_negative_int(num_bit):
             raise TypeError("Переключаемый бит должен быть указан как неотрицательный порядковый "
                             "номер бита в битовой последовательности.")
 
-        # Если передали 0, то ничего делать не надо.
-        if num_bit == 0:
+        # Если передали 0 или бит за пределами флагов в строгом режиме, то ничего делать не надо.
+        if num_bit == 0 or self.__out_of_range(num_bit):
             return
 
-        bit_mask = (num_bit,)
-        self.inverse_bits(bit_mask)
+        self.__index = None
+        self.__storage.flip(num_bit - 1)
 
     def inverse_bits(self, bit_mask: str | list[int] | tuple[int, ...] | set | int):
         """
@@ -400,28 +1401,9 @@ class Flags:
                         или целого неотрицательного числа.
         """
         # Для начала преобразуем переданную битовую маску для инверсии.
-        bit_mask = self.__convert_bit_mask(bit_mask)
-        self.__bits ^= bit_mask
-
-    def __convert_bit_mask(self, bit_mask: str | list[int] | tuple[int, ...] | set | int):
-        """
-        Конвертирует битовую маску в зависимости от того, в каком виде она была передана.
-        :param bit_mask: Битовая маска.
-        :return:
-        :raises TypeError: Битовая маска не может быть отрицательной. |
-                            Недопустимый тип битовой маски.
-        """
-        # Для начала преобразуем переданную битовую маску для проверки.
-        if isinstance(bit_mask, str):
-            bit_mask = self.util_convert_str_to_bit_mask(bit_mask)
-        elif isinstance(bit_mask, (list, tuple, set)):
-            bit_mask = self.util_convert_list_num_to_bit_mask(bit_mask)
-        elif isinstance(bit_mask, int):
-            if bit_mask < 0:
-                raise TypeError("Битовая маска не может быть отрицательной.")
-        else:
-            raise TypeError("Недопустимый тип битовой маски.")
-        return bit_mask
+        bit_mask = self.__fit(_convert_bit_mask(bit_mask))
+        self.__index = None
+        self.__storage.ixor(bit_mask)
 
     @staticmethod
     def util_convert_str_to_bit_mask(str_: str):
@@ -438,15 +1420,11 @@ class Flags:
         :return:
         :raises TypeError: Биты могут иметь значения только 1 или 0.
         """
-        list_num = []
-        i = 1
-        for char in str_:
-            if char == '1':
-                list_num.append(i)
-            elif char != '0':
-                raise TypeError("Биты могут иметь значения только 1 или 0.")
-            i += 1
-        return Flags.util_convert_list_num_to_bit_mask(list_num)
+        # Если после удаления единиц и нулей что-то осталось, значит в строке есть другие символы.
+        if str_.translate(_BIT_CHARS_TABLE):
+            raise TypeError("Биты могут иметь значения только 1 или 0.")
+        # Первый символ строки - младший бит, поэтому переворачиваем строку перед разбором.
+        return int(str_[::-1], 2) if str_ else 0
 
     @staticmethod
     def util_convert_list_num_to_bit_mask(list_num: list[int] | tuple[int, ...]):
@@ -461,14 +1439,9 @@ class Flags:
 
         :param list_num: Список порядковых чисел.
         :return:
+        :raises ValueError: Порядковый номер бита должен быть больше нуля.
         """
-        num_bit = 0
-
-        # Пробежимся по всему списку
-        for num in list_num:
-            # и установим каждый бит по указанному порядковому номеру
-            num_bit |= 1 << num - 1
-        return num_bit
+        return _pack_bit_numbers(list_num)
 
     @classmethod
     def util_int_to_bitstring(cls, val: int):
@@ -485,60 +1458,118 @@ class Flags:
         :raises TypeError: Значение должно быть целым неотрицательным числом.
         """
         # Для начала проверим, что было передано неотрицательное целое число.
-        if not cls.__validate_not_negative_int(val):
+        if not _validate_not_negative_int(val):
             raise TypeError("Значение должно быть целым неотрицательным числом.")
-        # Если передали ноль,
-        if val == 0:
-            # то и вернем ноль.
-            return "0"
-        num = 0
-        str_bits = ""
-        # Иначе будем проходить до тех пор, пока не найдем сколько бит потребуется
-        # для формирования переданного числа.
-        while True:
-            if val < (1 << num):
-                break
-            num += 1
-        # Теперь пройдемся по каждому биту,
-        for bit in range(0, num):
-            # и если этот бит в числе установлен, то укажим его как 1, иначе 0
-            str_bits += "1" if (val & (1 << bit)) else "0"
-        return str_bits
+        # bin() выдает биты от старшего к младшему без ведущих нулей (для нуля - "0b0"),
+        # поэтому достаточно отрезать префикс и перевернуть строку.
+        return bin(val)[:1:-1]
+
+    def __copy(self):
+        """
+        Возвращает копию флагов с тем же способом хранения.
+        :return:
+        """
+        return Flags.__from_storage(self.__number_of_bits, self.__storage.copy(), self.__overflow)
 
     @staticmethod
-    def __convert_val_to_bool(val: bool | int):
+    def __from_storage(number_of_bits: int, storage, overflow: Overflow = Overflow.UNCHECKED):
+        """
+        Создает флаги поверх готового хранилища без проверок конструктора.
+        Только для результатов операций, в которых количество бит и хранилище уже проверены.
+        :param number_of_bits: Количество бит.
+        :param storage: Хранилище битов, которое переходит во владение новых флагов.
+        :param overflow: Режим обработки битов за пределами количества бит.
+        :return:
         """
-        Преобразует 1 и 0 в логический тип, или возвращает значение,
-        если переданное значение уже логическое.
+        flags = object.__new__(Flags)
+        flags.__number_of_bits = number_of_bits
+        flags.__storage = storage
+        flags.__index = None
+        flags.__overflow = overflow
+        return flags
 
-        :param val:
+    @staticmethod
+    def reduce_and(flags_list):
+        """
+        Возвращает побитовое И всех флагов за один проход, без промежуточных флагов.
+        Количество бит и способ хранения берутся от первых флагов.
+
+        >>> Flags.reduce_and(Flags(4, Param.PARAM_BITS, bits) for bits in ('1110', '0111', '1111'))
+        Flags(4, 1, '0110')
+        >>>
+
+        :param flags_list: Флаги.
         :return:
-        :raises TypeError: Значение может быть только логическое, либо 1 или 0.
+        :raises TypeError: Нельзя свернуть пустую последовательность флагов.
         """
-        if isinstance(val, bool):
-            return val
-        elif val in (0, 1):
-            return True if val == 1 else False
-        else:
-            raise TypeError("Значение может быть только логическое, либо 1 или 0.")
+        return Flags.__reduce(flags_list, 'iand')
+
+    @staticmethod
+    def reduce_or(flags_list):
+        """
+        Возвращает побитовое ИЛИ всех флагов за один проход, без промежуточных флагов.
+        Количество бит и способ хранения берутся от первых флагов.
+
+        >>> Flags.reduce_or([Flags(4, Param.PARAM_BITS, '1'), Flags(4, Param.PARAM_BITS, '0001')])
+        Flags(4, 1, '1001')
+        >>>
+
+        :param flags_list: Флаги.
+        :return:
+        :raises TypeError: Нельзя свернуть пустую последовательность флагов.
+        """
+        return Flags.__reduce(flags_list, 'ior')
 
     @staticmethod
-    def __validate_not_negative_int(num: int) -> bool:
+    def __reduce(flags_list, operation: str):
         """
-        Проверяет значение на целое неотрицательное число.
-        :param num:
+        Сворачивает флаги операцией хранилища, накапливая результат в одном хранилище.
+        :param flags_list: Флаги.
+        :param operation: Имя операции хранилища на месте.
         :return:
         """
-        return False if (not isinstance(num, int) or num < 0) else True
+        flags_list = iter(flags_list)
+        first = next(flags_list, None)
+        if first is None:
+            raise TypeError("Нельзя свернуть пустую последовательность флагов.")
+        result = first.__copy()
+        apply = getattr(result.__storage, operation)
+        for flags in flags_list:
+            apply(result.__operand(flags))
+        return result
+
+    def __operand(self, other):
+        """
+        Возвращает биты другого набора флагов в виде, который принимает хранилище этого набора:
+        разреженное хранилище принимает другое разреженное хранилище напрямую, остальное - целое число.
+        В строгом режиме количество бит сравнивается один раз на операцию: Overflow.REJECT не допускает
+        флаги разной ширины, Overflow.TRUNCATE отбрасывает биты более широкого операнда.
+        :param other:
+        :type other: Flags
+        :return:
+        :raises ValueError: Количество бит флагов различается.
+        """
+        storage = other.__storage
+        if other.__number_of_bits != self.__number_of_bits and self.__overflow != Overflow.UNCHECKED:
+            if self.__overflow == Overflow.REJECT:
+                raise ValueError(f"Количество бит флагов различается: {self.__number_of_bits} "
+                                 f"и {other.__number_of_bits}.")
+            if other.__number_of_bits > self.__number_of_bits:
+                return storage.to_int() & _full_mask(self.__number_of_bits)
+        if type(storage) is _SparseBits and type(self.__storage) is _SparseBits:
+            return storage
+        return storage.to_int()
 
     def __str__(self):
         return self.__get_to_str()
 
     def __int__(self):
-        return self.__bits
+        return self.__storage.to_int()
 
     def __repr__(self):
-        return f"Flags({self.number_of_bits}, {Param.PARAM_BITS}, '{self.str_bits}')"
+        if self.backend == Backend.INT:
+            return f"Flags({self.number_of_bits}, {Param.PARAM_BITS}, '{self.str_bits}')"
+        return f"Flags({self.number_of_bits}, {Param.PARAM_BITS}, '{self.str_bits}', {self.backend})"
 
     def __eq__(self, other):
         """
@@ -548,7 +1579,7 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return self.__bits == other.__bits
+        return self.__storage.to_int() == other.__storage.to_int()
 
     def __lt__(self, other):
         """
@@ -558,7 +1589,7 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return self.__bits < other.__bits
+        return self.__storage.to_int() < other.__storage.to_int()
 
     def __le__(self, other):
         """
@@ -568,7 +1599,7 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return self.__bits <= other.__bits
+        return self.__storage.to_int() <= other.__storage.to_int()
 
     def __and__(self, other):
         """
@@ -578,7 +1609,9 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits & other.__bits)
+        result = self.__copy()
+        result.__storage.iand(self.__operand(other))
+        return result
 
     def __iand__(self, other):
         """
@@ -588,7 +1621,8 @@ class Flags:
         @type other: Flags
         @return:
         """
-        self.__bits &= other.__bits
+        self.__index = None
+        self.__storage.iand(self.__operand(other))
         return self
 
     def __or__(self, other):
@@ -599,7 +1633,9 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits | other.__bits)
+        result = self.__copy()
+        result.__storage.ior(self.__operand(other))
+        return result
 
     def __ior__(self, other):
         """
@@ -609,7 +1645,8 @@ class Flags:
         @type other: Flags
         @return:
         """
-        self.__bits |= other.__bits
+        self.__index = None
+        self.__storage.ior(self.__operand(other))
         return self
 
     def __xor__(self, other):
@@ -620,7 +1657,9 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits ^ other.__bits)
+        result = self.__copy()
+        result.__storage.ixor(self.__operand(other))
+        return result
 
     def __ixor__(self, other):
         """
@@ -630,7 +1669,8 @@ class Flags:
         @type other: Flags
         @return:
         """
-        self.__bits ^= other.__bits
+        self.__index = None
+        self.__storage.ixor(self.__operand(other))
         return self
 
     def __invert__(self):
@@ -639,7 +1679,9 @@ class Flags:
 
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits ^ self.__get_all_bits())
+        result = self.__copy()
+        result.__storage.invert(self.__number_of_bits)
+        return result
 
     def __add__(self, other):
         """
@@ -649,7 +1691,9 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits | other.__bits)
+        result = self.__copy()
+        result.__storage.ior(self.__operand(other))
+        return result
 
     def __iadd__(self, other):
         """
@@ -659,7 +1703,8 @@ class Flags:
         @type other: Flags
         @return:
         """
-        self.__bits |= other.__bits
+        self.__index = None
+        self.__storage.ior(self.__operand(other))
         return self
 
     def __sub__(self, other):
@@ -670,7 +1715,9 @@ class Flags:
         @type other: Flags
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits ^ other.__bits)
+        result = self.__copy()
+        result.__storage.ixor(self.__operand(other))
+        return result
 
     def __isub__(self, other):
         """
@@ -680,7 +1727,8 @@ class Flags:
         @type other: Flags
         @return:
         """
-        self.__bits ^= other.__bits
+        self.__index = None
+        self.__storage.ixor(self.__operand(other))
         return self
 
     def __neg__(self):
@@ -689,16 +1737,640 @@ class Flags:
 
         @return:
         """
-        return Flags(self.number_of_bits, Param.PARAM_BITS, self.__bits ^ self.__get_all_bits())
+        result = self.__copy()
+        result.__storage.invert(self.__number_of_bits)
+        return result
 
     def __hash__(self):
-        return hash(self.__bits)
+        return hash(self.__storage.to_int())
 
     def __len__(self):
         return self.__number_of_bits
 
     def __bytes__(self):
-        return bytes(self.__bits)
+        return self.to_bytes()
+
+
+def _locked(method):
+    """ Оборачивает метод Flags так, чтобы он выполнялся под блокировкой экземпляра AtomicFlags. """
+    @wraps(method, assigned=('__module__', '__name__', '__qualname__'))
+    def wrapper(self, *args, **kwargs):
+        with self._AtomicFlags__lock:
+            return method(self, *args, **kwargs)
+    wrapper.__doc__ = f"Потокобезопасный вариант Flags.{method.__name__}."
+    return wrapper
+
+
+class AtomicFlags(Flags):
+    """
+    Битовые флаги, которые можно менять из нескольких потоков без потери изменений.
+    Каждая операция чтения-изменения-записи выполняется под блокировкой. По умолчанию у каждого экземпляра
+    своя блокировка, но можно передать общую (одну на все флаги или одну из набора блокировок).
+
+    >>> f = AtomicFlags(8)
+    >>> f.test_and_set(3)
+    False
+    >>> f.test_and_set(3)
+    True
+    >>> f.compare_and_swap('00100000', '11000000')
+    True
+    >>> f.compare_and_swap('00100000', '00000001')
+    False
+    >>> f.str_bits
+    '11000000'
+    """
+    __slots__ = ('__lock',)
+
+    def __init__(self, number: int = 1, param: Param = Param.PARAM_BITS,
+                 bit_mask: str | list[int] | tuple[int, ...] | set | int | None = None,
+                 backend: Backend = Backend.INT, overflow: Overflow = Overflow.UNCHECKED, *,
+                 lock: AbstractContextManager | None = None):
+        """
+        Инициализирует флаги битов.
+
+        :param number: Количество битов или байтов, в зависимости от значения параметра "param".
+        :param param: Единица измерения параметра "number".
+        :param bit_mask: Начальная битовая маска.
+        :param backend: Способ хранения битов.
+        :param overflow: Что делать с битами за пределами количества бит.
+        :param lock: Блокировка, под которой выполняются операции. Если не указана, создается своя.
+        """
+        self.__lock = Lock() if lock is None else lock
+        super().__init__(number, param, bit_mask, backend, overflow)
+
+    @property
+    def lock(self) -> AbstractContextManager:
+        """
+        Возвращает блокировку флагов, под которой можно выполнить несколько операций подряд.
+        Блокировка по умолчанию не реентерабельная, поэтому внутри нее вызывайте методы Flags напрямую.
+        :return:
+        """
+        return self.__lock
+
+    value = property(Flags.value.fget, _locked(Flags.value.fset))
+    get_bit = _locked(Flags.get_bit)
+    get_bits_batch = _locked(Flags.get_bits_batch)
+    set_bit = _locked(Flags.set_bit)
+    set_bits = _locked(Flags.set_bits)
+    set_bits_batch = _locked(Flags.set_bits_batch)
+    check_bit = _locked(Flags.check_bit)
+    check_bits = _locked(Flags.check_bits)
+    inverse_bit = _locked(Flags.inverse_bit)
+    inverse_bits = _locked(Flags.inverse_bits)
+    invert_all = _locked(Flags.invert_all)
+    count = _locked(Flags.count)
+    to_bytes = _locked(Flags.to_bytes)
+    __iand__ = _locked(Flags.__iand__)
+    __ior__ = _locked(Flags.__ior__)
+    __ixor__ = _locked(Flags.__ixor__)
+    __iadd__ = _locked(Flags.__iadd__)
+    __isub__ = _locked(Flags.__isub__)
+
+    def test_and_set(self, num_bit: int, val: bool | int = True) -> bool:
+        """
+        Атомарно устанавливает бит в состояние val и возвращает его прежнее состояние.
+
+        :param num_bit: Порядковый номер бита.
+        :param val: Логическое значение или 1 или 0.
+        :return: Прежнее состояние бита.
+        """
+        with self.__lock:
+            previous = Flags.get_bit(self, num_bit) == 1
+            Flags.set_bit(self, num_bit, val)
+            return previous
+
+    def compare_and_swap(self, expected: str | list[int] | tuple[int, ...] | set | int,
+                         new: str | list[int] | tuple[int, ...] | set | int) -> bool:
+        """
+        Атомарно заменяет все биты на new, если сейчас они равны expected.
+
+        :param expected: Ожидаемая битовая маска.
+        :param new: Новая битовая маска.
+        :return: Была ли произведена замена.
+        """
+        expected = _convert_bit_mask(expected)
+        new = _convert_bit_mask(new)
+        with self.__lock:
+            if self.int_bits != expected:
+                return False
+            Flags.value.fset(self, new)
+            return True
+
+
+class FlagsArray:
+    """
+    Массив записей битовых флагов одинаковой ширины в одном непрерывном буфере.
+    Каждая запись занимает целое число байт в формате Flags.to_bytes.
+    Проверка флагов по всем записям сразу (find_rows, count_rows) выполняется одним проходом
+    над всем буфером как над одним целым числом, без создания объекта Flags на каждую запись.
+
+    >>> rows = FlagsArray(4, 8)
+    >>> rows.set_bits(1, (2, 5), 1)
+    >>> rows.set_bits(3, (2, 5, 7), 1)
+    >>> rows.set_bit(2, 2, 1)
+    >>> rows.find_rows((2, 5), 1, Condition.ALL)
+    [1, 3]
+    >>> rows.count_rows((2, 5), 1, Condition.ANY)
+    3
+    >>> rows[3].str_bits
+    '01001010'
+    """
+    __slots__ = ('__number_of_bits', '__length', '__stride', '__buffer', '__high', '__low')
+
+    def __init__(self, length: int, number: int = 1, param: Param = Param.PARAM_BITS):
+        """
+        Создает массив нулевых записей флагов.
+
+        :param length: Количество записей.
+        :param number: Количество битов или байтов записи, в зависимости от значения параметра "param".
+        :param param: Единица измерения параметра "number".
+        :raises TypeError: Неправильное значение. Количество записей должно быть целым неотрицательным числом.
+        """
+        if not _validate_not_negative_int(length):
+            raise TypeError("Неправильное значение. Количество записей должно быть целым неотрицательным числом.")
+        if not (isinstance(number, int) and number > 0):
+            raise TypeError("Неправильное значение. Количество {0} должно быть целым положительным числом.".
+                            format("битов" if param == Param.PARAM_BITS else "байтов"))
+        if param not in (1, 2):
+            raise TypeError("Неправильное значение. Значение должно быть Param.PARAM_BYTE(1) или Param.PARAM_BYTES(2).")
+        self.__number_of_bits = number * 8 if param == Param.PARAM_BYTES else number
+        self.__length = length
+        self.__stride = (self.__number_of_bits + 7) >> 3
+        self.__buffer = bytearray(self.__stride * length)
+        # Маски старших и остальных бит каждой записи для поиска ненулевых записей, строятся по требованию.
+        self.__high = None
+        self.__low = None
+
+    @classmethod
+    def from_flags(cls, flags_list):
+        """
+        Упаковывает последовательность флагов одинаковой ширины в массив.
+
+        >>> rows = FlagsArray.from_flags([Flags(4, Param.PARAM_BITS, '1001'), Flags(4, Param.PARAM_BITS, '0110')])
+        >>> len(rows), rows.number_of_bits, rows[1].str_bits
+        (2, 4, '0110')
+        >>>
+
+        :param flags_list: Флаги.
+        :return:
+        :raises TypeError: Все флаги должны иметь одинаковое количество бит.
+        """
+        flags_list = list(flags_list)
+        if not flags_list:
+            raise TypeError("Нельзя определить количество бит по пустой последовательности флагов.")
+        number_of_bits = flags_list[0].number_of_bits
+        if any(flags.number_of_bits != number_of_bits for flags in flags_list):
+            raise TypeError("Все флаги должны иметь одинаковое количество бит.")
+        rows = cls(0, number_of_bits)
+        rows.__length = len(flags_list)
+        rows.__buffer = bytearray(b''.join(flags.to_bytes() for flags in flags_list))
+        return rows
+
+    @classmethod
+    def from_bytes(cls, data: bytes | bytearray | memoryview, number: int = 1, param: Param = Param.PARAM_BITS):
+        """
+        Создает массив из байтов всех записей подряд (см. buffer), данные копируются.
+
+        >>> rows = FlagsArray.from_bytes(b'\\x01\\x03', 8)
+        >>> len(rows), rows[1].str_bits
+        (2, '11000000')
+        >>>
+
+        :param data: Байты записей.
+        :param number: Количество битов или байтов записи, в зависимости от значения параметра "param".
+        :param param: Единица измерения параметра "number".
+        :return:
+        :raises ValueError: Длина данных должна быть кратна длине записи.
+        """
+        rows = cls(0, number, param)
+        data = bytearray(data)
+        if len(data) % rows.__stride:
+            raise ValueError(f"Длина данных должна быть кратна {rows.__stride} байт(ам), передано {len(data)}.")
+        rows.__length = len(data) // rows.__stride
+        rows.__buffer = data
+        return rows
+
+    @property
+    def number_of_bits(self) -> int:
+        """
+        Возвращает количество бит в записи.
+        :return:
+        """
+        return self.__number_of_bits
+
+    @property
+    def buffer(self) -> bytearray:
+        """
+        Возвращает буфер всех записей подряд.
+        :return:
+        """
+        return self.__buffer
+
+    def __len__(self):
+        return self.__length
+
+    def __row(self, row: int) -> int:
+        """
+        Проверяет номер записи и возвращает смещение записи в буфере.
+        :raises IndexError: Номер записи вне массива.
+        """
+        if not isinstance(row, int):
+            raise TypeError("Номер записи должен быть целым числом.")
+        if row < 0:
+            row += self.__length
+        if not 0 <= row < self.__length:
+            raise IndexError("Номер записи вне массива.")
+        return row * self.__stride
+
+    def __getitem__(self, row: int) -> Flags:
+        """
+        Возвращает запись в виде флагов поверх буфера массива, изменения флагов сразу попадают в массив.
+        """
+        offset = self.__row(row)
+        return Flags.from_buffer(memoryview(self.__buffer)[offset:offset + self.__stride], self.__number_of_bits)
+
+    def __setitem__(self, row: int, bit_mask: Flags | str | list[int] | tuple[int, ...] | set | int):
+        """
+        Заменяет запись флагами или битовой маской.
+        """
+        offset = self.__row(row)
+        bit_mask = bit_mask.int_bits if isinstance(bit_mask, Flags) else _convert_bit_mask(bit_mask)
+        bit_mask &= _full_mask(self.__number_of_bits)
+        self.__buffer[offset:offset + self.__stride] = bit_mask.to_bytes(self.__stride, 'little')
+
+    def get_bit(self, row: int, num: int) -> int:
+        """
+        Возвращает состояние указанного бита записи.
+
+        :param row: Номер записи.
+        :param num: Порядковый номер бита.
+        :return: Один или ноль.
+        """
+        offset = self.__row(row)
+        if not _validate_not_negative_int(num):
+            raise TypeError("Проверяемый бит должен быть указан как неотрицательный порядковый "
+                            "номер бита в битовой последовательности.")
+        if num == 0 or num > self.__number_of_bits:
+            return 0
+        num -= 1
+        return self.__buffer[offset + (num >> 3)] >> (num & 7) & 1
+
+    def set_bit(self, row: int, num: int, val: bool | int):
+        """
+        Устанавливает указанный бит записи.
+
+        :param row: Номер записи.
+        :param num: Порядковый номер бита.
+        :param val: Логическое значение или 1 или 0.
+        """
+        offset = self.__row(row)
+        if not _validate_not_negative_int(num):
+            raise TypeError("Изменяемый бит должен быть указан как неотрицательный порядковый "
+                            "номер бита в битовой последовательности.")
+        val = _convert_val_to_bool(val)
+        if num == 0 or num > self.__number_of_bits:
+            return
+        num -= 1
+        if val:
+            self.__buffer[offset + (num >> 3)] |= 1 << (num & 7)
+        else:
+            self.__buffer[offset + (num >> 3)] &= 0xFF ^ (1 << (num & 7))
+
+    def set_bits(self, row: int, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int):
+        """
+        Устанавливает биты записи в соответствии битовой маске.
+
+        :param row: Номер записи.
+        :param bit_mask: Битовая маска.
+        :param val: Логическое значение или 1 или 0.
+        """
+        offset = self.__row(row)
+        bit_mask = _convert_bit_mask(bit_mask) & _full_mask(self.__number_of_bits)
+        end = offset + self.__stride
+        value = int.from_bytes(self.__buffer[offset:end], 'little')
+        value = value | bit_mask if _convert_val_to_bool(val) else value & ~bit_mask
+        self.__buffer[offset:end] = value.to_bytes(self.__stride, 'little')
+
+    def check_bits(self, row: int, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int,
+                   condition: Condition = Condition.ALL) -> bool:
+        """
+        Проверяет одну запись на соответствие битовой маске, так же как Flags.check_bits.
+
+        :param row: Номер записи.
+        :param bit_mask: Битовая маска.
+        :param val: Логическое значение или 1 или 0.
+        :param condition: Условие проверки, все биты, или любый из битов.
+        :return:
+        """
+        return self[row].check_bits(bit_mask, val, condition)
+
+    def find_rows(self, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int,
+                  condition: Condition = Condition.ALL) -> list[int]:
+        """
+        Возвращает номера записей, которые соответствуют битовой маске (как Flags.check_bits).
+        Все записи проверяются за один проход.
+
+        :param bit_mask: Битовая маска.
+        :param val: Логическое значение или 1 или 0.
+        :param condition: Условие проверки, все биты, или любый из битов.
+        :return: Номера записей по возрастанию.
+        """
+        return self._rows_of(self._match_rows(bit_mask, val, condition))
+
+    def count_rows(self, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int,
+                   condition: Condition = Condition.ALL) -> int:
+        """
+        Возвращает количество записей, которые соответствуют битовой маске (как Flags.check_bits).
+        Все записи проверяются за один проход.
+
+        :param bit_mask: Битовая маска.
+        :param val: Логическое значение или 1 или 0.
+        :param condition: Условие проверки, все биты, или любый из битов.
+        :return:
+        """
+        return self._match_rows(bit_mask, val, condition).bit_count()
+
+    def _repeat(self, value: int) -> int:
+        """ Повторяет значение ширины одной записи для всех записей массива. """
+        return int.from_bytes(value.to_bytes(self.__stride, 'little') * self.__length, 'little')
+
+    def _all_rows(self) -> int:
+        """ Возвращает множество совпадений, в котором отмечены все записи. """
+        if self.__high is None:
+            high_bit = 1 << ((self.__stride << 3) - 1)
+            self.__high = self._repeat(high_bit)
+            self.__low = self._repeat(high_bit - 1)
+        return self.__high
+
+    def _nonzero_rows(self, value: int) -> int:
+        """
+        Отмечает старшим битом записи все ненулевые записи значения, выровненного как буфер:
+        младшие биты каждой записи складываются с единицами без переноса в соседнюю запись,
+        и перенос в старший бит появляется, только если среди них был установленный бит.
+        """
+        high = self._all_rows()
+        low = self.__low
+        return (((value & low) + low) | value) & high
+
+    def _match_rows(self, bit_mask, val: bool | int, condition: Condition = Condition.ALL,
+                    data: int | None = None) -> int:
+        """
+        Проверяет все записи на соответствие битовой маске.
+        Возвращает целое число, в котором у каждой подходящей записи установлен ее старший бит.
+        :param data: Буфер массива в виде целого числа, если он уже был прочитан.
+        """
+        if condition not in (Condition.ALL, Condition.ANY):
+            raise TypeError("Условие может быть только Condition.ANY (1) или Condition.ALL (2).")
+        bit_mask = _convert_bit_mask(bit_mask)
+        val = _convert_val_to_bool(val)
+        all_rows = self._all_rows()
+        # Биты за пределами записи всегда сброшены.
+        if bit_mask >> self.__number_of_bits:
+            if val and condition == Condition.ALL:
+                return 0
+            if not val and condition == Condition.ANY:
+                return all_rows
+            bit_mask &= _full_mask(self.__number_of_bits)
+        if data is None:
+            data = int.from_bytes(self.__buffer, 'little')
+        masks = self._repeat(bit_mask)
+        selected = data & masks
+        # Для всех установленных и для любого сброшенного бита сравниваем выбранные биты с маской.
+        if val == (condition == Condition.ALL):
+            selected ^= masks
+        nonzero = self._nonzero_rows(selected)
+        # Любой установленный и любой сброшенный - это ненулевая разница, остальное - нулевая.
+        return nonzero if condition == Condition.ANY else all_rows ^ nonzero
+
+    def _rows_of(self, matches: int) -> list[int]:
+        """ Преобразует множество совпадений в номера записей. """
+        if np is not None and self.__length:
+            # Старший бит записи - старший бит ее последнего байта.
+            data = np.frombuffer(matches.to_bytes(self.__stride * self.__length, 'little'), dtype=np.uint8)
+            return np.flatnonzero(data[self.__stride - 1::self.__stride] & 0x80).tolist()
+        stride_bits = self.__stride << 3
+        return [(num - 1) // stride_bits for num in
+                _iter_set_bits(matches.to_bytes(self.__stride * self.__length, 'little'))]
+
+
+class Query:
+    """
+    Логическое выражение над проверками битовых масок (как Flags.check_bits) для поиска
+    подходящих записей среди множества флагов. Проверки объединяются операторами & (и), | (или), ~ (не).
+    Все записи упаковываются в FlagsArray и каждая проверка выражения выполняется за один проход
+    над всеми записями сразу. Для очень больших наборов записи можно разделить между процессами.
+
+    >>> records = [Flags(8, Param.PARAM_BITS, bits) for bits in ('11000000', '01001000', '11001000', '00000001')]
+    >>> query = Query('11', 1, Condition.ALL) & Query('00001001', 0, Condition.ANY)
+    >>> query.find(records)
+    [0, 2]
+    >>> (query | Query((8,))).count(records)
+    3
+    >>> (~query).find(records)
+    [1, 3]
+    """
+    __slots__ = ('__operator', '__operands')
+
+    def __init__(self, bit_mask: str | list[int] | tuple[int, ...] | set | int, val: bool | int = 1,
+                 condition: Condition = Condition.ALL):
+        """
+        Создает проверку битовой маски.
+
+        :param bit_mask: Битовая маска указанная в виде строки битов, последовательности порядковых чисел,
+                        или целого неотрицательного числа.
+        :param val: Логическое значение или 1 или 0, на которое надо проверить указанные в битовой маске биты.
+        :param condition: Условие проверки, все биты, или любый из битов.
+        :raises TypeError: Условие может быть только Condition.ANY (1) или Condition.ALL (2).
+        """
+        if condition not in (Condition.ALL, Condition.ANY):
+            raise TypeError("Условие может быть только Condition.ANY (1) или Condition.ALL (2).")
+        self.__operator = 'bits'
+        self.__operands = (Mask(bit_mask), _convert_val_to_bool(val), Condition(condition))
+
+    @classmethod
+    def __node(cls, operator: str, operands: tuple):
+        query = cls.__new__(cls)
+        query.__operator = operator
+        query.__operands = operands
+        return query
+
+    def __and__(self, other):
+        return Query.__node('and', (self, other))
+
+    def __or__(self, other):
+        return Query.__node('or', (self, other))
+
+    def __invert__(self):
+        return Query.__node('not', (self,))
+
+    def __repr__(self):
+        if self.__operator == 'bits':
+            bit_mask, val, condition = self.__operands
+            return f"Query({bit_mask!r}, {int(val)}, {condition})"
+        if self.__operator == 'not':
+            return f"~{self.__operands[0]!r}"
+        return f"({self.__operands[0]!r} {'&' if self.__operator == 'and' else '|'} {self.__operands[1]!r})"
+
+    def _match(self, rows: FlagsArray, data: int) -> int:
+        """
+        Вычисляет выражение для всех записей массива.
+        Возвращает множество совпадений в формате FlagsArray._match_rows.
+        :param data: Буфер массива в виде целого числа.
+        """
+        if self.__operator == 'bits':
+            return rows._match_rows(*self.__operands, data=data)
+        if self.__operator == 'not':
+            return rows._all_rows() ^ self.__operands[0]._match(rows, data)
+        left, right = self.__operands
+        if self.__operator == 'and':
+            return left._match(rows, data) & right._match(rows, data)
+        return left._match(rows, data) | right._match(rows, data)
+
+    def find(self, flags_list: FlagsArray | list[Flags], processes: int | None = None) -> list[int]:
+        """
+        Возвращает номера записей, для которых выражение истинно.
+
+        :param flags_list: Массив флагов или последовательность флагов одинаковой ширины.
+        :param processes: Количество процессов, между которыми делятся записи. Если не указано, то в текущем.
+        :return: Номера записей по возрастанию.
+        """
+        return self.__run(flags_list, processes, count_only=False)
+
+    def count(self, flags_list: FlagsArray | list[Flags], processes: int | None = None) -> int:
+        """
+        Возвращает количество записей, для которых выражение истинно.
+
+        :param flags_list: Массив флагов или последовательность флагов одинаковой ширины.
+        :param processes: Количество процессов, между которыми делятся записи. Если не указано, то в текущем.
+        :return:
+        """
+        return self.__run(flags_list, processes, count_only=True)
+
+    def __run(self, flags_list: FlagsArray | list[Flags], processes: int | None, count_only: bool):
+        # Для пустого набора ширина записей неизвестна, и ни массив, ни процессы не нужны.
+        if not len(flags_list):
+            return 0 if count_only else []
+        rows = flags_list if isinstance(flags_list, FlagsArray) else FlagsArray.from_flags(flags_list)
+        if not processes or processes < 2 or len(rows) < 2:
+            return _query_rows(rows, self, count_only)
+        # Каждый процесс получает свою непрерывную часть буфера.
+        stride = (rows.number_of_bits + 7) >> 3
+        step = -(-len(rows) // processes)
+        starts = range(0, len(rows), step)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_query_shard, bytes(rows.buffer[start * stride:(start + step) * stride]),
+                                       rows.number_of_bits, self, count_only) for start in starts]
+            results = [future.result() for future in futures]
+        if count_only:
+            return sum(results)
+        return [start + row for start, shard in zip(starts, results) for row in shard]
+
+
+def _query_rows(rows: FlagsArray, query: Query, count_only: bool):
+    """ Выполняет запрос над массивом флагов. """
+    matches = query._match(rows, int.from_bytes(rows.buffer, 'little'))
+    return matches.bit_count() if count_only else rows._rows_of(matches)
+
+
+def _query_shard(data: bytes, number_of_bits: int, query: Query, count_only: bool):
+    """ Выполняет запрос над частью массива флагов в отдельном процессе. """
+    return _query_rows(FlagsArray.from_bytes(data, number_of_bits), query, count_only)
+
+
+def _convert_bit_mask(bit_mask: str | list[int] | tuple[int, ...] | set | int):
+    """
+    Конвертирует битовую маску в зависимости от того, в каком виде она была передана.
+    :param bit_mask: Битовая маска.
+    :return:
+    :raises TypeError: Битовая маска не может быть отрицательной. |
+                        Недопустимый тип битовой маски.
+    """
+    # Заранее разобранная маска уже проверена.
+    if type(bit_mask) is Mask:
+        return bit_mask
+    # Для начала преобразуем переданную битовую маску для проверки.
+    if isinstance(bit_mask, str):
+        bit_mask = _compile_bit_mask(bit_mask) if len(bit_mask) <= _COMPILED_MASK_BITS \
+            else Flags.util_convert_str_to_bit_mask(bit_mask)
+    elif isinstance(bit_mask, tuple):
+        bit_mask = _compile_bit_mask(bit_mask) if _is_small_nums(bit_mask) \
+            else Flags.util_convert_list_num_to_bit_mask(bit_mask)
+    elif isinstance(bit_mask, (list, set)):
+        bit_mask = Flags.util_convert_list_num_to_bit_mask(bit_mask)
+    elif isinstance(bit_mask, int):
+        if bit_mask < 0:
+            raise TypeError("Битовая маска не может быть отрицательной.")
+    else:
+        raise TypeError("Недопустимый тип битовой маски.")
+    return bit_mask
+
+
+def _fit_bit_mask(bit_mask: int, number_of_bits: int, overflow: Overflow) -> int:
+    """
+    Приводит битовую маску к количеству бит: в режиме Overflow.TRUNCATE лишние биты отбрасываются,
+    в режиме Overflow.REJECT выбрасывается исключение. В режиме Overflow.UNCHECKED маска не меняется.
+    :raises ValueError: Битовая маска выходит за пределы N бит.
+    """
+    if bit_mask.bit_length() <= number_of_bits or overflow == Overflow.UNCHECKED:
+        return bit_mask
+    if overflow == Overflow.REJECT:
+        raise ValueError(f"Битовая маска выходит за пределы {number_of_bits} бит.")
+    return bit_mask & _full_mask(number_of_bits)
+
+
+# Наибольшее количество бит маски, которая разбирается через кэш. Большие маски разбираются каждый раз,
+# чтобы кэш не удерживал их до конца работы процесса: так он занимает не больше нескольких мегабайт.
+_COMPILED_MASK_BITS = 4096
+# Наибольшее количество номеров бит в маске-кортеже, которая разбирается через кэш.
+_COMPILED_MASK_NUMS = 256
+
+
+def _is_small_nums(nums: tuple) -> bool:
+    """ Проверяет, что маска-кортеж достаточно мала для кэша разобранных масок. """
+    if len(nums) > _COMPILED_MASK_NUMS:
+        return False
+    try:
+        return max(nums, default=0) <= _COMPILED_MASK_BITS
+    except TypeError:
+        # Номера неправильного типа, ошибку сообщит разбор маски без кэша.
+        return False
+
+
+@lru_cache(maxsize=1024)
+def _compile_bit_mask(bit_mask: str | tuple[int, ...]) -> int:
+    """
+    Разбирает битовую маску, переданную строкой или кортежем.
+    Повторяющиеся маски-литералы разбираются один раз. Вызывается только для масок не шире _COMPILED_MASK_BITS бит.
+    """
+    if isinstance(bit_mask, str):
+        return Flags.util_convert_str_to_bit_mask(bit_mask)
+    return Flags.util_convert_list_num_to_bit_mask(bit_mask)
+
+
+def _convert_val_to_bool(val: bool | int):
+    """
+    Преобразует 1 и 0 в логический тип, или возвращает значение,
+    если переданное значение уже логическое.
+
+    :param val:
+    :return:
+    :raises TypeError: Значение может быть только логическое, либо 1 или 0.
+    """
+    if isinstance(val, bool):
+        return val
+    elif val in (0, 1):
+        return True if val == 1 else False
+    else:
+        raise TypeError("Значение может быть только логическое, либо 1 или 0.")
+
+
+def _validate_not_negative_int(num: int) -> bool:
+    """
+    Проверяет значение на целое неотрицательное число.
+    :param num:
+    :return:
+    """
+    return False if (not isinstance(num, int) or num < 0) else True
 
 
 if __name__ == "__main__":
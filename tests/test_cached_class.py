@@ -1,6 +1,16 @@
+import asyncio
+import gc
+import logging
+import os
+import threading
+import time
+import weakref
+
 import pytest
 
-from helper.cached_class import CachedReader, cached_reader
+from helper import cached_class
+from helper.cached_class import (CacheMetrics, CachedReader, CacheScope, EvictionPolicy, MemoryCache, MmapCache,
+                                 SqliteCache, cached_reader, collect_stats, configure_global_cache)
 
 
 class MyClass(CachedReader):
@@ -165,3 +175,737 @@ def test_cache_reader_class(capsys):
     assert z3 == z2
     assert captured.out == ""
 
+
+@pytest.mark.parametrize('policy, evicted', [
+    (EvictionPolicy.LRU, 'b'),
+    (EvictionPolicy.LFU, 'c'),
+    (EvictionPolicy.FIFO, 'a'),
+])
+def test_memory_cache_eviction(policy, evicted):
+    cache = MemoryCache(max_entries=3, policy=policy)
+    cache['a'], cache['b'], cache['c'] = 1, 2, 3
+    # "b" читается дважды и раньше всех, "c" и "a" по одному разу.
+    assert [cache.get(key) for key in 'bbca'] == [2, 2, 3, 1]
+    cache['d'] = 4
+    assert evicted not in cache
+    assert len(cache) == 3
+    assert cache.get(evicted) is None
+    assert (cache.hits, cache.misses, cache.evictions) == (4, 1, 1)
+
+
+def test_memory_cache_max_bytes():
+    cache = MemoryCache(max_bytes=100, sizeof=len)
+    cache['a'] = 'x' * 60
+    cache['b'] = 'x' * 30
+    assert cache.total_bytes == 90
+    cache['c'] = 'x' * 30
+    assert 'a' not in cache and cache.total_bytes == 60
+    # Значение больше всего кэша не сохраняется.
+    cache['d'] = 'x' * 101
+    assert 'd' not in cache and len(cache) == 2
+    with pytest.raises(ValueError):
+        MemoryCache(max_entries=0)
+
+
+def test_cached_reader_bounded(capsys):
+    class Bounded(CachedReader):
+        @cached_reader
+        def value(self, a):
+            print(f'Calc {a}')
+            return a
+
+    reader = Bounded(max_entries=2)
+    for a in (1, 2, 1, 3, 1, 2):
+        assert reader.value(a) == a
+    # Ключ 2 вытеснен ключом 3 как дольше всех не читавшийся.
+    assert capsys.readouterr().out == "Calc 1\nCalc 2\nCalc 3\nCalc 2\n"
+    assert (reader._cache.hits, reader._cache.misses, reader._cache.evictions) == (2, 4, 2)
+
+
+def test_memory_cache_ttl():
+    now = [0.0]
+    cache = MemoryCache(ttl=10, stale_while_revalidate=5, clock=lambda: now[0])
+    cache['a'] = 1
+    cache.set('b', 2, stale_while_revalidate=0)
+    cache.set('c', 3, ttl=100)
+    now[0] = 12
+    # Устаревшее значение отдается только через lookup, а истекшее без запаса удаляется.
+    assert cache.get('a') is None
+    assert cache.lookup('a') == (1, True)
+    assert cache.get('b') is None and 'b' not in cache
+    assert cache.lookup('c') == (3, False)
+    now[0] = 15
+    cache.lookup('a')
+    assert 'a' not in cache and 'c' in cache
+
+
+def test_cached_reader_ttl(capsys):
+    now = [0.0]
+    refreshed = threading.Event()
+
+    class Expiring(CachedReader):
+        def __init__(self):
+            super().__init__(ttl=10)
+            self._cache._clock = lambda: now[0]
+            self.calls = 0
+
+        @cached_reader
+        def value(self):
+            self.calls += 1
+            print(f'Calc {self.calls}')
+            return self.calls
+
+        @cached_reader(ttl=5, stale_while_revalidate=60)
+        def revalidated(self):
+            self.calls += 1
+            refreshed.set()
+            return self.calls
+
+    reader = Expiring()
+    assert reader.value() == 1
+    now[0] = 9
+    assert reader.value() == 1
+    now[0] = 10
+    assert reader.value() == 2
+    assert capsys.readouterr().out == "Calc 1\nCalc 2\n"
+
+    assert reader.revalidated() == 3
+    refreshed.clear()
+    now[0] = 20
+    # Устаревшее значение возвращается сразу, а новое вычисляется в фоне.
+    assert reader.revalidated() == 3
+    assert refreshed.wait(5)
+    for _ in range(100):
+        if not reader._cache._flights:
+            break
+        threading.Event().wait(0.01)
+    assert reader.revalidated() == 4
+    with pytest.raises(ValueError):
+        cached_reader(ttl=-1)
+
+
+def test_cached_reader_method_ttl():
+    now = [0.0]
+
+    class Expiring(CachedReader):
+        def __init__(self):
+            super().__init__()
+            self._cache._clock = lambda: now[0]
+            self.calls = 0
+
+        def _compute(self, num):
+            self.calls += 1
+            return self.calls
+
+        def value(self, num):
+            return self._cached_reader(self._compute, num, _ttl=5)
+
+        def eternal(self, num):
+            return self._cached_reader(self._compute, num)
+
+    reader = Expiring()
+    assert (reader.value(1), reader.eternal(2)) == (1, 2)
+    now[0] = 4
+    assert (reader.value(1), reader.eternal(2)) == (1, 2)
+    # Время жизни, переданное методу, применяется к записи, а без него запись не истекает.
+    now[0] = 5
+    assert (reader.value(1), reader.eternal(2)) == (3, 2)
+    with pytest.raises(ValueError):
+        reader._cached_reader(reader._compute, 3, _ttl=-1)
+
+
+def test_cached_reader_tuple_keys(capsys):
+    class Keys(CachedReader):
+        @cached_reader
+        def value(self, *args, **kwargs):
+            print(f'Calc {args} {kwargs}')
+            return len(args) + len(kwargs)
+
+    reader = Keys()
+    # Раньше оба вызова давали строковый ключ "value_1_x".
+    assert reader.value(1, 'x') == 2
+    assert reader.value('1_x') == 1
+    assert capsys.readouterr().out == "Calc (1, 'x') {}\nCalc ('1_x',) {}\n"
+    # Порядок именованных аргументов не важен, нехэшируемые аргументы тоже кэшируются.
+    assert reader.value(a=1, b=2) == reader.value(b=2, a=1)
+    assert reader.value([1, {'a': {2}}]) == reader.value([1, {'a': {2}}])
+    assert reader.value((1,)) == reader.value((1,))
+    assert capsys.readouterr().out == "Calc () {'a': 1, 'b': 2}\nCalc ([1, {'a': {2}}],) {}\nCalc ((1,),) {}\n"
+    assert (Keys.value.__qualname__, (1, 'x'), frozenset(), (int, str)) in reader._cache
+
+    reader.cache_reset((Keys.value.__qualname__, (1, 'x'), frozenset(), (int, str)))
+    reader.cache_reset('value_[1, {\'a\': {2}}]')
+    assert reader.value(1, 'x') == 2
+    assert reader.value([1, {'a': {2}}]) == 1
+    assert capsys.readouterr().out == "Calc (1, 'x') {}\nCalc ([1, {'a': {2}}],) {}\n"
+
+
+def test_cached_reader_typed_keys():
+    class Typed(CachedReader):
+        @cached_reader
+        def value(self, *args, **kwargs):
+            return repr((args, kwargs))
+
+        def plain(self, num):
+            return self._cached_reader(repr, num)
+
+    reader = Typed()
+    # Равные аргументы разных типов кэшируются отдельно, как в lru_cache(typed=True).
+    assert [reader.value(num) for num in (1, True, 1.0, 1, True, 1.0)] == ['((1,), {})', '((True,), {})',
+                                                                          '((1.0,), {})'] * 2
+    assert [reader.value(num=num) for num in (1, True, 1.0)] == ["((), {'num': 1})", "((), {'num': True})",
+                                                                 "((), {'num': 1.0})"]
+    assert [reader.value([1], num) for num in (1, True, 1.0)] == ['(([1], 1), {})', '(([1], True), {})',
+                                                                  '(([1], 1.0), {})']
+    assert [reader.plain(num) for num in (1, True, 1.0)] == ['1', 'True', '1.0']
+    assert len(reader._cache) == 12
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite', 'mmap'])
+def test_cache_reset_same_name(tmp_path, backend):
+    class Named(CachedReader):
+        @cached_reader
+        def y(self, num):
+            return num
+
+    cache = {'memory': MemoryCache, 'sqlite': lambda: SqliteCache(str(tmp_path / 'cache.db')),
+             'mmap': lambda: MmapCache(str(tmp_path / 'cache.mmap'), slots=64, data_size=65536)}[backend]()
+    reader = Named(backend=cache)
+    # У y(1) и y('1') одно имя y_1, и сброс по имени удаляет обе записи.
+    assert reader.y(1) == 1 and reader.y('1') == '1' and len(cache) == 2
+    assert len(cache.find_all('y_1')) == 2 and cache.find('y_1') == cache.find_all('y_1')[-1]
+    reader.cache_reset('y_1')
+    assert len(cache) == 0 and cache.find_all('y_1') == () and cache.find('y_1') is None
+    reader.y(1), reader.y('1'), reader.y(2)
+    reader.cache_reset('y_', is_match=False)
+    assert len(cache) == 0 and cache.names() == ()
+
+
+def test_cached_reader_single_flight():
+    started = threading.Event()
+    release = threading.Event()
+
+    class Slow(CachedReader):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        @cached_reader
+        def value(self, a):
+            self.calls += 1
+            started.set()
+            assert release.wait(5)
+            if a < 0:
+                raise ValueError(a)
+            return a * 2
+
+    reader = Slow()
+    for a in (21, -1):
+        started.clear()
+        release.clear()
+        results = []
+
+        def read():
+            try:
+                results.append(reader.value(a))
+            except ValueError as e:
+                results.append(e.args)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        threads[0].start()
+        assert started.wait(5)
+        misses = reader._cache.misses
+        for thread in threads[1:]:
+            thread.start()
+        # Отпускаем вычисление, когда все потоки промахнулись и ждут его.
+        for _ in range(500):
+            if reader._cache.misses == misses + 7:
+                break
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        # Все потоки получили результат одного вычисления, а после него не осталось служебных записей.
+        assert results == [42] * 8 if a > 0 else results == [(-1,)] * 8
+        assert not reader._cache._flights
+    assert reader.calls == 2
+    # Ошибка не кэшируется.
+    release.set()
+    with pytest.raises(ValueError):
+        reader.value(-1)
+    assert reader.calls == 3
+
+
+def test_cached_reader_async():
+    class Async(CachedReader):
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+
+        async def _fetch(self, a):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            if a < 0:
+                raise ValueError(a)
+            return a * 2
+
+        @cached_reader
+        async def value(self, a):
+            return await self._fetch(a)
+
+        async def method_value(self, a):
+            return await self._cached_reader(self._fetch, a)
+
+    async def main():
+        reader = Async()
+        # Одновременные ожидающие одного ключа получают результат одной задачи.
+        assert await asyncio.gather(*(reader.value(21) for _ in range(5))) == [42] * 5
+        assert await reader.value(21) == 42
+        assert reader.calls == 1
+        assert await asyncio.gather(*(reader.method_value(5) for _ in range(5))) == [10] * 5
+        assert reader.calls == 2
+        # Ошибка передается всем ожидающим и не кэшируется.
+        results = await asyncio.gather(*(reader.value(-1) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert reader.calls == 3
+        with pytest.raises(ValueError):
+            await reader.value(-1)
+        assert reader.calls == 4
+        assert not reader._cache._tasks
+
+    asyncio.run(main())
+
+
+def test_cache_reset_by_tag(capsys):
+    class Tagged(CachedReader):
+        @cached_reader(namespaces=('users',))
+        def user(self, group, num):
+            print(f'Calc user {group} {num}')
+            return group, num
+
+        @cached_reader(namespaces=('users',))
+        def users_count(self):
+            print('Calc users_count')
+            return 0
+
+    reader = Tagged()
+    for group in ('a', 'b'):
+        for num in range(3):
+            reader.user(group, num)
+    reader.users_count()
+    capsys.readouterr()
+    assert reader._cache.invalidate('user_a') == 3
+    assert len(reader._cache) == 4
+    # Группа по первому аргументу сбрасывается по индексу.
+    reader.cache_reset('user_b', is_tag=True)
+    assert len(reader._cache) == 1
+    reader.user('a', 1)
+    assert capsys.readouterr().out == "Calc user a 1\n"
+    # Пространство имен объединяет записи разных методов.
+    reader.cache_reset('users', is_tag=True)
+    assert len(reader._cache) == 0 and not reader._cache._tags
+    # Сброс по тегу не задевает записи, в имени которых тег встречается только как подстрока.
+    reader.user('a', 1)
+    reader.users_count()
+    reader.cache_reset('user', is_tag=True)
+    assert len(reader._cache) == 1
+    # Сброс по вхождению перебирает имена, даже если строка - тег.
+    reader.user('abc', 1)
+    reader.user('xyz', 1)
+    reader.cache_reset('bc', is_match=False)
+    assert len(reader._cache) == 2
+    reader.cache_reset('user', is_match=False)
+    assert len(reader._cache) == 0
+
+
+def test_cache_reset_by_substring(capsys):
+    class Values(CachedReader):
+        @cached_reader
+        def x_value(self, num):
+            return num
+
+        @cached_reader
+        def max_value(self, num):
+            return num
+
+    reader = Values()
+    reader.x_value(1)
+    reader.max_value(1)
+    reader.max_value(2)
+    # 'x_value' - тег записей x_value, но сброс по вхождению сбрасывает и записи max_value.
+    reader.cache_reset('x_value', is_match=False)
+    assert len(reader._cache) == 0
+    reader.x_value(1)
+    reader.max_value(1)
+    reader.cache_reset('x_value', is_tag=True)
+    assert reader._cache.names() == ('max_value_1',)
+
+
+@pytest.mark.parametrize('backend', [
+    SqliteCache,
+    pytest.param(MmapCache, marks=pytest.mark.skipif(os.name != 'posix', reason="MmapCache работает только на POSIX")),
+])
+def test_shared_backends(backend, tmp_path, capsys):
+    class Shared(CachedReader):
+        @cached_reader(namespaces=('users',))
+        def user(self, group, num, flags=frozenset()):
+            print(f'Calc user {group} {num}')
+            return {'group': group, 'num': num}
+
+    path = str(tmp_path / 'cache')
+    # Два кэшера на одном файле видят значения друг друга, как два процесса.
+    first, second = Shared(backend=backend(path)), Shared(backend=backend(path))
+    assert first.user('a', 1, flags=frozenset({'x', 'y', 'z'})) == {'group': 'a', 'num': 1}
+    assert second.user('a', 1, flags=frozenset({'z', 'y', 'x'})) == {'group': 'a', 'num': 1}
+    assert capsys.readouterr().out == "Calc user a 1\n"
+    for num in range(2, 5):
+        first.user('a', num)
+    first.user('b', 1)
+    assert len(second._cache) == 5
+    second.cache_reset('user_b_1')
+    assert len(first._cache) == 4
+    second.cache_reset('user_a', is_tag=True)
+    assert len(first._cache) == 0
+    first.user('c', [1, 2])
+    capsys.readouterr()
+    second.user('c', [1, 2])
+    assert capsys.readouterr().out == ""
+    second.cache_reset()
+    assert len(first._cache) == 0
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="MmapCache работает только на POSIX")
+def test_mmap_cache_eviction(tmp_path):
+    # В 32 ячейках помещается 24 записи (доля _MAX_LOAD).
+    cache = MmapCache(str(tmp_path / 'slots'), slots=32)
+    for num in range(24):
+        cache[num] = num
+    for num in range(0, 24, 2):
+        assert cache.get(num) == num
+    cache[100] = 100
+    # Вытесняется только доля записей, прочитанные записи получают второй шанс.
+    assert 100 in cache and len(cache) == 21 and cache.evictions == 4
+    assert all(num in cache for num in range(0, 24, 2))
+
+    # Область данных заканчивается раньше ячеек.
+    cache = MmapCache(str(tmp_path / 'data'), data_size=4096)
+    for num in range(40):
+        cache[num] = 'x' * 200
+        cache.get(0)
+        assert num in cache and 0 in cache and len(cache) >= min(num + 1, 10)
+    assert cache.evictions == 40 - len(cache)
+
+    # Слишком большая запись не сохраняется и не оставляет прежнее значение.
+    cache = MmapCache(str(tmp_path / 'large'), data_size=200)
+    cache.set('k', 'old')
+    cache.set('k', 'x' * 500)
+    assert cache.lookup('k') == (cached_class._MISSING, False) and 'k' not in cache and len(cache) == 0
+
+
+def test_cached_reader_snapshot(tmp_path, capsys):
+    class Warm(CachedReader):
+        @cached_reader(namespaces=('users',))
+        def user(self, num):
+            print(f'Calc user {num}')
+            return {'num': num}
+
+        @cached_reader(ttl=0)
+        def expired(self):
+            print('Calc expired')
+            return 0
+
+    path = str(tmp_path / 'cache.snapshot')
+    reader = Warm(snapshot=path, snapshot_version='1')
+    for num in range(3):
+        reader.user(num)
+    reader.expired()
+    assert reader.cache_save() == 3
+    capsys.readouterr()
+    # Новый кэшер подхватывает снимок лениво: записи переносятся при обращении к ним.
+    warm = Warm(snapshot=path, snapshot_version='1')
+    assert warm._cache._data == {} and warm._cache._snapshot.count == 3
+    assert warm.user(1) == {'num': 1}
+    assert capsys.readouterr().out == ""
+    assert len(warm._cache._data) == 1
+    # Новое значение не затирается прежним из снимка.
+    warm.cache_reset('user_2')
+    warm.user(2)
+    assert capsys.readouterr().out == "Calc user 2\n"
+    warm.cache_reset('users', is_tag=True)
+    assert len(warm._cache) == 0
+    # Снимок другой версии не подхватывается.
+    other = Warm(snapshot=path, snapshot_version='2')
+    other.user(0)
+    assert capsys.readouterr().out == "Calc user 0\n"
+    with pytest.raises(ValueError):
+        Warm(snapshot=path, backend=SqliteCache(str(tmp_path / 'cache.db')))
+
+
+def test_cache_reset_expired_snapshot_entry(tmp_path):
+    class Short(CachedReader):
+        @cached_reader(ttl=0.05)
+        def value(self):
+            return 1
+
+    path = str(tmp_path / 'cache.snapshot')
+    reader = Short(snapshot=path)
+    reader.value()
+    key = reader._cache.find('value')
+    assert reader.cache_save() == 1
+    time.sleep(0.1)
+    # Запись снимка истекла: ее нет в кэше, и сброс по ключу не выбрасывает KeyError.
+    fresh = Short(snapshot=path)
+    assert key not in fresh._cache
+    fresh.cache_reset(key)
+    fresh.cache_reset('value')
+    assert not fresh._cache.discard(key)
+    with pytest.raises(KeyError):
+        del fresh._cache[key]
+    fresh.value()
+    assert fresh._cache.discard(key) and not fresh._cache.discard(key)
+
+
+def test_cached_reader_snapshot_at_exit(tmp_path):
+    class Saved(CachedReader):
+        @cached_reader
+        def value(self, num):
+            return num
+
+    path = str(tmp_path / 'cache.snapshot')
+    reader = Saved(snapshot=path)
+    reader.value(1)
+    temporary = Saved(snapshot=str(tmp_path / 'temporary.snapshot'))
+    # Обработчик завершения процесса не удерживает кэшеры: удаленный кэшер снимок не сохраняет.
+    temporary_ref = weakref.ref(temporary)
+    del temporary
+    gc.collect()
+    assert temporary_ref() is None
+    cached_class._save_snapshots()
+    assert os.listdir(tmp_path) == ['cache.snapshot']
+    restored = MemoryCache()
+    assert restored.load(path) and len(restored) == 1
+
+
+def test_memory_cache_concurrent_save(tmp_path):
+    # Несколько кэшей одновременно сохраняются в один файл: каждое сохранение пишет свой временный файл.
+    path = str(tmp_path / 'cache.snapshot')
+    caches = [MemoryCache() for _ in range(4)]
+    for num, cache in enumerate(caches):
+        for key in range(100):
+            cache[key] = num
+    saved = []
+    threads = [threading.Thread(target=lambda cache=cache: saved.append(cache.save(path)))
+               for cache in caches for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert saved == [100] * 20 and os.listdir(tmp_path) == ['cache.snapshot']
+    restored = MemoryCache()
+    assert restored.load(path) and len(restored) == 100 and len({restored[key] for key in range(100)}) == 1
+
+
+def test_memory_cache_truncated_snapshot(tmp_path):
+    path = tmp_path / 'cache.snapshot'
+    cache = MemoryCache()
+    for num in range(10):
+        cache[num] = 'x' * 100
+    assert cache.save(str(path), 'v') == 10
+    data = path.read_bytes()
+    # Обрезаны последние записи, указатели на них остались, или обрезаны сами указатели.
+    for size in (len(data) - 1, len(data) // 2, 30):
+        path.write_bytes(data[:size])
+        truncated = MemoryCache()
+        assert not truncated.load(str(path), 'v')
+        assert truncated._snapshot is None and len(truncated) == 0 and truncated.get(5) is None
+    path.write_bytes(data)
+    restored = MemoryCache()
+    assert restored.load(str(path), 'v')
+    assert restored.get(5) == 'x' * 100 and len(restored) == 10
+    # Поврежденный указатель записи в середине проверяется при чтении: пропадает только эта запись.
+    snapshot = cached_class._Snapshot(str(path), 'v')
+    position = snapshot._position(cached_class._key_digest(5))
+    snapshot.close()
+    start = cached_class._Snapshot.HEADER.size + 1 + position * cached_class._Snapshot.ENTRY.size + 24
+    path.write_bytes(data[:start] + (1 << 30).to_bytes(4, 'little') + data[start + 4:])
+    damaged = MemoryCache()
+    assert damaged.load(str(path), 'v')
+    assert damaged.get(5) is None and damaged.get(4) == 'x' * 100 and len(damaged) == 9
+
+
+def test_cached_reader_scope(capsys):
+    class Scoped(CachedReader):
+        @cached_reader(scope=CacheScope.CLASS)
+        def square(self, num):
+            print(f'Calc square {num}')
+            return num * num
+
+        @cached_reader(scope=CacheScope.GLOBAL)
+        def cube(self, num):
+            print(f'Calc cube {num}')
+            return num ** 3
+
+    class Other(CachedReader):
+        @cached_reader(scope=CacheScope.CLASS)
+        def square(self, num):
+            print(f'Calc other square {num}')
+            return -num
+
+    first, second = Scoped(), Scoped()
+    assert first.square(3) == second.square(3) == 9
+    assert Other().square(3) == -3
+    assert first.cube(2) == second.cube(2) == 8
+    assert capsys.readouterr().out == "Calc square 3\nCalc other square 3\nCalc cube 2\n"
+    assert len(first._cache) == 0
+    second.cache_reset('square_3', scope=CacheScope.CLASS)
+    first.square(3)
+    first.cube(2)
+    assert capsys.readouterr().out == "Calc square 3\n"
+    first.cache_reset('cube', is_match=False, scope=CacheScope.GLOBAL)
+    second.cube(2)
+    assert capsys.readouterr().out == "Calc cube 2\n"
+
+
+@pytest.mark.parametrize('scope', [CacheScope.CLASS, CacheScope.GLOBAL])
+def test_cached_reader_scope_settings(scope, monkeypatch, capsys):
+    monkeypatch.setattr(cached_class, '_global_cache', None)
+    now = [0.0]
+
+    class Limited(CachedReader):
+        class_cache_options = {'max_entries': 2, 'eviction_policy': EvictionPolicy.FIFO, 'ttl': 10, 'metrics': True}
+
+        @cached_reader(scope=scope)
+        def value(self, num):
+            print(f'Calc {num}')
+            return num
+
+    class Large(Limited):
+        class_cache_options = {'max_entries': 100}
+
+    if scope == CacheScope.GLOBAL:
+        configure_global_cache(max_entries=2, eviction_policy=EvictionPolicy.FIFO, ttl=10, metrics=True)
+    # Настройки общего кэша не зависят от того, какой кэшер обратился к нему первым.
+    large, reader = Large(max_entries=1), Limited(max_entries=50, ttl=1000)
+    large.value(0)
+    cache = cached_class._SCOPE_CACHES[scope](reader)
+    cache._clock = lambda: now[0]
+    for num in (1, 2, 3, 1):
+        reader.value(num)
+    # Общие кэши вытесняют записи, истекают и собирают метрики по своим настройкам.
+    expected = "Calc 1\nCalc 2\nCalc 3\nCalc 1\n"
+    assert capsys.readouterr().out == "Calc 0\n" + expected
+    assert len(cache) == 2 and cache.policy == EvictionPolicy.FIFO and cache.max_entries == 2
+    stats = reader.stats(scope)
+    # Общий кэш всех классов учитывает и вызов наследника.
+    misses = 4 if scope == CacheScope.CLASS else 5
+    assert stats['entries'] == 2 and stats['functions'][cache.find('value_1')[0]]['misses'] == misses
+    assert reader.stats()['entries'] == 0 and reader._cache.metrics is None
+    now[0] = 11
+    reader.value(3)
+    assert capsys.readouterr().out == "Calc 3\n"
+    if scope == CacheScope.CLASS:
+        # У наследника свой кэш класса со своими настройками.
+        large_cache = cached_class._class_cache(large)
+        assert large_cache is not cache and large_cache.max_entries == 100 and large_cache.metrics is None
+
+
+def test_cached_reader_without_cache_attribute(capsys):
+    class Plain:
+        @cached_reader
+        def value(self, num):
+            print(f'Calc value {num}')
+            return num
+
+    class Slotted:
+        __slots__ = ('__weakref__',)
+
+        @cached_reader
+        def value(self, num):
+            print(f'Calc slotted value {num}')
+            return num
+
+    plain, slotted = Plain(), Slotted()
+    for _ in range(2):
+        assert plain.value(1) == 1
+        assert slotted.value(2) == 2
+    assert Plain().value(1) == 1
+    assert capsys.readouterr().out == "Calc value 1\nCalc slotted value 2\nCalc value 1\n"
+    # Кэш экземпляра без __dict__ хранится по слабой ссылке и удаляется вместе с экземпляром.
+    assert slotted in cached_class._instance_caches
+    del slotted
+    gc.collect()
+    assert len(cached_class._instance_caches) == 0
+
+
+def test_cached_reader_logging(caplog):
+    class Logged(CachedReader):
+        def _value(self, num):
+            return num
+
+        def value(self, num):
+            return self._cached_reader(self._value, num)
+
+    key = f"{Logged._value.__qualname__}({{}})".format
+    logger = logging.getLogger('test_cached_reader_logging')
+    reader = Logged(logger)
+    with caplog.at_level(logging.DEBUG, logger.name):
+        # Логгер не пишет отладочные сообщения, хотя обработчик их принимает.
+        logger.setLevel(logging.INFO)
+        reader.value(1)
+        assert caplog.records == []
+        logger.setLevel(logging.DEBUG)
+        reader.value(1)
+        reader.value(2)
+        assert [record.getMessage() for record in caplog.records] == [
+            f"Reading data of the 'Logged' class from the cache by key '{key(1)}'",
+            f"Writing data of the 'Logged' class to the cache by key '{key(2)}'",
+            f"Reading data of the 'Logged' class from the cache by key '{key(2)}'",
+        ]
+        caplog.clear()
+        # При нулевой доле чтения из кэша не пишутся, а вычисления пишутся.
+        silent = Logged(logger, log_sample_rate=0)
+        silent.value(1)
+        silent.value(1)
+        assert [record.getMessage() for record in caplog.records] == [
+            f"Writing data of the 'Logged' class to the cache by key '{key(1)}'",
+        ]
+    with pytest.raises(ValueError):
+        Logged(logger, log_sample_rate=2)
+
+
+def test_cached_reader_stats():
+    class Measured(CachedReader):
+        @cached_reader
+        def value(self, num):
+            if num < 0:
+                raise ValueError(num)
+            return 'x' * num
+
+    computed = []
+    ticks = iter((0.0, 0.7, 1.0, 1.01, 2.0, 2.001))
+    metrics = CacheMetrics(buckets=(0.05, 0.5), on_compute=lambda *args: computed.append(args),
+                           clock=lambda: next(ticks))
+    reader = Measured(metrics=metrics)
+    reader.value(10)
+    reader.value(10)
+    reader.value(20)
+    with pytest.raises(ValueError):
+        reader.value(-1)
+    stats = reader.stats()
+    function = stats['functions'][Measured.value.__qualname__]
+    assert (stats['entries'], stats['hits'], stats['misses']) == (2, 1, 3)
+    assert (function['hits'], function['misses'], function['entries']) == (1, 3, 2)
+    assert function['compute_seconds']['buckets'] == ((0.05, 2), (0.5, 2), (float('inf'), 3))
+    assert function['compute_seconds']['count'] == 3
+    assert function['compute_seconds']['sum'] == pytest.approx(0.711)
+    assert function['bytes'] == stats['bytes'] > 0 and function['max_age'] >= 0
+    assert [(seconds, type(error)) for _, seconds, error in computed] == [
+        (pytest.approx(0.7), type(None)), (pytest.approx(0.01), type(None)), (pytest.approx(0.001), ValueError)]
+    assert any(item is reader for item, _ in collect_stats())
+    # Без метрик статистика содержит только записи.
+    plain = Measured()
+    plain.value(1)
+    assert plain.stats()['functions'][Measured.value.__qualname__] == {
+        'entries': 1, 'bytes': plain._cache.entries_info()[0][1], 'max_age': None}
+    assert plain._cache.metrics is None and all(item is not plain for item, _ in collect_stats())
@@ -0,0 +1,157 @@
+import doctest
+import mmap
+import random
+import threading
+
+import pytest
+
+from helper import flags as flags_module
+from helper.flags import AtomicFlags, Backend, Condition, Flags, FlagsArray, Overflow, Param, Query
+
+# Размеры по обе стороны границы фрагмента разреженного хранилища (65536 бит).
+SIZES = (8, 70, 65535, 65536, 65537, 2 * 65536 + 100)
+
+
+def test_doctests():
+    """ Выполняет примеры из документации модуля flags. """
+    assert doctest.testmod(flags_module).failed == 0
+
+
+def assert_same(flags, expected, size):
+    """ Проверяет, что флаги совпадают с эталонными флагами Backend.INT. """
+    assert flags.int_bits == expected.int_bits
+    assert flags.count() == expected.count()
+    assert list(flags.iter_bits()) == list(expected.iter_bits())
+    assert flags.to_bytes() == expected.to_bytes()
+    for num in (1, size // 3, size // 2, size):
+        assert flags.rank(num) == expected.rank(num)
+    for k in (1, 2, expected.count(), expected.count() + 1):
+        assert flags.select(k) == expected.select(k)
+
+
+@pytest.mark.parametrize('backend', [Backend.BUFFER, Backend.SPARSE])
+@pytest.mark.parametrize('size', SIZES)
+def test_backend_equivalence(backend, size):
+    rnd = random.Random(size)
+    nums = tuple(sorted(rnd.sample(range(1, size + 1), min(size, 40))))
+    other_nums = tuple(rnd.sample(range(1, size + 1), min(size, 40)))
+    flags, expected = Flags(size, Param.PARAM_BITS, nums, backend), Flags(size, Param.PARAM_BITS, nums)
+    other, expected_other = (Flags(size, Param.PARAM_BITS, other_nums, backend),
+                             Flags(size, Param.PARAM_BITS, other_nums))
+    assert_same(flags, expected, size)
+    for num in (1, size, rnd.randint(1, size)):
+        assert flags.get_bit(num) == expected.get_bit(num)
+        flags.set_bit(num, 1)
+        expected.set_bit(num, 1)
+        flags.inverse_bit(num)
+        expected.inverse_bit(num)
+    flags.set_bits(other_nums[:5], 1)
+    expected.set_bits(other_nums[:5], 1)
+    assert flags.check_bits(other_nums[:5], 1) and flags.check_bits(nums, 0, Condition.ANY) == \
+        expected.check_bits(nums, 0, Condition.ANY)
+    assert_same(flags, expected, size)
+    for operation in ('__and__', '__or__', '__xor__'):
+        result = getattr(flags, operation)(other)
+        assert result.backend == backend
+        assert_same(result, getattr(expected, operation)(expected_other), size)
+    assert_same(~flags, ~expected, size)
+    flags.invert_all()
+    expected.invert_all()
+    assert_same(flags, expected, size)
+    flags.build_index()
+    expected.build_index()
+    assert_same(flags, expected, size)
+
+
+@pytest.mark.parametrize('other_backend', list(Backend))
+@pytest.mark.parametrize('backend', list(Backend))
+@pytest.mark.parametrize('size, other_size', [(10, 70000), (70000, 2 * 65536 + 100), (70000, 10)])
+def test_mixed_width_equivalence(backend, other_backend, size, other_size):
+    # Биты более широкого операнда за пределами количества бит результата не видны при любом способе хранения.
+    nums = {num for num in (1, 5, 10, 65536, 65537, 69999, 70000) if num <= size}
+    other_nums = {num for num in (2, 5, 10, 11, 65537, 69999, 70001, 131073) if num <= other_size}
+    flags = Flags(size, Param.PARAM_BITS, tuple(nums), backend)
+    other = Flags(other_size, Param.PARAM_BITS, tuple(other_nums), other_backend)
+    for operation, combine in (('__and__', set.__and__), ('__or__', set.__or__), ('__xor__', set.__xor__)):
+        result = getattr(flags, operation)(other)
+        expected = Flags(size, Param.PARAM_BITS, tuple(num for num in combine(nums, other_nums) if num <= size))
+        assert_same(Flags.from_bytes(result.to_bytes(), size), expected, size)
+        assert result.count() == expected.count()
+        assert list(result.iter_bits()) == list(expected.iter_bits())
+        for k in (1, 2, expected.count(), expected.count() + 1):
+            assert result.select(k) == expected.select(k)
+
+
+def test_full_mask_cache_bound():
+    # Маски шире _CACHED_FULL_MASK_BITS бит не удерживаются кэшем.
+    flags_module._cached_full_mask.cache_clear()
+    wide = flags_module._CACHED_FULL_MASK_BITS + 1
+    assert flags_module._full_mask(wide) == (1 << wide) - 1
+    assert flags_module._full_mask(8) == 0xFF
+    assert flags_module._cached_full_mask.cache_info().currsize == 1
+
+
+def test_atomic_flags_threads():
+    flags = AtomicFlags(128)
+    winners = []
+    barrier = threading.Barrier(8)
+
+    def work():
+        barrier.wait()
+        # Каждый из битов 65-128 должен достаться ровно одному потоку.
+        winners.extend(num for num in range(65, 129) if not flags.test_and_set(num))
+        # Младшие биты - счетчик, который увеличивается через compare_and_swap без потерянных изменений.
+        for _ in range(200):
+            while True:
+                expected = flags.int_bits
+                if flags.compare_and_swap(expected, expected + 1):
+                    break
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(winners) == list(range(65, 129))
+    assert flags.int_bits & (1 << 64) - 1 == 8 * 200
+
+
+def test_atomic_flags_arguments():
+    # Позиционные аргументы совпадают с Flags, блокировка передается только по имени.
+    flags = AtomicFlags(8, Param.PARAM_BITS, None, Backend.INT, Overflow.TRUNCATE)
+    flags.set_bit(1, 1)
+    assert flags.overflow == Overflow.TRUNCATE and flags.str_bits == '10000000'
+    lock = threading.Lock()
+    assert AtomicFlags(8, Param.PARAM_BITS, None, Backend.SPARSE, lock=lock).lock is lock
+    with pytest.raises(TypeError):
+        AtomicFlags(8, Param.PARAM_BITS, None, Backend.INT, Overflow.TRUNCATE, lock)
+
+
+def test_query_processes():
+    rnd = random.Random(0)
+    records = [Flags(24, Param.PARAM_BITS, rnd.getrandbits(24)) for _ in range(1000)]
+    query = (Query((1, 5), 1) & ~Query('0001', 1)) | Query((20, 21, 22), 0, Condition.ALL)
+    array = FlagsArray.from_flags(records)
+    assert query.find(records, processes=3) == query.find(array) == query.find(records)
+    assert query.count(array, processes=2) == query.count(records) > 0
+    # Пустой набор записей не требует ни массива, ни процессов.
+    assert query.find([]) == query.find([], processes=2) == []
+    assert query.count([]) == query.count([], processes=2) == 0
+
+
+def test_from_buffer_mmap(tmp_path):
+    path = tmp_path / 'flags.bin'
+    path.write_bytes(bytes(16))
+    with open(path, 'r+b') as file, mmap.mmap(file.fileno(), 0) as data:
+        flags = Flags.from_buffer(data, 100)
+        flags.set_bit(1, 1)
+        flags.set_bits((9, 100), 1)
+        assert data[:13] == b'\x01\x01' + bytes(10) + b'\x08'
+        # Изменения буфера сразу видны во флагах.
+        data[2] = 0xFF
+        assert list(flags.iter_bits()) == [1, 9, *range(17, 25), 100]
+        view = flags.as_memoryview()
+        view[0] = 0
+        assert flags.get_bit(1) == 0 and data[0] == 0
+        del flags, view
+    assert path.read_bytes()[:3] == b'\x00\x01\xff'